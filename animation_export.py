@@ -0,0 +1,239 @@
+"""
+Анимация последовательности картограмм: GIF, MP4 или каталог кадров
+
+Все картограммы последовательности одного размера, поэтому фигура кадра
+(геометрия, оси, слои) строится в каждом процессе один раз, а для кадра в
+модель копируются только массивы состояния элементов, после чего меняются
+цвета, штриховки, номера, подписи, легенда и заголовок. Кадры рисуются пулом
+процессов и собираются по порядку по мере готовности, не дожидаясь всех:
+    python animation_export.py cycles/ -o core.gif --fps 4 -j 4
+    python animation_export.py a.npz b.npz c.npz -o frames/
+MP4 пишется через ffmpeg (путь - mpl.rcParams['animation.ffmpeg_path']).
+"""
+
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+import matplotlib as mpl
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from cartogram_cli import find_cartograms, read_cartogram
+from cartogram_figure import draw_grid, add_legend, legend_text
+from hex_geometry import grid_geometry, base_radius
+from hex_model import HexGridModel
+from settings import FIGSIZE
+
+
+# Разрешение кадров по умолчанию: 16 x 8 дюймов -> 1600 x 800 пикселей
+ANIMATION_DPI = 100
+DEFAULT_FPS = 4
+# Сколько кадров на процесс рисуется впереди записи: больше - меньше простоев, но больше памяти
+FRAMES_AHEAD = 4
+# Массивы модели, из которых состоит кадр
+FRAME_ARRAYS = ('color', 'state', 'number', 'text', 'text_anchor')
+TITLE_FONT_SIZE = 16
+
+
+def output_kind(output_path):
+    """'gif', 'mp4' или 'frames' (каталог PNG) по пути результата"""
+    extension = os.path.splitext(output_path)[1].lower()
+    return {'.gif': 'gif', '.mp4': 'mp4'}.get(extension, 'frames')
+
+
+class FrameRenderer:
+    """
+    Фигура кадра, построенная один раз для размера последовательности
+    """
+
+    def __init__(self, num_rings, remove_corners, coeff_padding, bw_mode=False, dpi=ANIMATION_DPI):
+        self.grid = HexGridModel(num_rings, remove_corners)
+        self.bw_mode = bw_mode
+        radius = base_radius(num_rings)
+        padding = radius * coeff_padding
+        self.fig = Figure(figsize=FIGSIZE, dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.fig)
+        # Как в cartogram_figure: номера видны при любом размере
+        self.renderer = draw_grid(self.fig, self.grid, radius, padding, bw_mode,
+                                  grid_geometry(num_rings, radius, padding, remove_corners), min_number_size=0)
+        self.legend = add_legend(self.fig)
+        self.title = self.fig.suptitle('', fontsize=TITLE_FONT_SIZE)
+
+    def render(self, file_path):
+        """Кадр картограммы file_path: RGBA (высота, ширина, 4), массив холста - до следующего кадра"""
+        grid, attributes = read_cartogram(file_path)
+        if (grid.num_rings, grid.remove_corners) != (self.grid.num_rings, self.grid.remove_corners):
+            raise ValueError(f'{os.path.basename(file_path)}: {grid.num_rings} колец вместо {self.grid.num_rings} '
+                             f'или другое удаление углов - кадры должны быть одного размера')
+        for name in FRAME_ARRAYS:
+            getattr(self.grid, name)[:] = getattr(grid, name)
+        self.grid.recount()
+
+        renderer = self.renderer
+        renderer.update_cells()
+        for index in list(renderer.texts):
+            renderer.remove_text(index)
+        renderer.draw_labels()
+        self.legend.set_text(legend_text(self.grid, attributes['color_titles'], self.bw_mode))
+        self.title.set_text(os.path.splitext(os.path.basename(file_path))[0])
+        self.canvas.draw()
+        return np.asarray(self.canvas.buffer_rgba())
+
+
+# Фигура кадра процесса пула, строится инициализатором
+_frame_renderer = None  # pylint: disable=invalid-name
+
+
+def _init_worker(*args):
+    global _frame_renderer  # pylint: disable=global-statement,invalid-name
+    _frame_renderer = FrameRenderer(*args)
+
+
+def _frame(frame_renderer, file_path, kind, frame_path):
+    """
+    Кадр в виде, который дешевле всего передать и записать: PNG пишется прямо здесь (возвращается путь),
+    для GIF цвета сокращаются до палитры здесь же, чтобы эта часть кодирования шла параллельно
+    """
+    from PIL import Image  # pylint: disable=import-outside-toplevel
+    rgb = frame_renderer.render(file_path)[..., :3]
+    if kind == 'frames':
+        Image.fromarray(rgb).save(frame_path)
+        return frame_path
+    if kind == 'gif':
+        return Image.fromarray(rgb).quantize(method=Image.Quantize.FASTOCTREE)
+    return np.ascontiguousarray(rgb)
+
+
+def _pool_frame(task):
+    return _frame(_frame_renderer, *task)
+
+
+def _ordered(submit, tasks, ahead):
+    """Результаты задач по порядку, не больше ahead задач выполняется или ждет записи"""
+    tasks = iter(tasks)
+    pending = deque(submit(task) for task in itertools.islice(tasks, ahead))
+    while pending:
+        result = pending.popleft().result()
+        pending.extend(submit(task) for task in itertools.islice(tasks, 1))
+        yield result
+
+
+def render_frames(file_paths, kind, frame_dir=None, bw_mode=False, dpi=ANIMATION_DPI, jobs=None):
+    """
+    Кадры последовательности по порядку, по мере готовности (см. _frame)
+    :param jobs: Количество процессов, по умолчанию - по числу ядер; 1 - без пула процессов
+    """
+    grid, attributes = read_cartogram(file_paths[0])
+    setup = (grid.num_rings, grid.remove_corners, attributes['coeff_padding'], bw_mode, dpi)
+    tasks = [(file_path, kind, os.path.join(frame_dir, f'frame_{number:05d}.png') if frame_dir else None)
+             for number, file_path in enumerate(file_paths, 1)]
+    jobs = min(jobs or os.cpu_count() or 1, len(tasks))
+    if jobs == 1:
+        frame_renderer = FrameRenderer(*setup)
+        for task in tasks:
+            yield _frame(frame_renderer, *task)
+        return
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=setup) as pool:
+        yield from _ordered(lambda task: pool.submit(_pool_frame, task), tasks, jobs * FRAMES_AHEAD)
+
+
+def _write_gif(frames, output_path, fps):
+    first = next(frames)
+    # Pillow собирает GIF из итератора кадров, кадры уже с палитрой
+    first.save(output_path, save_all=True, append_images=frames, duration=round(1000 / fps), loop=0,
+               optimize=False)
+
+
+def _write_mp4(frames, output_path, fps):
+    first = next(frames)
+    height, width = first.shape[:2]
+    command = [mpl.rcParams['animation.ffmpeg_path'], '-y', '-loglevel', 'error',
+               '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}', '-r', str(fps), '-i', 'pipe:',
+               # H.264 с yuv420p требует четных размеров
+               '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-vcodec', 'libx264', '-pix_fmt', 'yuv420p', output_path]
+    try:
+        process = subprocess.Popen(command, stdin=subprocess.PIPE)  # pylint: disable=consider-using-with
+    except FileNotFoundError as error:
+        raise RuntimeError('Для MP4 нужен ffmpeg (mpl.rcParams["animation.ffmpeg_path"])') from error
+    try:
+        for frame in itertools.chain([first], frames):
+            process.stdin.write(frame.tobytes())
+    except BrokenPipeError:
+        pass  # ffmpeg завершился с ошибкой - она в коде возврата
+    finally:
+        process.stdin.close()
+        if process.wait():
+            raise RuntimeError(f'ffmpeg завершился с кодом {process.returncode}')
+
+
+def export_animation(file_paths, output_path, fps=DEFAULT_FPS, bw_mode=False, dpi=ANIMATION_DPI, jobs=None,
+                     report=print):
+    """
+    Анимация картограмм file_paths в порядке списка
+    :param output_path: *.gif, *.mp4 или каталог для кадров frame_00001.png, ...
+    :return: Количество кадров
+    """
+    if not file_paths:
+        raise ValueError('Нет картограмм для анимации')
+    kind = output_kind(output_path)
+    if kind == 'frames':
+        os.makedirs(output_path, exist_ok=True)
+    total = len(file_paths)
+    start = time.perf_counter()
+
+    def progress(frames):
+        for number, frame in enumerate(frames, 1):
+            if number == total or number % max(1, total // 20) == 0:
+                report(f'[{number}/{total}] {time.perf_counter() - start:.1f} с')
+            yield frame
+
+    frames = progress(render_frames(file_paths, kind, output_path if kind == 'frames' else None, bw_mode, dpi,
+                                    jobs))
+    if kind == 'gif':
+        _write_gif(frames, output_path, fps)
+    elif kind == 'mp4':
+        _write_mp4(frames, output_path, fps)
+    else:
+        for _ in frames:
+            pass
+    report(f'Готово: {total} кадров -> {output_path} за {time.perf_counter() - start:.2f} с')
+    return total
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description='Анимация последовательности картограмм одного размера')
+    parser.add_argument('inputs', nargs='+',
+                        help='Файлы картограмм по порядку кадров или каталог (файлы в порядке имен)')
+    parser.add_argument('-o', '--output', required=True, help='Файл *.gif, *.mp4 или каталог для кадров PNG')
+    parser.add_argument('--fps', type=float, default=DEFAULT_FPS, help=f'Кадров в секунду (по умолчанию {DEFAULT_FPS})')
+    parser.add_argument('--dpi', type=int, default=ANIMATION_DPI,
+                        help=f'Разрешение кадров (по умолчанию {ANIMATION_DPI})')
+    parser.add_argument('--bw', action='store_true', help='Черно-белый режим')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='Количество процессов')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    file_paths = []
+    for path in args.inputs:
+        file_paths += find_cartograms(path) if os.path.isdir(path) else [path]
+    try:
+        export_animation(file_paths, args.output, args.fps, args.bw, args.dpi, args.jobs)
+    except (ValueError, RuntimeError) as error:
+        print(error)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+Фоновые задачи окна программы
+
+Долгая работа (чтение и запись картограмм, массивы фигуры, сохранение
+изображений) идет в рабочем потоке или процессе, а поток Tk только забирает
+сообщения из очереди через root.after короткими шагами, поэтому окно не
+зависает. Объекты Tk и matplotlib окна создает и трогает только главный поток.
+
+Рисование Agg держит GIL, поэтому изображения сохраняются в отдельном
+процессе: в потоке окно ждало бы каждую полосу растра.
+"""
+
+import multiprocessing
+import queue
+import threading
+import time
+
+
+# Период опроса очереди задачи, мс
+POLL_MS = 25
+# Сколько времени один шаг опроса может разбирать сообщения, с
+MAX_POLL_SECONDS = 0.01
+
+
+class TaskCancelled(Exception):
+    """Задача остановлена пользователем"""
+
+
+class TaskProgress:
+    """
+    Передается в рабочую функцию как progress(done, total): сообщает ход работы
+    и прерывает ее исключением TaskCancelled, если задачу отменили
+    """
+
+    def __init__(self, messages, cancel_event):
+        self.messages = messages
+        self.cancel_event = cancel_event
+
+    def __call__(self, done, total=None):
+        if self.cancel_event.is_set():
+            raise TaskCancelled()
+        self.messages.put(('progress', done, total))
+
+
+def _run(function, args, messages, cancel_event):
+    try:
+        result = function(*args, progress=TaskProgress(messages, cancel_event))
+    except TaskCancelled:
+        messages.put(('cancelled',))
+    except Exception as error:  # pylint: disable=broad-except
+        # Исключение из процесса может не пройти через pickle, поэтому передается текст
+        messages.put(('error', f'{type(error).__name__}: {error}'))
+    else:
+        messages.put(('done', result))
+
+
+class BackgroundTask:
+    """
+    Одна фоновая задача, результат которой возвращается в поток Tk
+    """
+
+    def __init__(self, root, function, args=(), on_done=None, on_error=None, on_cancel=None, on_progress=None,
+                 process=False, latency=None):
+        """
+        :param root:        Корневое окно Tk, через его after опрашивается очередь
+        :param function:    function(*args, progress) - выполняется в рабочем потоке или процессе.
+                            Для процесса - функция уровня модуля, аргументы и результат проходят через pickle
+        :param on_done:     on_done(result) в потоке Tk
+        :param on_error:    on_error(текст ошибки) в потоке Tk
+        :param on_cancel:   on_cancel() в потоке Tk после остановки задачи
+        :param on_progress: on_progress(done, total) в потоке Tk, total=None - объем работы неизвестен
+        :param process:     Выполнять в отдельном процессе (для рисования Agg, которое держит GIL)
+        :param latency:     LatencyLog для замера шагов опроса
+        """
+        self.root = root
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_cancel = on_cancel
+        self.on_progress = on_progress
+        self.latency = latency
+        self.process = process
+        self._after_id = None
+        if process:
+            # spawn - как в Windows и в сборке PyInstaller, к тому же fork процесса с Tk небезопасен
+            context = multiprocessing.get_context('spawn')
+            self._messages = context.Queue()
+            self._cancel_event = context.Event()
+            self._worker = context.Process(target=_run, args=(function, args, self._messages, self._cancel_event),
+                                           daemon=True)
+        else:
+            self._messages = queue.Queue()
+            self._cancel_event = threading.Event()
+            self._worker = threading.Thread(target=_run, args=(function, args, self._messages, self._cancel_event),
+                                            daemon=True)
+
+    @property
+    def running(self):
+        return self._after_id is not None
+
+    def start(self):
+        self._worker.start()
+        self._after_id = self.root.after(POLL_MS, self._poll)
+        return self
+
+    def cancel(self):
+        """
+        Остановка задачи: поток завершается на ближайшем вызове progress, процесс - сразу.
+        on_cancel вызывается, когда задача действительно остановилась
+        """
+        self._cancel_event.set()
+        if self.process and self._worker.is_alive():
+            self._worker.terminate()
+            self._worker.join()
+            self._finish(self.on_cancel)
+
+    def _poll(self):
+        self._after_id = None
+        start = time.perf_counter()
+        progress = None
+        message = None
+        # За шаг разбираются не все сообщения, а сколько успеется, остальные - в следующий шаг
+        while time.perf_counter() - start < MAX_POLL_SECONDS:
+            try:
+                message = self._messages.get_nowait()
+            except queue.Empty:
+                message = None
+                break
+            if message[0] != 'progress':
+                break
+            progress = message[1:]
+            message = None
+
+        if progress is not None and self.on_progress:
+            self.on_progress(*progress)
+        if message is not None:
+            kind, *payload = message
+            if kind == 'done':
+                self._finish(self.on_done, *payload)
+            elif kind == 'error':
+                self._finish(self.on_error, *payload)
+            else:
+                self._finish(self.on_cancel)
+        elif self.process and not self._worker.is_alive() and self._messages.empty():
+            # Процесс завершился, не оставив результата (например, не хватило памяти)
+            self._finish(self.on_error, f'Рабочий процесс завершился с кодом {self._worker.exitcode}')
+        else:
+            self._after_id = self.root.after(POLL_MS, self._poll)
+        if self.latency:
+            self.latency.record('task_poll', time.perf_counter() - start)
+
+    def _finish(self, callback, *args):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+        # Результат уже получен, а завершение интерпретатора процесса занимает сотни мс - его не ждем.
+        # Завершившийся процесс подбирает multiprocessing при следующем запуске процесса
+        if callback:
+            callback(*args)
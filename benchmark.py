@@ -0,0 +1,253 @@
+"""
+Замеры основных операций на синтетических картограммах без окна программы
+
+Каждая операция на каждом числе колец выполняется в отдельном процессе (пиковая
+память считается на процесс), рисование идет на холсте Agg. Результаты пишутся
+в JSON, и их можно сравнить с результатами прежнего запуска:
+    python benchmark.py -o before.json
+    python benchmark.py -o after.json --baseline before.json --threshold 0.2
+Код возврата 1 - есть замеры хуже прежних больше чем на threshold.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import matplotlib as mpl
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from cartogram_cli import read_cartogram, export_grid, _in_new_process
+from cartogram_figure import draw_grid, grid_limits, legend_text
+from cartogram_io import save_cartogram, CARTOGRAM_EXTENSION
+from hex_geometry import hex_grid_geometry, base_radius, HexHitIndex
+from hex_model import HexGridModel, PALETTE, STATE_DASHED, STATE_REMOVED
+from profiling import peak_rss_mb
+from settings import FIGSIZE, SAVE_DPI
+
+
+RING_COUNTS = (1, 10, 30, 100, 300)
+COEFF_PADDING = 0.4
+# Доли удаленных, пунктирных и пронумерованных элементов синтетической картограммы
+REMOVED_SHARE = 0.05
+DASHED_SHARE = 0.05
+NUMBERED_SHARE = 0.2
+# Запросов поиска элемента по точке и пересчетов легенды за один замер
+HIT_QUERIES = 10000
+LEGEND_CALLS = 100
+# Замеры короче этого времени не сравниваются - разница в них - шум
+MIN_COMPARE_SECONDS = 0.002
+DEFAULT_THRESHOLD = 0.2
+COMPARED = ('seconds', 'peak_rss_mb', 'file_size')
+
+
+def synthetic_grid(num_rings, seed=0):
+    """Картограмма со случайными цветами, удаленными и пунктирными элементами и номерами"""
+    rng = np.random.default_rng(seed)
+    grid = HexGridModel(num_rings)
+    size = len(grid)
+    grid.color[:] = rng.integers(0, len(PALETTE), size)
+    share = rng.random(size)
+    grid.state[share < REMOVED_SHARE] = STATE_REMOVED
+    grid.state[(share >= REMOVED_SHARE) & (share < REMOVED_SHARE + DASHED_SHARE)] = STATE_DASHED
+    numbered = rng.random(size) < NUMBERED_SHARE
+    grid.number[numbered] = np.arange(1, np.count_nonzero(numbered) + 1)
+    grid.recount()
+    return grid
+
+
+def _attributes():
+    return {'coeff_padding': COEFF_PADDING, 'color_titles': {color: color for color in PALETTE}}
+
+
+def _window_figure(grid, bw_mode=False):
+    """Фигура, как в окне программы: уровень детализации и холст Agg вместо Tk"""
+    radius = base_radius(grid.num_rings)
+    padding = radius * COEFF_PADDING
+    fig = Figure(figsize=FIGSIZE)
+    geometry = hex_grid_geometry(grid.num_rings, radius, padding, grid.remove_corners)
+    renderer = draw_grid(fig, grid, radius, padding, bw_mode, geometry, lod=True)
+    return FigureCanvasAgg(fig), renderer
+
+
+def _timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def bench_build(grid, work_dir, dpi):  # pylint: disable=unused-argument
+    """Построение фигуры и первая отрисовка"""
+    def build():
+        canvas, _ = _window_figure(grid)
+        canvas.draw()
+    return _timed(build)[0], None
+
+
+def bench_hit_test(grid, work_dir, dpi):  # pylint: disable=unused-argument
+    """HIT_QUERIES поисков элемента по случайной точке в пределах осей"""
+    radius = base_radius(grid.num_rings)
+    padding = radius * COEFF_PADDING
+    index = HexHitIndex(grid.num_rings, radius, padding, grid.remove_corners)
+    (x0, x1), (y0, y1) = grid_limits(grid.num_rings, radius, padding)
+    rng = np.random.default_rng(1)
+    points = np.column_stack((rng.uniform(x0, x1, HIT_QUERIES), rng.uniform(y0, y1, HIT_QUERIES))).tolist()
+    return _timed(lambda: [index.find(x, y) for x, y in points])[0], None
+
+
+def bench_legend(grid, work_dir, dpi):  # pylint: disable=unused-argument
+    """LEGEND_CALLS пересчетов текста легенды в цветном и черно-белом режиме"""
+    titles = _attributes()['color_titles']
+    return _timed(lambda: [legend_text(grid, titles, bw_mode) for _ in range(LEGEND_CALLS // 2)
+                           for bw_mode in (False, True)])[0], None
+
+
+def bench_bw_toggle(grid, work_dir, dpi):  # pylint: disable=unused-argument
+    """Переключение в черно-белый режим и обратно, каждое - с перерисовкой"""
+    canvas, renderer = _window_figure(grid)
+    canvas.draw()
+
+    def toggle():
+        for bw_mode in (True, False):
+            renderer.set_bw_mode(bw_mode)
+            canvas.draw()
+    return _timed(toggle)[0], None
+
+
+def bench_save(grid, work_dir, dpi):  # pylint: disable=unused-argument
+    file_path = os.path.join(work_dir, 'benchmark' + CARTOGRAM_EXTENSION)
+    attributes = _attributes()
+    seconds, _ = _timed(save_cartogram, file_path, grid, attributes['coeff_padding'], attributes['color_titles'])
+    return seconds, os.path.getsize(file_path)
+
+
+def bench_load(grid, work_dir, dpi):  # pylint: disable=unused-argument
+    file_path = os.path.join(work_dir, 'benchmark' + CARTOGRAM_EXTENSION)
+    attributes = _attributes()
+    save_cartogram(file_path, grid, attributes['coeff_padding'], attributes['color_titles'])
+    return _timed(read_cartogram, file_path)[0], os.path.getsize(file_path)
+
+
+def _bench_export(export_format):
+    def bench(grid, work_dir, dpi):
+        file_path = os.path.join(work_dir, 'benchmark.' + export_format)
+        seconds, _ = _timed(export_grid, grid, _attributes(), file_path, export_format, dpi)
+        return seconds, os.path.getsize(file_path)
+    bench.__doc__ = f'Сохранение изображения {export_format.upper()}'
+    return bench
+
+
+# Операция -> замер: bench(grid, work_dir, dpi) -> (время в секундах, размер файла или None)
+CASES = {
+    'build': bench_build,
+    'hit_test': bench_hit_test,
+    'legend': bench_legend,
+    'bw_toggle': bench_bw_toggle,
+    'save': bench_save,
+    'load': bench_load,
+    'export_png': _bench_export('png'),
+    'export_pdf': _bench_export('pdf'),
+}
+
+
+def run_case(case, num_rings, repeat=3, dpi=SAVE_DPI, seed=0, work_dir='.'):
+    """
+    Замер одной операции (в текущем процессе - пиковая память будет общей с прежними замерами)
+    :return: Запись результата: лучшее и медианное время, память до замера и пиковая, размер файла
+    """
+    grid = synthetic_grid(num_rings, seed)
+    baseline = peak_rss_mb()
+    times, file_size = [], None
+    for _ in range(repeat):
+        seconds, file_size = CASES[case](grid, work_dir, dpi)
+        times.append(seconds)
+    return {'case': case, 'rings': num_rings, 'cells': len(grid), 'repeat': repeat,
+            'seconds': min(times), 'median_seconds': float(np.median(times)),
+            'baseline_rss_mb': baseline, 'peak_rss_mb': peak_rss_mb(), 'file_size': file_size}
+
+
+def run_benchmarks(ring_counts=RING_COUNTS, cases=tuple(CASES), repeat=3, dpi=SAVE_DPI, seed=0, work_dir=None,
+                   report=print):
+    """Все замеры, каждый в своем процессе: {'environment': ..., 'results': [...]}"""
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for num_rings in ring_counts:
+            for case in cases:
+                result = _in_new_process(run_case, case, num_rings, repeat, dpi, seed, work_dir or temp_dir)
+                results.append(result)
+                report(_format(result))
+    environment = {'python': platform.python_version(), 'numpy': np.__version__, 'matplotlib': mpl.__version__,
+                   'platform': platform.platform(), 'dpi': dpi, 'seed': seed,
+                   'time': time.strftime('%Y-%m-%d %H:%M:%S')}
+    return {'environment': environment, 'results': results}
+
+
+def _format(result):
+    size = f", файл {result['file_size'] / 1024:.0f} КБ" if result['file_size'] is not None else ''
+    return (f"{result['case']:>10} {result['rings']:>4} колец: {1000 * result['seconds']:9.1f} мс, "
+            f"пиковая память {result['peak_rss_mb']:.0f} МБ{size}")
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Замеры, ухудшившиеся относительно baseline больше чем в (1 + threshold) раз
+    :return: [(операция, кольца, показатель, прежнее значение, новое значение)]
+    """
+    previous = {(result['case'], result['rings']): result for result in baseline['results']}
+    regressions = []
+    for result in results['results']:
+        old = previous.get((result['case'], result['rings']))
+        if old is None:
+            continue
+        for metric in COMPARED:
+            before, after = old.get(metric), result.get(metric)
+            if before is None or after is None:
+                continue
+            if metric == 'seconds' and max(before, after) < MIN_COMPARE_SECONDS:
+                continue
+            if after > before * (1 + threshold):
+                regressions.append((result['case'], result['rings'], metric, before, after))
+    return regressions
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description='Замеры операций с картограммами на синтетических сетках')
+    parser.add_argument('-r', '--rings', type=int, nargs='+', default=list(RING_COUNTS),
+                        help=f'Количество колец (по умолчанию {" ".join(map(str, RING_COUNTS))})')
+    parser.add_argument('-c', '--case', dest='cases', action='append', choices=list(CASES),
+                        help='Операция, можно указать несколько раз (по умолчанию все)')
+    parser.add_argument('-n', '--repeat', type=int, default=3, help='Повторов каждого замера (по умолчанию 3)')
+    parser.add_argument('--dpi', type=int, default=SAVE_DPI, help=f'Разрешение экспорта (по умолчанию {SAVE_DPI})')
+    parser.add_argument('--seed', type=int, default=0, help='Начальное значение случайной картограммы')
+    parser.add_argument('-o', '--output', default='benchmark.json', help='Файл результатов JSON')
+    parser.add_argument('--baseline', help='Файл результатов прежнего запуска для сравнения')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f'Допустимое ухудшение, доля (по умолчанию {DEFAULT_THRESHOLD})')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    results = run_benchmarks(args.rings, args.cases or tuple(CASES), args.repeat, args.dpi, args.seed)
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(results, file, ensure_ascii=False, indent=2)
+    if not args.baseline:
+        return 0
+    with open(args.baseline, encoding='utf-8') as file:
+        regressions = compare(results, json.load(file), args.threshold)
+    for case, rings, metric, before, after in regressions:
+        print(f'Ухудшение: {case}, {rings} колец, {metric}: {before:.4g} -> {after:.4g} ({after / before - 1:+.0%})')
+    if not regressions:
+        print('Ухудшений нет')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
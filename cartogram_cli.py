@@ -0,0 +1,305 @@
+"""
+Пакетная работа с картограммами без окна программы
+
+Рисование идет на холсте Agg, дисплей не нужен. Пример:
+    python cartogram_cli.py export maps/ -o images/ -f png -f pdf --jobs 4
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from cartogram_diff import CartogramDiff
+from cartogram_figure import cartogram_figure
+from cartogram_io import load_cartogram, import_legacy, CARTOGRAM_EXTENSION, LEGACY_EXTENSION
+from hex_geometry import grid_geometry, base_radius
+from hex_symmetry import asymmetric_cells, SYMMETRY_MODES
+from profiling import peak_rss_mb
+from settings import SAVE_DPI
+from tiled_export import save_png_tiled
+from vector_export import save_vector, VECTOR_FORMATS
+
+
+EXPORT_FORMATS = ('png', 'pdf', 'svg')
+
+
+def find_cartograms(directory):
+    """Файлы картограмм в каталоге (новый и старый формат) в порядке имен"""
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.endswith((CARTOGRAM_EXTENSION, LEGACY_EXTENSION)))
+
+
+def read_cartogram(file_path):
+    """(grid, attributes) из файла любого поддерживаемого формата"""
+    if file_path.endswith(LEGACY_EXTENSION):
+        return import_legacy(file_path)
+    return load_cartogram(file_path)
+
+
+def _ring_count(file_path):
+    """Количество колец без чтения всего файла (для старого формата неизвестно)"""
+    if not file_path.endswith(CARTOGRAM_EXTENSION):
+        return 0
+    try:
+        with np.load(file_path, allow_pickle=False) as data:
+            return int(data['num_rings'])
+    except (OSError, ValueError, KeyError):
+        return 0
+
+
+def _geometry(grid, attributes):
+    """Геометрия сетки из общего кэша hex_geometry: файлы с теми же параметрами ее не пересчитывают"""
+    radius = base_radius(grid.num_rings)
+    return grid_geometry(grid.num_rings, radius, radius * attributes['coeff_padding'], grid.remove_corners)
+
+
+def _figure(grid, attributes, bw_mode=False):
+    """Фигура картограммы на холсте Agg"""
+    fig = cartogram_figure(grid, attributes['coeff_padding'], attributes['color_titles'], bw_mode,
+                           _geometry(grid, attributes))
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def _save(fig, output_path, export_format, dpi, tiled=False, progress=None):
+    if tiled and export_format == 'png':
+        save_png_tiled(fig, output_path, dpi, progress=progress)
+    else:
+        fig.savefig(output_path, dpi=dpi, format=export_format)
+
+
+def export_grid(grid, attributes, output_path, export_format, dpi=SAVE_DPI, bw_mode=False, view=None,
+                progress=None):
+    """
+    Сохранение картограммы из памяти в изображение (фоновое сохранение из окна программы)
+    :param view:     Пределы осей (xlim, ylim) приближенной области, None - вся картограмма
+    :param progress: progress(done, total) по ходу рисования PNG, см. background
+    :return: output_path
+    """
+    if export_format in VECTOR_FORMATS and view is None:
+        save_vector(output_path, grid, attributes['coeff_padding'], attributes['color_titles'], bw_mode,
+                    export_format, _geometry(grid, attributes))
+        return output_path
+    # Приближенная область сохраняется через matplotlib, прямая запись умеет только всю сетку
+    fig = _figure(grid, attributes, bw_mode)
+    if view is not None:
+        ax = fig.axes[0]
+        ax.set_xlim(view[0])
+        ax.set_ylim(view[1])
+    _save(fig, output_path, export_format, dpi, tiled=True, progress=progress)
+    return output_path
+
+
+def export_file(file_path, output_dir, formats=('png',), dpi=SAVE_DPI, bw_mode=False, tiled=False,
+                mpl_vector=False):
+    """
+    Сохранение одной картограммы в изображения
+    :param tiled:      PNG рисуется полосами с ограниченной памятью, см. tiled_export
+    :param mpl_vector: SVG и PDF сохраняются через matplotlib, а не напрямую (см. vector_export)
+    :return: (file_path, пути изображений, время в секундах, текст ошибки или None)
+    """
+    start = time.perf_counter()
+    try:
+        grid, attributes = read_cartogram(file_path)
+        name = os.path.splitext(os.path.basename(file_path))[0]
+        fig = None
+        outputs = []
+        for export_format in formats:
+            output_path = os.path.join(output_dir, f'{name}.{export_format}')
+            if export_format in VECTOR_FORMATS and not mpl_vector:
+                save_vector(output_path, grid, attributes['coeff_padding'], attributes['color_titles'], bw_mode,
+                            export_format, _geometry(grid, attributes))
+            else:
+                # Фигура строится только для растра, если векторные форматы пишутся напрямую
+                fig = fig or _figure(grid, attributes, bw_mode)
+                _save(fig, output_path, export_format, dpi, tiled)
+            outputs.append(output_path)
+    except Exception as error:  # pylint: disable=broad-except
+        # Ошибка в одном файле не должна останавливать весь пакет
+        return file_path, [], time.perf_counter() - start, f'{type(error).__name__}: {error}'
+    return file_path, outputs, time.perf_counter() - start, None
+
+
+def export_directory(input_dir, output_dir, formats=('png',), dpi=SAVE_DPI, bw_mode=False, jobs=None,
+                     report=print, tiled=False, mpl_vector=False):
+    """
+    Сохранение всех картограмм каталога в изображения на нескольких ядрах
+    :param jobs:   Количество процессов, по умолчанию - по числу ядер; 1 - без пула процессов
+    :param report: Функция вывода хода работы
+    :return: Список результатов export_file в порядке завершения
+    """
+    # Файлы с одинаковым числом колец идут подряд, чтобы процессы чаще переиспользовали геометрию
+    files = sorted(find_cartograms(input_dir), key=_ring_count)
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = jobs or os.cpu_count() or 1
+    start = time.perf_counter()
+    results = []
+
+    def done(result):
+        results.append(result)
+        file_path, outputs, seconds, error = result
+        status = f'ошибка: {error}' if error else ', '.join(os.path.basename(path) for path in outputs)
+        report(f'[{len(results)}/{len(files)}] {os.path.basename(file_path)} -> {status} ({seconds:.2f} с)')
+
+    if jobs == 1 or len(files) <= 1:
+        for file_path in files:
+            done(export_file(file_path, output_dir, formats, dpi, bw_mode, tiled, mpl_vector))
+    else:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(files))) as pool:
+            futures = [pool.submit(export_file, file_path, output_dir, formats, dpi, bw_mode, tiled, mpl_vector)
+                       for file_path in files]
+            for future in as_completed(futures):
+                done(future.result())
+
+    failed = sum(1 for result in results if result[3])
+    report(f'Готово: {len(files) - failed} из {len(files)} файлов за {time.perf_counter() - start:.2f} с')
+    return results
+
+
+def _measure_png(file_path, output_path, dpi, tiled):
+    """Сохранение PNG с замером: (время в секундах, память до сохранения, пиковая память), память в МБ"""
+    fig = _figure(*read_cartogram(file_path))
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    _save(fig, output_path, 'png', dpi, tiled)
+    return time.perf_counter() - start, baseline, peak_rss_mb()
+
+
+def _compare_png(first_path, second_path):
+    """Количество различающихся пикселей и наибольшая разница каналов двух PNG"""
+    from PIL import Image  # pylint: disable=import-outside-toplevel
+    first = np.asarray(Image.open(first_path).convert('RGBA'))
+    second = np.asarray(Image.open(second_path).convert('RGBA'))
+    if first.shape != second.shape:
+        return None, None
+    difference = np.abs(first.astype(np.int16) - second).max(axis=-1)
+    return int(np.count_nonzero(difference)), int(difference.max())
+
+
+def _in_new_process(function, *args):
+    # Пиковая память считается на процесс, поэтому каждый замер идет в своем процессе
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        return pool.submit(function, *args).result()
+
+
+def tiling_report(file_path, output_dir, dpi=SAVE_DPI, compare=True, report=print):
+    """
+    Сравнение обычного и полосового экспорта PNG одной картограммы по времени и пиковой памяти
+    :return: {'full': (время, память до, пиковая память), 'tiled': (...), 'difference': (пиксели, максимум)}
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    paths = {mode: os.path.join(output_dir, f'{name}.{mode}.png') for mode in ('full', 'tiled')}
+    result = {}
+    for mode, path in paths.items():
+        seconds, baseline, peak = _in_new_process(_measure_png, file_path, path, dpi, mode == 'tiled')
+        result[mode] = seconds, baseline, peak
+        report(f'{mode:>5}: {seconds:.2f} с, пиковая память {peak:.0f} МБ (до сохранения {baseline:.0f} МБ)')
+    if compare:
+        pixels, maximum = _in_new_process(_compare_png, paths['full'], paths['tiled'])
+        result['difference'] = pixels, maximum
+        report('Размеры изображений различаются' if pixels is None
+               else f'Различающихся пикселей: {pixels}, наибольшая разница {maximum}')
+    return result
+
+
+def symmetry_report(file_paths, mode='1/6', report=print):
+    """
+    Проверка симметрии картограмм
+    :return: {путь файла: индексы несимметричных элементов}
+    """
+    result = {}
+    for file_path in file_paths:
+        grid, _ = read_cartogram(file_path)
+        cells = asymmetric_cells(grid, mode)
+        result[file_path] = cells
+        report(f'{os.path.basename(file_path)}: ' + ('симметрична' if not cells.size else
+                                                     f'несимметричных элементов {cells.size}'))
+        for index in cells:
+            report(f'    кольцо {grid.ring[index]}, сектор {grid.sector[index]}, смещение {grid.offset[index]}')
+    return result
+
+
+def diff_report(old_path, new_path, cells=False, report=print):
+    """
+    Различия картограммы new_path относительно old_path: количество изменений, переходы цветов
+    и, если cells, каждый измененный элемент
+    :return: CartogramDiff
+    """
+    (old, old_attributes), (new, _) = read_cartogram(old_path), read_cartogram(new_path)
+    diff = CartogramDiff(old, new)
+    report(diff.summary())
+    for line in diff.transition_lines(old_attributes['color_titles']):
+        report(f'    {line}')
+    if cells:
+        for line in diff.cell_lines():
+            report(f'    {line}')
+    return diff
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description='Работа с картограммами без окна программы')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export = commands.add_parser('export', help='Сохранить картограммы каталога в изображения')
+    export.add_argument('input_dir', help='Каталог с файлами картограмм')
+    export.add_argument('-o', '--output-dir', help='Каталог для изображений, по умолчанию - входной')
+    export.add_argument('-f', '--format', dest='formats', action='append', choices=EXPORT_FORMATS,
+                        help='Формат изображений, можно указать несколько раз (по умолчанию png)')
+    export.add_argument('--dpi', type=int, default=SAVE_DPI, help=f'Разрешение (по умолчанию {SAVE_DPI})')
+    export.add_argument('--bw', action='store_true', help='Черно-белый режим')
+    export.add_argument('-j', '--jobs', type=int, default=None, help='Количество процессов')
+    export.add_argument('--tiled', action='store_true', help='Рисовать PNG полосами с ограниченной памятью')
+    export.add_argument('--mpl-vector', action='store_true',
+                        help='Сохранять SVG и PDF через matplotlib, а не напрямую (медленнее, файлы больше)')
+
+    tiling = commands.add_parser('tiling-report', help='Сравнить обычный и полосовой экспорт PNG по времени и памяти')
+    tiling.add_argument('file', help='Файл картограммы')
+    tiling.add_argument('-o', '--output-dir', default='.', help='Каталог для изображений')
+    tiling.add_argument('--dpi', type=int, default=SAVE_DPI, help=f'Разрешение (по умолчанию {SAVE_DPI})')
+    tiling.add_argument('--no-compare', action='store_true', help='Не сравнивать изображения попиксельно')
+
+    symmetry = commands.add_parser('check-symmetry', help='Найти элементы, нарушающие симметрию картограммы')
+    symmetry.add_argument('files', nargs='+', help='Файлы картограмм')
+    symmetry.add_argument('-m', '--mode', choices=list(SYMMETRY_MODES), default='1/6',
+                          help='Симметрия: поворот на 60 (1/6), 120 (1/3), 180 (1/2) градусов или отражение '
+                               '(по умолчанию 1/6)')
+
+    diff = commands.add_parser('diff', help='Сравнить две картограммы одного размера')
+    diff.add_argument('old', help='Прежняя картограмма')
+    diff.add_argument('new', help='Новая картограмма')
+    diff.add_argument('--cells', action='store_true', help='Перечислить измененные элементы')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    if args.command == 'export':
+        results = export_directory(args.input_dir, args.output_dir or args.input_dir, args.formats or ['png'],
+                                   args.dpi, args.bw, args.jobs, tiled=args.tiled, mpl_vector=args.mpl_vector)
+        return 1 if any(result[3] for result in results) else 0
+    if args.command == 'tiling-report':
+        tiling_report(args.file, args.output_dir, args.dpi, not args.no_compare)
+        return 0
+    if args.command == 'check-symmetry':
+        result = symmetry_report(args.files, args.mode)
+        return 1 if any(cells.size for cells in result.values()) else 0
+    if args.command == 'diff':
+        try:
+            diff = diff_report(args.old, args.new, args.cells)
+        except ValueError as error:
+            print(error)
+            return 2
+        return 1 if diff.changed.any() else 0
+    return 2
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()  # Для сборки в exe через PyInstaller
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+Сравнение двух картограмм
+
+Картограммы одного размера (число колец и удаление углов) хранят элементы в
+одном порядке модели, поэтому различия всех элементов - это поэлементное
+сравнение массивов HexGridModel за один проход NumPy, без перебора элементов.
+Переходы цветов считаются по элементам, не удаленным в обеих картограммах.
+"""
+
+import numpy as np
+
+from hex_model import PALETTE, STATE_NORMAL, STATE_DASHED, STATE_REMOVED
+
+
+STATE_NAMES = {STATE_NORMAL: 'обычный', STATE_DASHED: 'пунктирный', STATE_REMOVED: 'удален'}
+
+# Сколько переходов цветов показывать рядом с легендой
+MAX_TRANSITION_LINES = 12
+
+
+def color_label(color, color_titles=None):
+    """Имя цвета палитры с подписью пользователя, как в легенде"""
+    title = (color_titles or {}).get(color)
+    return f'{color} ({title})' if title else color
+
+
+class CartogramDiff:
+    """
+    Различия картограммы new относительно old: маски элементов по видам изменений
+    и матрица переходов цветов transitions[из, в]. Картограммы разного размера - ValueError
+    """
+
+    def __init__(self, old, new):
+        if (old.num_rings, old.remove_corners) != (new.num_rings, new.remove_corners):
+            raise ValueError(f'Картограммы разного размера: {old.num_rings} и {new.num_rings} колец'
+                             + (', углы удалены только в одной' if old.remove_corners != new.remove_corners else ''))
+        old_visible, new_visible = old.visible(), new.visible()
+        both = old_visible & new_visible
+        self.removed = old_visible & ~new_visible
+        self.restored = ~old_visible & new_visible
+        # Изменение состояния - в т.ч. пунктир, удаление и восстановление
+        self.state = old.state != new.state
+        self.color = both & (old.color != new.color)
+        self.number = old.number != new.number
+        # Подпись считается измененной и при переносе ее стрелки
+        has_text = new.text != None  # pylint: disable=singleton-comparison
+        self.text = (old.text != new.text) | has_text & (old.text_anchor != new.text_anchor).any(axis=1)
+        self.changed = self.state | self.color | self.number | self.text
+        self.transitions = np.bincount(old.color[both].astype(np.int64) * len(PALETTE) + new.color[both],
+                                       minlength=len(PALETTE) ** 2).reshape(len(PALETTE), len(PALETTE))
+        self.old, self.new = old, new
+
+    def cells(self):
+        """Индексы измененных элементов"""
+        return np.flatnonzero(self.changed)
+
+    def counts(self):
+        return {'changed': int(np.count_nonzero(self.changed)), 'color': int(np.count_nonzero(self.color)),
+                'number': int(np.count_nonzero(self.number)), 'text': int(np.count_nonzero(self.text)),
+                'state': int(np.count_nonzero(self.state)), 'removed': int(np.count_nonzero(self.removed)),
+                'restored': int(np.count_nonzero(self.restored))}
+
+    def summary(self):
+        counts = self.counts()
+        return (f"Изменено элементов: {counts['changed']} (цвет {counts['color']}, номер {counts['number']}, "
+                f"подпись {counts['text']}, состояние {counts['state']}: удалено {counts['removed']}, "
+                f"восстановлено {counts['restored']})")
+
+    def transition_lines(self, color_titles=None, limit=None):
+        """Переходы цветов 'из -> в: количество' по убыванию количества, без неизменившихся"""
+        old, new = np.nonzero(self.transitions * (1 - np.identity(len(PALETTE), dtype=np.int64)))
+        order = np.argsort(-self.transitions[old, new], kind='stable')
+        lines = [f'{color_label(PALETTE[old[k]], color_titles)} -> {color_label(PALETTE[new[k]], color_titles)}: '
+                 f'{self.transitions[old[k], new[k]]}' for k in order[:limit]]
+        if limit is not None and len(order) > limit:
+            lines.append(f'... и еще {len(order) - limit} переходов')
+        return lines
+
+    def legend_text(self, color_titles=None):
+        """Текст рядом с легендой: количество изменений и главные переходы цветов"""
+        counts = self.counts()
+        lines = [f"Отличий: {counts['changed']}", f"цвет {counts['color']}, номер {counts['number']}",
+                 f"подпись {counts['text']}, состояние {counts['state']}"]
+        transitions = self.transition_lines(color_titles, MAX_TRANSITION_LINES)
+        if transitions:
+            lines += ['Переходы цветов:'] + transitions
+        return '\n'.join(lines)
+
+    def cell_lines(self):
+        """Описание каждого измененного элемента: координаты и что изменилось"""
+        old, new = self.old, self.new
+        lines = []
+        for index in self.cells():
+            changes = []
+            if self.color[index]:
+                changes.append(f'цвет {old.color_name(index)} -> {new.color_name(index)}')
+            if self.number[index]:
+                changes.append(f'номер {old.number[index]} -> {new.number[index]}')
+            if self.text[index]:
+                changes.append(f'подпись {old.text[index]!r} -> {new.text[index]!r}')
+            if self.state[index]:
+                changes.append(f'{STATE_NAMES[old.state[index]]} -> {STATE_NAMES[new.state[index]]}')
+            lines.append(f'кольцо {new.ring[index]}, сектор {new.sector[index]}, смещение {new.offset[index]}: '
+                         + ', '.join(changes))
+        return lines
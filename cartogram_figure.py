@@ -0,0 +1,127 @@
+"""
+Построение фигуры картограммы по модели сетки
+
+Не зависит от Tk и pyplot, поэтому используется и окном программы,
+и пакетным экспортом без дисплея.
+"""
+
+from matplotlib.figure import Figure
+from matplotlib.ticker import NullLocator
+
+from helpers import key_by_value
+from hex_geometry import hex_grid_geometry, grid_offsets, base_radius
+from hex_model import PALETTE
+from hex_lod import LodGridRenderer
+from hex_render import HexGridRenderer, MIN_NUMBER_SIZE
+from settings import FIGSIZE, COLOR_TO_HATCH
+
+
+# Положение и шрифт легенды в долях фигуры
+LEGEND_POSITION = (0.85, 0.2)
+# Сводка сравнения картограмм (см. cartogram_diff) - над легендой
+DIFF_POSITION = (0.85, 0.7)
+LEGEND_FONT_SIZE = 12
+
+
+def grid_limits(num_rings, radius, padding):
+    """Исходные пределы осей (xlim, ylim) для сетки из num_rings колец"""
+    x_off, y_off = grid_offsets(radius, padding)
+    return (-x_off * num_rings * 2.5, x_off * num_rings * 2.5), (-y_off * num_rings, y_off * num_rings)
+
+
+def count_by_color(grid, bw_mode=False):
+    """
+    Количество элементов по цветам (в черно-белом режиме - по штриховкам)
+    :return: (total_count, color_count, color_names)
+    """
+    color_count = {}
+    color_names = {}
+    # Счетчики по цветам ведет модель, удаленные шестигранники в них не учитываются
+    counts = grid.count_by_color()
+    total_count = int(counts.sum())
+
+    for color, count in zip(PALETTE, counts):
+        if not count:
+            continue
+        key = COLOR_TO_HATCH.get(color) if bw_mode else color
+        color_count[key] = color_count.get(key, 0) + int(count)
+        color_names[key] = color
+
+    return total_count, color_count, color_names
+
+
+def legend_text(grid, color_titles=None, bw_mode=False):
+    """Текст легенды: общее количество и количество каждого цвета с подписью"""
+    color_titles = color_titles or {}
+    total_count, color_count, _ = count_by_color(grid, bw_mode)
+    lines = [f"Всего {total_count} элементов"]
+
+    if bw_mode:
+        for color, count in color_count.items():
+            lines.append(f"{color} ({color_titles.get(key_by_value(COLOR_TO_HATCH, color), '')}): {count}")
+    else:
+        for color, count in color_count.items():
+            lines.append(f"{color} ({color_titles.get(color, '')}): {count}")
+    return '\n'.join(lines)
+
+
+def add_legend(fig, text='', position=LEGEND_POSITION):
+    """Текстовый элемент легенды на фигуре"""
+    return fig.text(*position, text, fontsize=LEGEND_FONT_SIZE, verticalalignment='center')
+
+
+def grid_axes(fig, num_rings, radius, padding):
+    """Оси для сетки из num_rings колец: пропорции, исходные пределы и поля фигуры"""
+    ax = fig.add_subplot(111)
+
+    ax.set_aspect(1, 'box')  # Оставим такой тип, т.к. он не растягивает фигуру при приближении
+
+    # При желании можно поиграться с этими стилями
+    # ax.set_aspect('equal', 'box')
+    # ax.set_aspect(1, adjustable='datalim')
+    xlim, ylim = grid_limits(num_rings, radius, padding)
+    ax.set_xlim(xlim)
+    ax.set_ylim(ylim)
+    # ax.set_autoscale_on(False)
+    # ax.set_axis_off()
+    ax.xaxis.set_major_locator(NullLocator())
+    ax.yaxis.set_major_locator(NullLocator())
+    fig.tight_layout()
+    return ax
+
+
+def draw_grid(fig, grid, radius, padding, bw_mode=False, geometry=None, min_number_size=MIN_NUMBER_SIZE,
+              lod=False):
+    """
+    Оси с сеткой шестигранников на фигуре
+    :param fig:             Фигура matplotlib
+    :param grid:            Модель сетки HexGridModel
+    :param radius:          Радиус одного шестигранника
+    :param padding:         Отступ между шестигранниками
+    :param bw_mode:         Черно-белый режим
+    :param geometry:        Готовые (centers, vertices) для этой сетки, иначе считаются заново
+    :param min_number_size: Номера мельче этого размера шрифта скрываются
+    :param lod:             Уровень детализации для больших сеток (LodGridRenderer), для окна программы
+    :return: HexGridRenderer
+    """
+    ax = grid_axes(fig, grid.num_rings, radius, padding)
+    if geometry is None:
+        geometry = hex_grid_geometry(grid.num_rings, radius, padding, grid.remove_corners)
+    centers, vertices = geometry
+
+    # Все элементы - одна коллекция, состояние берется из модели
+    renderer_class = LodGridRenderer if lod else HexGridRenderer
+    return renderer_class(ax, grid, centers, vertices, radius, padding, bw_mode, min_number_size=min_number_size)
+
+
+def cartogram_figure(grid, coeff_padding, color_titles=None, bw_mode=False, geometry=None):
+    """
+    Готовая фигура картограммы с легендой для сохранения в файл
+    :param geometry: Готовые (centers, vertices) для радиуса base_radius(grid.num_rings)
+    """
+    radius = base_radius(grid.num_rings)
+    fig = Figure(figsize=FIGSIZE)
+    # В файле номера видны при любом размере
+    draw_grid(fig, grid, radius, radius * coeff_padding, bw_mode, geometry, min_number_size=0)
+    add_legend(fig, legend_text(grid, color_titles, bw_mode))
+    return fig
@@ -0,0 +1,165 @@
+"""
+Сохранение и загрузка картограмм
+
+Картограмма хранится в архиве NumPy .npz только как логическое состояние
+сетки: кольца, отступ, индексы цветов, состояния, номера и подписи.
+Фигура по нему строится заново. Объекты Python в файл не попадают, поэтому
+файл не зависит от версии matplotlib и безопасен для открытия.
+"""
+
+import numpy as np
+
+from helpers import hex_to_name, key_by_value
+from hex_model import HexGridModel, PALETTE, BASE_COLOR_INDEX, STATE_REMOVED, STATE_DASHED
+from settings import NUM_SIDES_HEXAGON, COLOR_TO_HATCH, BASE_COLOR
+
+
+FORMAT_VERSION = 1
+CARTOGRAM_EXTENSION = '.npz'
+LEGACY_EXTENSION = '.pkl'
+
+# Отступ между шестигранниками в долях радиуса для файлов, где он не сохранен
+DEFAULT_COEFF_PADDING = 0.4
+
+
+def save_cartogram(file, grid, coeff_padding, color_titles=None, selected_color=BASE_COLOR):
+    """
+    Запись картограммы
+    :param file:           Путь или открытый двоичный файл
+    :param grid:           Модель сетки HexGridModel
+    :param coeff_padding:  Отступ между шестигранниками в долях радиуса
+    :param color_titles:   Подписи цветов легенды {цвет: подпись}
+    :param selected_color: Текущий цвет
+    """
+    color_titles = color_titles or {}
+    has_text = grid.text != None  # pylint: disable=singleton-comparison
+    np.savez_compressed(
+        file,
+        version=np.int32(FORMAT_VERSION),
+        num_rings=np.int32(grid.num_rings),
+        remove_corners=np.bool_(grid.remove_corners),
+        coeff_padding=np.float64(coeff_padding),
+        selected_color=np.str_(selected_color),
+        # Цвета сохраняются индексами в палитре, сама палитра - именами, чтобы пережить ее изменение
+        palette=np.array(PALETTE),
+        key=grid.key,
+        color=grid.color,
+        state=grid.state,
+        number=grid.number,
+        has_text=has_text,
+        text=np.array([str(text) if text is not None else '' for text in grid.text], dtype=str),
+        text_anchor=grid.text_anchor,
+        title_colors=np.array(list(color_titles.keys()), dtype=str),
+        titles=np.array(list(color_titles.values()), dtype=str),
+    )
+
+
+def load_cartogram(file):
+    """
+    Чтение картограммы, записанной save_cartogram
+    :return: (grid, attributes), где attributes - coeff_padding, color_titles и selected_color
+    """
+    with np.load(file, allow_pickle=False) as data:
+        version = int(data['version'])
+        if version > FORMAT_VERSION:
+            raise ValueError(f'Файл записан более новой версией программы (формат {version})')
+
+        grid = HexGridModel(int(data['num_rings']), bool(data['remove_corners']))
+        if not np.array_equal(grid.key, data['key']):
+            raise ValueError('Элементы файла не совпадают с сеткой')
+
+        # Цвета, которых больше нет в палитре, становятся базовым цветом
+        palette = [PALETTE.index(color) if color in PALETTE else BASE_COLOR_INDEX for color in data['palette']]
+        grid.color[:] = np.array(palette, dtype=np.uint8)[data['color']]
+        grid.state[:] = data['state']
+        grid.number[:] = data['number']
+        has_text = data['has_text']
+        grid.text[has_text] = data['text'][has_text].tolist()
+        grid.text_anchor[:] = data['text_anchor']
+        grid.recount()
+
+        attributes = {
+            'coeff_padding': float(data['coeff_padding']),
+            'color_titles': dict(zip(data['title_colors'].tolist(), data['titles'].tolist())),
+            'selected_color': str(data['selected_color']),
+        }
+    return grid, attributes
+
+
+def import_legacy(file_path):
+    """
+    Чтение картограммы старого формата (pickle). Pickle может выполнить код,
+    поэтому открывать так можно только собственные файлы
+    :return: (grid, attributes), как у load_cartogram
+    """
+    # Старый формат хранит объекты matplotlib, pickle и matplotlib импортируются только для него
+    import pickle  # pylint: disable=import-outside-toplevel
+    with open(file_path, 'rb') as file:
+        loaded_attributes = pickle.load(file)
+
+    if "grid" in loaded_attributes:
+        grid = loaded_attributes["grid"]
+        grid.recount()
+    else:
+        grid = grid_from_legacy(loaded_attributes)
+
+    if "coeff_padding" in loaded_attributes:
+        coeff_padding = loaded_attributes["coeff_padding"]
+    elif "padding" in loaded_attributes:
+        # В старых файлах хранился сам отступ при радиусе base_radius(num_rings)
+        coeff_padding = loaded_attributes["padding"] * (1.5 * grid.num_rings + 1) / 100
+    else:
+        coeff_padding = DEFAULT_COEFF_PADDING
+    attributes = {
+        'coeff_padding': coeff_padding,
+        'color_titles': loaded_attributes.get("color_titles") or {},
+        'selected_color': loaded_attributes.get("selected_color", BASE_COLOR),
+    }
+    return grid, attributes
+
+
+def grid_from_legacy(loaded_attributes):
+    """Восстановление модели из старой картограммы с сохраненными объектами Polygon"""
+    import matplotlib as mpl  # pylint: disable=import-outside-toplevel
+    grid = HexGridModel(loaded_attributes["num_rings"], loaded_attributes["remove_corners"])
+    patches = loaded_attributes["hexagon_patches"]
+    color_map = loaded_attributes.get("color_map", {})
+    removed = loaded_attributes.get("removed_hexagons") or set()
+    dashed = loaded_attributes.get("dashed_hexagons") or set()
+    numbers = loaded_attributes.get("hexagon_numbers", {})
+    texts = loaded_attributes.get("hexagon_texts", {})
+
+    # Элементы сохранялись в том же порядке, что и в модели
+    for index, hexagon in enumerate(patches[:len(grid)]):
+        color = color_map.get(hexagon)
+        if color is None:
+            color = key_by_value(COLOR_TO_HATCH, hexagon.get_hatch()) if hexagon.get_hatch() \
+                else hex_to_name(mpl.colors.to_hex(hexagon.get_facecolor()))
+        if color in PALETTE:
+            grid.set_color(index, color)
+
+        if hexagon in removed:
+            grid.set_state(index, STATE_REMOVED)
+        elif hexagon in dashed or hexagon.get_linestyle() in ('--', 'dashed'):
+            grid.set_state(index, STATE_DASHED)
+
+        center = hexagon.get_xy()[:NUM_SIDES_HEXAGON].mean(axis=0)
+        radius = np.linalg.norm(hexagon.get_xy()[0] - center)
+        if hexagon in numbers:
+            number = numbers[hexagon].get_text().strip()
+            if number.lstrip('-').isdigit():
+                grid.set_number(index, int(number))
+        if hexagon in texts:
+            annotation = texts[hexagon]
+            grid.set_text(index, annotation.get_text(), (np.array(annotation.xy) - center) / radius)
+    return grid
+
+
+def convert_legacy(file_path, new_path=None):
+    """Однократное преобразование файла .pkl в новый формат, возвращает путь нового файла"""
+    grid, attributes = import_legacy(file_path)
+    if new_path is None:
+        new_path = file_path[:-len(LEGACY_EXTENSION)] if file_path.endswith(LEGACY_EXTENSION) else file_path
+        new_path += CARTOGRAM_EXTENSION
+    save_cartogram(new_path, grid, **attributes)
+    return new_path
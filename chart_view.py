@@ -0,0 +1,97 @@
+"""
+Фигура картограммы в окне программы
+
+Модуль тянет matplotlib и его бэкенд Tk, импорт которых занимает большую часть
+запуска, поэтому окно импортирует его только после показа кнопок (см. main_v11).
+"""
+
+import matplotlib as mpl
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.backends.backend_tkagg import NavigationToolbar2Tk
+from matplotlib.figure import Figure
+from matplotlib.widgets import LassoSelector, RectangleSelector
+
+from cartogram_cli import read_cartogram
+from cartogram_figure import draw_grid
+from hex_geometry import grid_geometry, base_radius, HexHitIndex
+from hex_render import CellBlitter
+from settings import FIGSIZE, SAVE_DPI
+
+
+mpl.rcParams['savefig.dpi'] = SAVE_DPI  # Устанавливаем DPI для сохраняемых изображений
+
+
+def prepare_chart(grid, coeff_padding, progress=None):
+    """
+    Массивы фигуры картограммы: (radius, padding, geometry, hit_index).
+    Здесь только NumPy без объектов matplotlib, поэтому выполняется в рабочем потоке
+    """
+    radius = base_radius(grid.num_rings)  # Радиус шестигранников
+    padding = radius * coeff_padding  # Расстояние между шестигранниками
+    geometry = grid_geometry(grid.num_rings, radius, padding, grid.remove_corners)
+    if progress:
+        progress(1, 2)
+    hit_index = HexHitIndex(grid.num_rings, radius, padding, grid.remove_corners)
+    if progress:
+        progress(2, 2)
+    return radius, padding, geometry, hit_index
+
+
+def build_chart(grid, coeff_padding, bw_mode=False, prepared=None):
+    """
+    Фигура картограммы для окна: (fig, renderer, hit_index).
+    Фигура и художники создаются в потоке Tk, массивы можно подготовить в фоне
+    :param prepared: Результат prepare_chart для этой сетки, иначе массивы считаются здесь
+    """
+    radius, padding, geometry, hit_index = prepared or prepare_chart(grid, coeff_padding)
+    fig = Figure(figsize=FIGSIZE)
+    renderer = draw_grid(fig, grid, radius, padding, bw_mode, geometry, lod=True)
+    return fig, renderer, hit_index
+
+
+def load_chart(file_path, progress=None):
+    """Чтение картограммы и массивы ее фигуры в рабочем потоке: (grid, attributes, prepared), см. prepare_chart"""
+    grid, attributes = read_cartogram(file_path)
+    return grid, attributes, prepare_chart(grid, attributes['coeff_padding'], progress)
+
+
+class CartogramToolbar(NavigationToolbar2Tk):
+    """
+    Панель инструментов, сохраняющая изображение в фоне, а не в обработчике кнопки
+    """
+
+    def __init__(self, canvas, window, save_image):
+        self._save_image = save_image
+        super().__init__(canvas, window)
+
+    def save_figure(self, *args):
+        self._save_image()
+
+
+def create_canvas(fig, master, renderer, save_image):
+    """Холст Tk с панелью инструментов и частичной перерисовкой: (canvas, toolbar, blitter)"""
+    canvas = FigureCanvasTkAgg(fig, master=master)
+    toolbar = CartogramToolbar(canvas, master, save_image)
+    toolbar.update()
+    blitter = CellBlitter(canvas, renderer)
+    # canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+    canvas.get_tk_widget().pack(fill='none', expand=False)
+    return canvas, toolbar, blitter
+
+
+def region_selectors(ax, on_rectangle, on_lasso):
+    """
+    Выделение области прямоугольником и лассо, изначально выключенное
+    :param on_rectangle: on_rectangle(угол, противоположный угол) в координатах данных
+    :param on_lasso:     on_lasso(вершины многоугольника) в координатах данных
+    :return: {'rectangle': RectangleSelector, 'lasso': LassoSelector}
+    """
+    selectors = {
+        'rectangle': RectangleSelector(ax, lambda press, release: on_rectangle((press.xdata, press.ydata),
+                                                                               (release.xdata, release.ydata)),
+                                       useblit=True, button=[1]),
+        'lasso': LassoSelector(ax, on_lasso, useblit=True, button=[1]),
+    }
+    for selector in selectors.values():
+        selector.set_active(False)
+    return selectors
@@ -0,0 +1,137 @@
+"""
+Контуры глифов шрифта matplotlib
+
+Текст, который повторяется тысячи раз (номера элементов), раскладывается на
+общие контуры глифов один раз, а дальше только расставляется по местам:
+в векторном экспорте (vector_export) и в слое номеров на экране (hex_render).
+"""
+
+from functools import lru_cache
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.font_manager import FontProperties, findfont, get_font
+from matplotlib.textpath import TextToPath
+from matplotlib.transforms import Affine2D
+
+
+# Единица рисунка - пункт, как у matplotlib в SVG и PDF
+POINTS_PER_INCH = 72
+# Разрешение для замера строк текста
+MEASURE_DPI = 720
+
+
+class GlyphSet:
+    """
+    Контуры глифов шрифта matplotlib по умолчанию в единицах TextToPath.FONT_SCALE
+    """
+
+    def __init__(self):
+        # Растровые шрифты выравниваются по пикселям, поэтому строки замеряются при большом разрешении
+        self._fig = Figure(dpi=MEASURE_DPI)
+        self._text_to_path = TextToPath()
+        self._font = get_font(findfont(FontProperties()))
+        self._font.set_size(TextToPath.FONT_SCALE, TextToPath.DPI)
+        self._property = FontProperties(size=TextToPath.FONT_SCALE)
+        self._layouts = {}
+        self._metrics = {}
+        # Глифы, которые встретились в тексте: идентификатор -> (вершины, коды)
+        self.paths = {}
+
+    def line_metrics(self, size, multiline=False):
+        """
+        Подъем первой строки, опускание последней и шаг между строками в пунктах. Их считает сам
+        matplotlib (в разных версиях по-разному), поэтому они замеряются по тексту на фигуре
+        """
+        key = size, multiline
+        if key not in self._metrics:
+            extents = []
+            for lines in ((2, 3) if multiline else (1,)):
+                artist = self._fig.text(0, 0, '\n'.join(['lp'] * lines), fontsize=size, va='baseline')
+                extent = artist.get_window_extent()
+                extents.append(extent.transformed(Affine2D().scale(POINTS_PER_INCH / MEASURE_DPI)))
+                artist.remove()
+            if multiline:
+                first, second = extents
+                step = second.height - first.height
+                # Базовая линия в точке (0, 0) фигуры - первой строки или последней, смотря по версии
+                if np.isclose(first.y1, second.y1):
+                    ascent, descent = first.y1, -first.y0 - step
+                else:
+                    ascent, descent = first.y1 - step, -first.y0
+            else:
+                ascent, descent, step = extents[0].y1, -extents[0].y0, 0
+            self._metrics[key] = ascent, descent, step
+        return self._metrics[key]
+
+    def layout(self, line):
+        """Ширина строки в долях размера шрифта и глифы [(идентификатор, смещение в единицах шрифта)]"""
+        if line not in self._layouts:
+            # Шрифт общий с matplotlib, размер мог измениться при замерах
+            self._font.set_size(TextToPath.FONT_SCALE, TextToPath.DPI)
+            glyph_info, glyph_map, _ = self._text_to_path.get_glyphs_with_font(
+                self._font, line, glyph_map=self.paths, return_new_glyphs_only=True)
+            self.paths.update(glyph_map)
+            width, _, _ = self._text_to_path.get_text_width_height_descent(line, self._property, False)
+            glyphs = [(glyph_id, x) for glyph_id, x, _, _ in glyph_info]
+            self._layouts[line] = width / TextToPath.FONT_SCALE, glyphs
+        return self._layouts[line]
+
+    def layout_digits(self, line):
+        """Как layout, но из готовых глифов отдельных символов - для номеров, у цифр шрифта нет кернинга"""
+        if line not in self._layouts:
+            width, glyphs = 0, []
+            for char in line:
+                char_width, char_glyphs = self.layout(char)
+                glyphs += [(glyph_id, x + width * TextToPath.FONT_SCALE) for glyph_id, x in char_glyphs]
+                width += char_width
+            self._layouts[line] = width, glyphs
+        return self._layouts[line]
+
+    def runs(self, text, x, y, size, ha='center', digits=False):
+        """
+        Строки текста с выравниванием по вертикали по центру, как у matplotlib
+        :param digits: Текст из цифр, см. layout_digits
+        :return: [(x, базовая линия, масштаб, глифы)] и рамка текста (x0, y0, x1, y1)
+        """
+        lines = text.split('\n')
+        ascent, descent, step = self.line_metrics(size, len(lines) > 1)
+        first = -ascent
+        bottom = first - step * (len(lines) - 1) - descent
+        # Центр блока строк совпадает с точкой y
+        shift = y - bottom / 2
+        runs = []
+        max_width = 0
+        for number, line in enumerate(lines):
+            width, glyphs = self.layout_digits(line) if digits else self.layout(line)
+            width *= size
+            max_width = max(max_width, width)
+            left = x - width / 2 if ha == 'center' else x
+            runs.append((left, shift + first - step * number, size / TextToPath.FONT_SCALE, glyphs))
+        left = x - max_width / 2 if ha == 'center' else x
+        return runs, (left, shift + bottom, left + max_width, shift)
+
+
+# Символы номеров элементов; пробел после номера - только отступ, как у номеров в Text
+NUMBER_CHARS = '0123456789-'
+
+
+@lru_cache(maxsize=1)
+def number_glyphs():
+    """
+    Контуры символов номеров в долях размера шрифта, базовая линия на нуле, начало символа в x = 0
+    :return: (ширины символов NUMBER_CHARS, [(вершины, коды)] символов, ширина пробела,
+              (подъем, опускание) строки, как у Text с va='center')
+    """
+    glyphs = GlyphSet()
+    widths, outlines = [], []
+    for char in NUMBER_CHARS:
+        width, placed = glyphs.layout(char)
+        widths.append(width)
+        vertices = [glyphs.paths[glyph_id][0] + (x, 0) for glyph_id, x in placed]
+        codes = [glyphs.paths[glyph_id][1] for glyph_id, _ in placed]
+        outlines.append((np.concatenate(vertices or [np.zeros((0, 2))]) / TextToPath.FONT_SCALE,
+                         np.concatenate(codes or [np.zeros(0, dtype=np.uint8)]).astype(np.uint8)))
+    ascent, descent, _ = glyphs.line_metrics(TextToPath.FONT_SCALE)
+    return (np.array(widths), outlines, glyphs.layout(' ')[0],
+            (ascent / TextToPath.FONT_SCALE, descent / TextToPath.FONT_SCALE))
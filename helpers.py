@@ -2,7 +2,6 @@
 Вспомогательные функции
 """
 
-import webcolors
 import numpy as np
 
 
@@ -14,6 +13,8 @@ def key_by_value(dictionary, value):
 
 
 def hex_to_name(color_hex):
+    # Нужен только для старых картограмм, поэтому не замедляет запуск программы
+    import webcolors  # pylint: disable=import-outside-toplevel
     try:
         return webcolors.hex_to_name(color_hex)
     except ValueError:
@@ -25,22 +26,16 @@ def is_corner_hexagon(i, j, num_rings, ring):
     return ring == (num_rings - 1) and (i, j) in [(0, 0), (1, 0), (2, 0), (3, 0), (4, 0), (5, 0)]
 
 
-def find_closest_edge(hexagon, point):
-    x, y = point
-    vertices = hexagon.get_xy()
-    min_dist = float('inf')
-    closest_edge_midpoint = (0, 0)
-
-    for i in range(6):
-        x1, y1 = vertices[i]
-        x2, y2 = vertices[(i + 1) % 6]
-
-        # Вычисляем середину грани
-        mx, my = (x1 + x2) / 2, (y1 + y2) / 2
-
-        dist = np.sqrt((x - mx) ** 2 + (y - my) ** 2)
-        if dist < min_dist:
-            min_dist = dist
-            closest_edge_midpoint = (mx, my)
-
-    return closest_edge_midpoint
\ No newline at end of file
+def find_closest_edge(vertices, point):
+    """
+    Середина ближайшей к точке грани многоугольника
+    :param vertices: Вершины (N, 2) без повторения первой в конце
+    :param point:    Точка (x, y)
+    :return: (x, y) середины грани
+    """
+    vertices = np.asarray(vertices)
+    # Середины граней (i, i + 1); при равных расстояниях берется первая, как в прежнем цикле
+    midpoints = (vertices + np.roll(vertices, -1, axis=0)) / 2
+    distance = np.hypot(midpoints[:, 0] - point[0], midpoints[:, 1] - point[1])
+    mx, my = midpoints[np.argmin(distance)]
+    return float(mx), float(my)
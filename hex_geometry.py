@@ -0,0 +1,164 @@
+"""
+Геометрия сетки шестигранников
+"""
+
+from functools import lru_cache
+import math
+
+import numpy as np
+
+from helpers import find_closest_edge
+from hex_model import cell_keys
+from settings import NUM_SIDES_HEXAGON
+
+
+# Вершины шестигранника единичного радиуса
+UNIT_HEXAGON = np.column_stack((np.cos(2 * np.pi / NUM_SIDES_HEXAGON * np.arange(NUM_SIDES_HEXAGON)),
+                                np.sin(2 * np.pi / NUM_SIDES_HEXAGON * np.arange(NUM_SIDES_HEXAGON))))
+
+
+def base_radius(num_rings):
+    """Радиус шестигранника, при котором сетка из num_rings колец занимает весь рисунок"""
+    return 100 / (1.5 * num_rings + 1)
+
+
+def grid_offsets(radius, padding):
+    """Шаг сетки по осям (x_off, y_off) так же, как в draw_hex_grid"""
+    return 1.5 * (radius + padding), math.sqrt(3) * (radius + padding)
+
+
+def hex_grid_geometry(num_rings, radius, padding, remove_corners=False, origin=(0, 0)):
+    """
+    Центры и вершины всех элементов сетки за один проход NumPy
+    :param num_rings:      Кольца
+    :param radius:         Радиус одного шестигранника
+    :param padding:        Отступ между шестигранниками
+    :param remove_corners: Удалять угловые элементы внешнего кольца
+    :param origin:         Центр для сетки
+    :return: centers (N, 2), vertices (N, 6, 2) в порядке модели HexGridModel
+    """
+    ring, sector, offset, _ = cell_keys(num_rings, remove_corners)
+    x_off, y_off = grid_offsets(radius, padding)
+    x_center, y_center = origin
+
+    angle = sector * math.radians(60)
+    next_angle = angle + math.radians(60)
+    x_shift = offset * x_off * np.cos(next_angle) + (ring - offset) * x_off * np.cos(angle)
+    y_shift = offset * y_off * np.sin(next_angle) + (ring - offset) * y_off * np.sin(angle)
+
+    # Как и в исходном цикле, по горизонтали откладывается y_shift, а по вертикали x_shift
+    centers = np.column_stack((y_center + y_shift, x_center + x_shift))
+    # Центральный элемент (последний) рисуется в самой точке origin
+    if centers.size:
+        centers[-1] = origin
+
+    vertices = centers[:, None, :] + radius * UNIT_HEXAGON[None, :, :]
+    return centers, vertices
+
+
+# Сколько последних геометрий сетки хранится: шаг отступа туда и обратно их не пересчитывает.
+# Геометрия 300 колец занимает около 30 МБ
+GEOMETRY_CACHE_SIZE = 4
+# Значащих цифр отступа в ключе кэша: умножение и деление на один шаг дают тот же ключ
+PADDING_DIGITS = 10
+
+
+@lru_cache(maxsize=GEOMETRY_CACHE_SIZE)
+def _cached_geometry(num_rings, radius, padding, remove_corners):
+    centers, vertices = hex_grid_geometry(num_rings, radius, padding, remove_corners)
+    centers.flags.writeable = vertices.flags.writeable = False
+    return centers, vertices
+
+
+def grid_geometry(num_rings, radius, padding, remove_corners=False):
+    """
+    hex_grid_geometry с кэшем последних GEOMETRY_CACHE_SIZE сеток по (num_rings, radius, padding, remove_corners).
+    Массивы общие для всех вызовов с тем же ключом, поэтому только для чтения
+    """
+    padding = float(f'{padding:.{PADDING_DIGITS}g}')
+    return _cached_geometry(int(num_rings), float(radius), padding, bool(remove_corners))
+
+
+# Направления секторов в базисе решетки (v0, v1): v(k+1) = v(k) - v(k-1)
+SECTOR_AXES = np.array([(1, 0), (0, 1), (-1, 1), (-1, 0), (0, -1), (1, -1)])
+
+
+def lattice_coords(ring, sector, offset):
+    """Целочисленные координаты (a, b) элементов в базисе решетки"""
+    ring = np.asarray(ring, dtype=np.int64)[:, None]
+    offset = np.asarray(offset, dtype=np.int64)[:, None]
+    sector = np.asarray(sector, dtype=np.int64)
+    return (ring - offset) * SECTOR_AXES[sector] + offset * SECTOR_AXES[(sector + 1) % 6]
+
+
+def lattice_basis(radius, padding):
+    """Матрица 2x2, столбцы которой - центры элементов (1, 0, 0) и (1, 1, 0) на рисунке"""
+    x_off, y_off = grid_offsets(radius, padding)
+    return np.array([[0.0, y_off * math.sin(math.radians(60))],
+                     [x_off, x_off * math.cos(math.radians(60))]])
+
+
+def lattice_table(num_rings, remove_corners=False, margin=2):
+    """
+    Индексы элементов в квадратной таблице по координатам решетки (-1 - нет элемента)
+    :param margin: Запас пустых узлов по краям, чтобы соседей можно было брать без проверки границ
+    :return: (table, shift), где элемент (a, b) лежит в table[a + shift, b + shift]
+    """
+    ring, sector, offset, _ = cell_keys(num_rings, remove_corners)
+    shift = max(num_rings - 1, 0) + margin
+    table = np.full((2 * shift + 1, 2 * shift + 1), -1, dtype=np.int32)
+    coords = lattice_coords(ring, sector, offset) + shift
+    table[coords[:, 0], coords[:, 1]] = np.arange(len(coords), dtype=np.int32)
+    return table, shift
+
+
+class HexHitIndex:
+    """
+    Поиск элемента под точкой за O(1)
+
+    Центры элементов образуют решетку, поэтому точку достаточно перевести
+    в координаты решетки и проверить несколько соседних узлов.
+    """
+
+    # Соседние узлы решетки, среди которых ищется элемент
+    _NEIGHBOURS = np.array([(da, db) for da in range(-1, 3) for db in range(-1, 3)])
+
+    def __init__(self, num_rings, radius, padding, remove_corners=False):
+        self.radius = radius
+        self.basis = lattice_basis(radius, padding)
+        self._inverse = np.linalg.inv(self.basis)
+        self._cells, self._shift = lattice_table(num_rings, remove_corners)
+        ring, sector, offset, _ = cell_keys(num_rings, remove_corners)
+        self._coords = lattice_coords(ring, sector, offset)
+
+    def find(self, x, y):
+        """Индекс элемента, в который попадает точка, или None (промежуток между элементами или вне сетки)"""
+        a, b = self._inverse @ (x, y)
+        if not (np.isfinite(a) and np.isfinite(b)):
+            return None
+        nodes = np.floor((a, b)).astype(np.int64) + self._NEIGHBOURS
+        cells = self._cells[tuple(np.clip(nodes + self._shift, 0, len(self._cells) - 1).T)]
+        nodes, cells = nodes[cells >= 0], cells[cells >= 0]
+        if not cells.size:
+            return None
+
+        # Попадание в шестигранник с вершинами на углах 0, 60, ... градусов
+        delta = np.array((x, y)) - nodes @ self.basis.T
+        dx, dy = np.abs(delta).T
+        inside = (dy <= math.sqrt(3) / 2 * self.radius) & (math.sqrt(3) * dx + dy <= math.sqrt(3) * self.radius)
+        if not inside.any():
+            return None
+        # При малом отступе шестигранники перекрываются - берем ближайший центр
+        distance = np.where(inside, np.hypot(delta[:, 0], delta[:, 1]), np.inf)
+        return int(cells[np.argmin(distance)])
+
+    def vertices(self, index):
+        """Вершины (6, 2) элемента index по узлу решетки"""
+        return self._coords[index] @ self.basis.T + self.radius * UNIT_HEXAGON
+
+    def closest_edge(self, x, y):
+        """Элемент под точкой и середина его ближайшей грани или (None, None)"""
+        index = self.find(x, y)
+        if index is None:
+            return None, None
+        return index, find_closest_edge(self.vertices(index), (x, y))
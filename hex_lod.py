@@ -0,0 +1,359 @@
+"""
+Уровень детализации для больших сеток
+
+Коллекция из сотен тысяч шестигранников рисуется секундами, поэтому при
+отдалении сетка показывается растром, построенным прямо из массивов модели.
+Центры элементов образуют решетку (см. hex_geometry.lattice_basis), и растр
+строится в ее координатах: на каждый узел приходится k x k пикселей одной
+и той же плитки, а на оси изображение выводится аффинным преобразованием.
+Растр строится только для видимой области с запасом и в разрешении экрана.
+
+При приближении, когда в видимую область попадает не больше MAX_VECTOR_CELLS
+элементов, рисуются настоящие шестигранники, но только элементов видимой
+области с запасом. Сдвиг внутри запаса ничего не пересобирает.
+"""
+
+from functools import lru_cache
+import math
+
+import numpy as np
+import matplotlib as mpl
+from matplotlib.artist import Artist
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.patches import Rectangle
+from matplotlib.transforms import Affine2D, Bbox
+
+from hex_geometry import lattice_basis, lattice_table
+from hex_model import PALETTE, STATE_REMOVED
+from hex_render import HexGridRenderer, cell_colors, EDGE_COLOR, HATCHES, LINE_WIDTH, MIN_NUMBER_SIZE, NO_COLOR
+
+
+# Больше элементов в видимой области - растр, меньше - векторные элементы
+MAX_VECTOR_CELLS = 4000
+# Запас вокруг видимой области в долях ее размера с каждой стороны
+VIEW_MARGIN = 0.25
+# Ограничения растра: пикселей на шаг решетки и пикселей всего
+MAX_RASTER_SUBDIVISION = 16
+MAX_RASTER_PIXELS = 2 ** 22
+# Точек на сторону пикселя при расчете долей заливки и границы в плитке
+RASTER_SUPERSAMPLE = 4
+
+# Узлы параллелограмма решетки, которым может принадлежать пиксель плитки
+_CORNERS = np.array([(0, 0), (1, 0), (0, 1), (1, 1)])
+
+
+@lru_cache(maxsize=None)
+def hatch_coverage(hatch):
+    """Доля площади, закрываемая линиями штриховки (штриховка рисуется в пунктах, от масштаба не зависит)"""
+    fig = Figure(figsize=(1, 1), dpi=72)
+    canvas = FigureCanvasAgg(fig)
+    fig.patch.set_visible(False)
+    fig.add_artist(Rectangle((0, 0), 1, 1, transform=fig.transFigure, hatch=hatch, facecolor='none',
+                             edgecolor='black', linewidth=0))
+    canvas.draw()
+    return float(np.asarray(canvas.buffer_rgba())[..., 3].mean() / 255)
+
+
+def raster_tile(basis, radius, subdivision, line_width):
+    """
+    Плитка растра: k x k пикселей параллелограмма решетки между узлами (a, b) и (a + 1, b + 1)
+    :param basis:       Матрица решетки (см. lattice_basis)
+    :param radius:      Радиус шестигранника
+    :param subdivision: k - пикселей на шаг решетки
+    :param line_width:  Толщина границы элемента в единицах данных
+    :return: (da, db, inner, edge) - сдвиг узла, которому принадлежит пиксель, и доли площади
+             пикселя под заливкой и под границей элемента
+    """
+    k, samples = subdivision, RASTER_SUPERSAMPLE
+
+    def nearest_corner(a, b):
+        # Ближайший узел ищется в координатах рисунка, т.к. решетка косоугольная
+        offsets = np.stack((a, b), axis=-1)[..., None, :] - _CORNERS
+        return np.argmin(np.sum((offsets @ basis.T) ** 2, axis=-1), axis=-1)
+
+    pixel = (np.arange(k) + 0.5) / k
+    owner = nearest_corner(*np.meshgrid(pixel, pixel, indexing='ij'))
+
+    # Доли считаются по ближайшему элементу каждой точки пикселя, а цвет пикселя - по элементу его центра
+    sample = (np.arange(k * samples) + 0.5) / (k * samples)
+    a, b = np.meshgrid(sample, sample, indexing='ij')
+    corner = _CORNERS[nearest_corner(a, b)]
+    dx, dy = np.abs((np.stack((a, b), axis=-1) - corner) @ basis.T).transpose(2, 0, 1)
+    # Расстояние до границы шестигранника с вершинами на углах 0, 60, ... градусов (внутри - положительное)
+    distance = math.sqrt(3) / 2 * radius - np.maximum(dy, (math.sqrt(3) * dx + dy) / 2)
+    inner = (distance >= line_width / 2).reshape(k, samples, k, samples).mean(axis=(1, 3))
+    edge = (np.abs(distance) < line_width / 2).reshape(k, samples, k, samples).mean(axis=(1, 3))
+    da, db = _CORNERS[owner].transpose(2, 0, 1)
+    return da, db, inner.astype(np.float32), edge.astype(np.float32)
+
+
+def _over(top, bottom):
+    """Цвет RGBA top поверх непрозрачного RGB bottom"""
+    alpha = top[..., 3:]
+    return top[..., :3] * alpha + bottom * (1 - alpha)
+
+
+def _expand(box, margin):
+    x0, x1, y0, y1 = box
+    dx, dy = (x1 - x0) * margin, (y1 - y0) * margin
+    return x0 - dx, x1 + dx, y0 - dy, y1 + dy
+
+
+def _contains(box, view):
+    """Область box (или None) целиком содержит view"""
+    return box is not None and box[0] <= view[0] and view[1] <= box[1] and box[2] <= view[2] and view[3] <= box[3]
+
+
+class LatticeRaster(Artist):
+    """
+    Растр в координатах решетки на осях. Каждый пиксель экрана берет ближайший пиксель
+    растра, поэтому время отрисовки зависит от размера осей, а не растра
+    """
+
+    # Строк экрана за один вызов draw_image, чтобы при сохранении в большом разрешении память была ограничена
+    DRAW_ROWS = 256
+
+    def __init__(self, to_raster):
+        """:param to_raster: Преобразование из координат данных в (строка, столбец) растра"""
+        super().__init__()
+        self.to_raster = to_raster
+        self.pixels = np.zeros((0, 0), dtype=np.uint32)
+
+    def set_pixels(self, pixels):
+        """:param pixels: Цвета RGBA (uint8), упакованные в uint32, по строкам и столбцам растра"""
+        self.pixels = pixels
+        self.stale = True
+
+    def draw(self, renderer):
+        if not self.get_visible():
+            return
+        ax = self.axes
+        area = Bbox.intersection(ax.bbox, self.figure.bbox)
+        if area is None:
+            return
+        (x0, y0), (x1, y1) = np.floor(area.p0).astype(int), np.ceil(area.p1).astype(int)
+        matrix = (ax.transData.inverted() + self.to_raster).get_matrix()
+        rows, cols = self.pixels.shape
+        x = np.arange(x0, x1) + 0.5
+
+        gc = renderer.new_gc()
+        gc.set_clip_rectangle(ax.bbox)
+        for top in range(y1, y0, -self.DRAW_ROWS):
+            # Изображение рисуется сверху вниз
+            y = top - 0.5 - np.arange(min(self.DRAW_ROWS, top - y0))
+            row = np.floor(matrix[0, 0] * x + (matrix[0, 1] * y + matrix[0, 2])[:, None]).astype(np.int64)
+            col = np.floor(matrix[1, 0] * x + (matrix[1, 1] * y + matrix[1, 2])[:, None]).astype(np.int64)
+            inside = (row >= 0) & (row < rows) & (col >= 0) & (col < cols)
+            block = np.where(inside, self.pixels[np.where(inside, row, 0), np.where(inside, col, 0)], 0)
+            renderer.draw_image(gc, x0, top - len(y), block.view(np.uint8).reshape(len(y), len(x), 4))
+        gc.restore()
+        self.stale = False
+
+
+class LodGridRenderer(HexGridRenderer):
+    """
+    Сетка с уровнем детализации: растр при отдалении и векторные элементы только
+    видимой области при приближении. Сетки не больше max_vector_cells элементов
+    рисуются как у HexGridRenderer. Видимую область передает set_view
+    """
+
+    def __init__(self, ax, grid, centers, vertices, radius, padding, bw_mode=False, font_size=None,
+                 min_number_size=MIN_NUMBER_SIZE, max_vector_cells=MAX_VECTOR_CELLS):
+        """
+        :param max_vector_cells: Больше элементов в видимой области - показывается растр
+        Остальные параметры - как у HexGridRenderer
+        """
+        self.max_vector_cells = max_vector_cells
+        self.lod = len(grid) > max_vector_cells
+        self.basis = lattice_basis(radius, padding)
+        self._lattice, self._shift = lattice_table(grid.num_rings, grid.remove_corners)
+        self.raster = None  # LatticeRaster, пока показывается растр
+        self._raster_cells = None  # Элемент каждого пикселя растра, -1 - пусто
+        self._raster_positions = None  # Номер пикселя в плитке для каждого пикселя растра
+        self._raster_shares = None  # Доли заливки и границы по номеру пикселя в плитке
+        self._raster_tables = {}  # Цвета пикселей по стилю элемента для цветного и черно-белого режима
+        self._raster_pixels = {}  # Готовые пиксели растра по режиму, пока элементы не менялись
+        self._raster_key = None  # Подразделение, для которого строился растр
+        self._raster_box = None
+        self._vector_box = None  # Область, элементы которой входят в коллекции
+        self._view = None
+        super().__init__(ax, grid, centers, vertices, radius, padding, bw_mode, font_size, min_number_size)
+        self.set_view(ax.get_xlim(), ax.get_ylim())
+
+    def _initial_vector_cells(self):
+        if not self.lod:
+            return super()._initial_vector_cells()
+        # До первого set_view в коллекциях нет ни одного элемента
+        return np.zeros(0, dtype=np.int64), np.zeros(len(self.grid), dtype=bool)
+
+    def can_blit(self, cells):  # pylint: disable=unused-argument
+        # Растр перерисовывается только целиком
+        return self.raster is None
+
+    def set_view(self, xlim, ylim):
+        """
+        Представление сетки для видимой области: растр, если в нее попадает больше
+        max_vector_cells элементов, иначе векторные элементы этой области с запасом
+        :param xlim: Видимые пределы по x
+        :param ylim: Видимые пределы по y
+        """
+        if not self.lod:
+            return
+        (x0, x1), (y0, y1) = sorted(xlim), sorted(ylim)
+        view = (x0, x1, y0, y1)
+        if view == self._view:
+            return
+        self._view = view
+
+        if np.count_nonzero(self._cells_in(view)) <= self.max_vector_cells:
+            self._drop_raster()
+            if not _contains(self._vector_box, view):
+                box = _expand(view, VIEW_MARGIN)
+                self._set_vector_cells(np.flatnonzero(self._cells_in(box)), box)
+            return
+
+        if self._vector_box is not None:
+            self._set_vector_cells(np.zeros(0, dtype=np.int64), None)
+        # Пикселей экрана на единицу данных и пикселей растра на шаг решетки
+        scale = self.ax.bbox.width / (x1 - x0)
+        subdivision = int(np.clip(math.ceil(math.sqrt(abs(np.linalg.det(self.basis))) * scale),
+                                  1, MAX_RASTER_SUBDIVISION))
+        if subdivision != self._raster_key or not _contains(self._raster_box, view):
+            self._build_raster(_expand(view, VIEW_MARGIN), subdivision, scale)
+
+    def _cells_in(self, box):
+        """Маска элементов, пересекающих область (x0, x1, y0, y1)"""
+        x0, x1, y0, y1 = box
+        x, y = self.centers.T
+        return (x + self.radius >= x0) & (x - self.radius <= x1) & \
+               (y + self.radius >= y0) & (y - self.radius <= y1)
+
+    def _set_vector_cells(self, index, box):
+        self.vector_cells = index
+        self._vector_mask = np.zeros(len(self.centers), dtype=bool)
+        self._vector_mask[index] = True
+        self._vector_box = box
+        self.collection.set_verts(self.vertices[index])
+        self._update_colors()
+        self._update_layers(force=True)
+
+    def _update_colors(self, index=None):
+        super()._update_colors(index)
+        self._raster_pixels = {}
+        if self.raster is not None:
+            self._paint_raster()
+
+    def set_bw_mode(self, bw_mode):
+        super().set_bw_mode(bw_mode)
+        if self.raster is not None:
+            self._paint_raster()
+
+    def _build_raster(self, box, subdivision, scale):
+        """Растр узлов решетки, покрывающих область box, по subdivision пикселей на шаг решетки"""
+        x0, x1, y0, y1 = box
+        a, b = np.linalg.solve(self.basis, np.array([(x0, x0, x1, x1), (y0, y1, y0, y1)]))
+        # Пиксели последнего узла могут принадлежать следующему, поэтому справа нужен еще один узел таблицы
+        a0, a1 = max(math.floor(a.min()), -self._shift), min(math.ceil(a.max()), self._shift)
+        b0, b1 = max(math.floor(b.min()), -self._shift), min(math.ceil(b.max()), self._shift)
+        rows, cols = a1 - a0, b1 - b0
+        if rows <= 0 or cols <= 0:
+            self._drop_raster()
+            return
+        k = max(1, min(subdivision, math.isqrt(MAX_RASTER_PIXELS // (rows * cols))))
+
+        line_width = LINE_WIDTH * self.ax.figure.dpi / 72 / scale
+        da, db, inner, edge = raster_tile(self.basis, self.radius, k, line_width)
+        row = np.arange(a0, a1)[:, None, None, None] + self._shift + da[None, :, None, :]
+        col = np.arange(b0, b1)[None, None, :, None] + self._shift + db[None, :, None, :]
+        self._raster_cells = self._lattice[row, col].reshape(rows * k, cols * k)
+        self._raster_positions = np.tile(np.arange(k * k, dtype=np.int16).reshape(k, k), (rows, cols))
+        self._raster_shares = inner.ravel(), edge.ravel()
+        self._raster_tables, self._raster_pixels = {}, {}
+        self._raster_key = subdivision
+        self._raster_box = box
+
+        # Строка растра - ось a решетки, столбец - ось b
+        to_raster = np.identity(3)
+        to_raster[:2, :2] = k * np.linalg.inv(self.basis)
+        to_raster[:2, 2] = -k * a0, -k * b0
+        if self.raster is not None:
+            self.raster.remove()
+        self.raster = LatticeRaster(Affine2D(to_raster))
+        self.ax.add_artist(self.raster)
+        self._paint_raster()
+
+    def _paint_raster(self):
+        """
+        Цвета пикселей растра, как их рисуют коллекции на фоне осей. Цвет пикселя зависит только
+        от стиля элемента (цвет и состояние) и положения пикселя в плитке, поэтому берется из таблицы
+        """
+        if self.bw_mode not in self._raster_pixels:
+            if self.bw_mode not in self._raster_tables:
+                self._raster_tables[self.bw_mode] = self._raster_table()
+            table = self._raster_tables[self.bw_mode]
+            style = np.append(self.grid.color + len(PALETTE) * self.grid.state.astype(np.int16), len(table) - 1)
+            self._raster_pixels[self.bw_mode] = table[style.astype(np.int16)[self._raster_cells],
+                                                      self._raster_positions]
+        self.raster.set_pixels(self._raster_pixels[self.bw_mode])
+
+    def _raster_table(self):
+        """Таблица цветов (RGBA в uint32): строка - стиль элемента, последняя - пустой пиксель"""
+        styles = np.arange(len(PALETTE) * (STATE_REMOVED + 1))
+        color, state = styles % len(PALETTE), styles // len(PALETTE)
+        background = np.array(mpl.colors.to_rgb(self.ax.get_facecolor()))
+        face = _over(cell_colors(color, state, self.bw_mode)[0], background)
+        if self.bw_mode:
+            # Штриховка при отдалении неразличима - вместо нее элемент затемняется на долю ее площади
+            shade = np.tile(EDGE_COLOR, (len(styles), 1))
+            shade[:, 3] *= [hatch_coverage(HATCHES[c]) if HATCHES[c] and s != STATE_REMOVED else 0
+                            for c, s in zip(color, state)]
+            face = _over(shade, face)
+        # Пунктир при отдалении неразличим - граница рисуется сплошной
+        edge = _over(np.where((state != STATE_REMOVED)[:, None], EDGE_COLOR, NO_COLOR), face)
+
+        inner_share, edge_share = self._raster_shares
+        colors = background + (face - background)[:, None] * inner_share[:, None] + \
+            (edge - background)[:, None] * edge_share[:, None]
+        # Последняя строка таблицы - пиксели вне элементов, они прозрачные
+        table = np.zeros((len(styles) + 1, len(inner_share), 4), dtype=np.uint8)
+        table[:-1, :, :3] = np.round(colors * 255)
+        table[:-1, :, 3] = 255
+        return table.view(np.uint32)[..., 0]
+
+    def _drop_raster(self):
+        if self.raster is not None:
+            self.raster.remove()
+        self.raster = None
+        self._raster_cells = self._raster_positions = self._raster_shares = None
+        self._raster_tables, self._raster_pixels = {}, {}
+        self._raster_key = self._raster_box = None
+
+    def set_geometry(self, centers, vertices, padding):
+        self.basis = lattice_basis(self.radius, padding)
+        super().set_geometry(centers, vertices, padding)
+        if not self.lod:
+            return
+        # Области растра и векторных элементов заданы в координатах данных - после сдвига центров они
+        # выбираются заново при следующем set_view, уже для новых пределов осей
+        self._drop_raster()
+        self._view = None
+        self._set_vector_cells(np.zeros(0, dtype=np.int64), None)
+
+    def resize(self, source, centers, vertices):
+        lod = len(source) > self.max_vector_cells
+        if not lod and not self.lod:
+            super().resize(source, centers, vertices)
+            return
+        # Коллекция большой сетки содержит только видимые элементы - ее пути не переиспользуются
+        self._relabel(source)
+        self.centers = centers
+        self.vertices = vertices
+        self.lod = lod
+        self._lattice, self._shift = lattice_table(self.grid.num_rings, self.grid.remove_corners)
+        self._drop_raster()
+        self._vector_box = self._view = None
+        self.vector_cells, self._vector_mask = self._initial_vector_cells()
+        self.collection.set_verts(vertices[self.vector_cells])
+        self._geometry_changed()
+        self.set_view(self.ax.get_xlim(), self.ax.get_ylim())
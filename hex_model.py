@@ -0,0 +1,191 @@
+"""
+Модель сетки шестигранников
+
+Состояние каждого элемента хранится в массивах NumPy и адресуется
+координатами (кольцо, сектор, смещение) в том же порядке, в котором
+элементы перебирает draw_hex_grid: кольца 1..n-1, затем центр.
+"""
+
+import numpy as np
+
+from settings import COLORS, BASE_COLOR
+
+
+# Палитра: индекс цвета в модели -> имя цвета matplotlib
+PALETTE = [color for _, color in COLORS]
+BASE_COLOR_INDEX = PALETTE.index(BASE_COLOR)
+
+# Состояния элемента
+STATE_NORMAL = 0
+STATE_DASHED = 1
+STATE_REMOVED = 2
+
+# Номер 0 означает отсутствие номера (askinteger не принимает 0 как номер)
+NO_NUMBER = 0
+
+
+def cell_count(num_rings):
+    """Количество элементов полной сетки (с углами) из num_rings колец."""
+    return 1 + 3 * num_rings * (num_rings - 1) if num_rings > 0 else 0
+
+
+def color_index(color):
+    """Индекс цвета в палитре по имени."""
+    return PALETTE.index(color)
+
+
+def cell_keys(num_rings, remove_corners=False):
+    """
+    Координаты элементов сетки в порядке отрисовки
+    :param num_rings:      Кольца
+    :param remove_corners: Удалять угловые элементы внешнего кольца
+    :return: (ring, sector, offset, key), где key - номер элемента в полной сетке
+    """
+    if num_rings <= 0:
+        empty = np.zeros(0, dtype=np.int32)
+        return empty, empty, empty, empty
+
+    rings = np.arange(1, num_rings, dtype=np.int32)
+    ring = np.repeat(rings, 6 * rings)
+    # Номер элемента внутри кольца
+    local = np.arange(ring.size, dtype=np.int32) - 3 * ring * (ring - 1)
+    sector = local // np.maximum(ring, 1)
+    offset = local % np.maximum(ring, 1)
+    key = 1 + 3 * ring * (ring - 1) + local
+
+    if remove_corners:
+        keep = ~((ring == num_rings - 1) & (offset == 0))
+        ring, sector, offset, key = ring[keep], sector[keep], offset[keep], key[keep]
+
+    # Центр рисуется последним
+    zero = np.zeros(1, dtype=np.int32)
+    return (np.concatenate((ring, zero)), np.concatenate((sector, zero)),
+            np.concatenate((offset, zero)), np.concatenate((key, zero)))
+
+
+class HexGridModel:
+    """
+    Логическое состояние сетки, не зависящее от объектов matplotlib
+    """
+
+    def __init__(self, num_rings=1, remove_corners=False):
+        self.num_rings = num_rings
+        self.remove_corners = remove_corners
+        self._allocate()
+
+    def _allocate(self):
+        ring, sector, offset, self.key = cell_keys(self.num_rings, self.remove_corners)
+        self.ring = ring.astype(np.int16)
+        self.sector = sector.astype(np.int8)
+        self.offset = offset.astype(np.int16)
+        size = self.key.size
+        self.color = np.full(size, BASE_COLOR_INDEX, dtype=np.uint8)
+        self.state = np.full(size, STATE_NORMAL, dtype=np.uint8)
+        self.number = np.full(size, NO_NUMBER, dtype=np.int32)
+        self.text = np.full(size, None, dtype=object)
+        # Точка, на которую указывает стрелка подписи, относительно центра элемента в радиусах
+        self.text_anchor = np.zeros((size, 2), dtype=np.float32)
+        self._build_lookup()
+        self.recount()
+
+    def __len__(self):
+        return self.key.size
+
+    def _build_lookup(self):
+        self._lookup = np.full(cell_count(self.num_rings), -1, dtype=np.int32)
+        self._lookup[self.key] = np.arange(self.key.size, dtype=np.int32)
+
+    def index_of(self, ring, sector, offset):
+        """Индекс элемента по координатам или -1, если элемента нет."""
+        if ring == 0:
+            key = 0
+        elif 0 < ring < self.num_rings and 0 <= sector < 6 and 0 <= offset < ring:
+            key = 1 + 3 * ring * (ring - 1) + sector * ring + offset
+        else:
+            return -1
+        return int(self._lookup[key])
+
+    def indices_of(self, ring, sector, offset):
+        """Индексы элементов по массивам координат, -1 - элемента нет (как у index_of)."""
+        ring, sector, offset = (np.asarray(values, dtype=np.int64) for values in (ring, sector, offset))
+        valid = (ring == 0) | \
+            (ring > 0) & (ring < self.num_rings) & (sector >= 0) & (sector < 6) & (offset >= 0) & (offset < ring)
+        key = np.where(ring > 0, 1 + 3 * ring * (ring - 1) + sector * ring + offset, 0)
+        return np.where(valid, self._lookup[np.where(valid, key, 0)], -1)
+
+    def resize(self, num_rings, remove_corners=None):
+        """
+        Изменение количества колец с сохранением состояния общих элементов
+        :return: Для каждого нового элемента его прежний индекс или -1, если элемент добавлен
+        """
+        if remove_corners is None:
+            remove_corners = self.remove_corners
+        old_lookup = self._lookup
+        old = (self.color, self.state, self.number, self.text, self.text_anchor)
+
+        self.num_rings = num_rings
+        self.remove_corners = remove_corners
+        self._allocate()
+
+        in_range = self.key < old_lookup.size
+        source = np.full(self.key.size, -1, dtype=np.int32)
+        source[in_range] = old_lookup[self.key[in_range]]
+        kept = source >= 0
+        for new, previous in zip((self.color, self.state, self.number, self.text, self.text_anchor), old):
+            new[kept] = previous[source[kept]]
+        self.recount()
+        return source
+
+    def copy(self):
+        """Независимая копия состояния (подписи - неизменяемые строки, их копировать не нужно)."""
+        grid = HexGridModel.__new__(HexGridModel)
+        grid.__dict__.update({name: value.copy() if isinstance(value, np.ndarray) else value
+                              for name, value in self.__dict__.items()})
+        return grid
+
+    def recount(self):
+        """Пересчет счетчиков цветов после прямой записи в массивы."""
+        self.color_counts = np.bincount(self.color[self.visible()], minlength=len(PALETTE)).astype(np.int64)
+
+    def _count(self, colors):
+        return np.bincount(np.atleast_1d(colors), minlength=len(PALETTE))
+
+    @staticmethod
+    def _unique(index):
+        # Повторяющиеся индексы посчитались бы в счетчиках дважды
+        return index if np.isscalar(index) else np.unique(index)
+
+    def set_color(self, index, color):
+        """Цвет элемента (или массива элементов) по имени цвета."""
+        index = self._unique(index)
+        visible = self.state[index] != STATE_REMOVED
+        self.color_counts -= self._count(self.color[index][visible])
+        self.color[index] = color_index(color)
+        self.color_counts += self._count(self.color[index][visible])
+
+    def set_state(self, index, state):
+        index = self._unique(index)
+        was_visible = self.state[index] != STATE_REMOVED
+        self.state[index] = state
+        visible = self.state[index] != STATE_REMOVED
+        colors = self.color[index]
+        self.color_counts += self._count(colors[visible & ~was_visible]) - self._count(colors[was_visible & ~visible])
+
+    def set_number(self, index, number):
+        self.number[index] = number
+
+    def set_text(self, index, text, anchor=(0, 0)):
+        """Подпись элемента; text=None удаляет подпись."""
+        self.text[index] = text
+        self.text_anchor[index] = anchor
+
+    def color_name(self, index):
+        return PALETTE[self.color[index]]
+
+    def visible(self):
+        """Маска не удаленных элементов."""
+        return self.state != STATE_REMOVED
+
+    def count_by_color(self):
+        """Количество не удаленных элементов каждого цвета палитры (поддерживается при каждом изменении)."""
+        return self.color_counts
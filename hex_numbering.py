@@ -0,0 +1,50 @@
+"""
+Автонумерация элементов сетки
+
+Порядок обхода строится сортировкой координат модели, поэтому номера всех
+элементов назначаются одной операцией, без перебора элементов в Python.
+Удаленные элементы номеров не получают и в нумерации пропускаются.
+"""
+
+import numpy as np
+
+from hex_geometry import lattice_coords
+from hex_model import NO_NUMBER
+
+
+def spiral_order(grid):
+    """По кольцам от центра: центр, затем каждое кольцо по секторам против часовой стрелки"""
+    return np.argsort(grid.key, kind='stable')
+
+
+def row_order(grid):
+    """По строкам сверху вниз, в строке - слева направо"""
+    a, b = lattice_coords(grid.ring, grid.sector, grid.offset).T
+    # Высота центра пропорциональна a + b / 2, горизонталь - b (см. hex_geometry.lattice_basis)
+    return np.lexsort((b, -(2 * a + b)))
+
+
+def sector_order(grid):
+    """Центр, затем сектор за сектором, в секторе - по кольцам от центра"""
+    return np.lexsort((grid.key, np.where(grid.ring == 0, -1, grid.sector)))
+
+
+NUMBERING_SCHEMES = {
+    'spiral': spiral_order,
+    'rows': row_order,
+    'sectors': sector_order,
+}
+
+
+def auto_numbers(grid, scheme='spiral', start=1):
+    """
+    Номера всех не удаленных элементов по схеме обхода
+    :param scheme: Ключ NUMBERING_SCHEMES
+    :param start:  Номер первого элемента (не меньше 1: номер 0 означает "без номера")
+    :return: Массив номеров в порядке модели, у удаленных элементов - NO_NUMBER
+    """
+    order = NUMBERING_SCHEMES[scheme](grid)
+    order = order[grid.visible()[order]]
+    numbers = np.full(len(grid), NO_NUMBER, dtype=grid.number.dtype)
+    numbers[order] = np.arange(start, start + order.size)
+    return numbers
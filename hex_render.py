@@ -0,0 +1,635 @@
+"""
+Отрисовка модели сетки шестигранников
+
+Все элементы сетки рисуются одной коллекцией PolyCollection. Цвет, видимость
+и стиль линии элемента - это строки массивов коллекции, поэтому изменение
+элемента не создает новых объектов matplotlib. Номера всех элементов
+рисуются одним слоем NumberLayer.
+"""
+
+import numpy as np
+import matplotlib as mpl
+from matplotlib.artist import Artist
+from matplotlib.collections import PolyCollection
+from matplotlib.patches import ConnectionStyle, Rectangle
+from matplotlib.path import Path
+from matplotlib.text import Annotation, Text
+from matplotlib.transforms import Bbox, IdentityTransform
+
+from glyphs import NUMBER_CHARS, number_glyphs
+from hex_model import PALETTE, STATE_NORMAL, STATE_DASHED, STATE_REMOVED, NO_NUMBER
+from settings import ALPHA, BASE_COLOR, COLOR_TO_HATCH
+
+
+# Цвета палитры в RGBA с учетом яркости
+FACE_COLORS = np.array([mpl.colors.to_rgba(color, ALPHA) for color in PALETTE])
+BW_FACE_COLOR = np.array(mpl.colors.to_rgba(BASE_COLOR, ALPHA))
+EDGE_COLOR = np.array(mpl.colors.to_rgba('black', ALPHA))
+NO_COLOR = np.zeros(4)
+
+# Штриховка для каждого цвета палитры в черно-белом режиме
+HATCHES = [COLOR_TO_HATCH.get(color) for color in PALETTE]
+
+# Стили коллекций сетки и слоев поверх нее
+LINE_WIDTH = 1.0
+DASHED_LAYER_STYLE = dict(facecolors='none', edgecolors=EDGE_COLOR, linestyles='--', linewidths=LINE_WIDTH)
+HATCH_LAYER_STYLE = dict(facecolors='none', edgecolors=EDGE_COLOR, linewidths=0)
+# Выделение элементов (например, отличий при сравнении) - поверх штриховок, под номерами
+HIGHLIGHT_LAYER_STYLE = dict(facecolors='none', edgecolors='magenta', linewidths=2 * LINE_WIDTH, zorder=2)
+
+# Номера рисуются чуть мельче исходного размера шрифта, а мельче MIN_NUMBER_SIZE пунктов не читаются и скрываются
+NUMBER_SIZE_SCALE = 0.8
+MIN_NUMBER_SIZE = 4
+
+
+
+class StraightConnection(ConnectionStyle._Base):  # pylint: disable=protected-access
+    """
+    Стрелка подписи - отрезок. Прямая дуга arc3 - кривая с управляющей точкой на отрезке,
+    и Agg разбивает ее по-разному от шума в последних битах координат, из-за чего
+    растр стрелки зависит от сдвига фигуры (полосы tiled_export)
+    """
+
+    def connect(self, posA, posB):  # pylint: disable=invalid-name
+        return Path([posA, posB], [Path.MOVETO, Path.LINETO])
+
+
+# Подписи элементов со стрелкой
+TEXT_SIZE = 10
+ARROW_PROPS = dict(facecolor='black', arrowstyle='->', lw=0.5, connectionstyle=StraightConnection())
+
+
+def cell_colors(color, state, bw_mode=False):
+    """Цвета заливки и границы (RGBA) элементов с индексами цвета color и состояниями state"""
+    if bw_mode:
+        face = np.broadcast_to(BW_FACE_COLOR, np.shape(color) + (4,)).copy()
+    else:
+        # Для одного элемента индексирование дает строку самой палитры, поэтому копия
+        face = FACE_COLORS[color].copy()
+    face[state == STATE_REMOVED] = NO_COLOR
+    # Пунктирная граница рисуется отдельным слоем
+    edge = np.where((state == STATE_NORMAL)[..., None], EDGE_COLOR, NO_COLOR)
+    return face, edge
+
+
+def text_anchors(centers, anchors, radius):
+    """Точки, на которые указывают стрелки подписей: центр элемента плюс смещение в долях радиуса"""
+    return centers + anchors * radius
+
+
+def text_positions(points, num_rings, radius, padding):
+    """Положение подписей за внешним кольцом в направлении от центра сетки к точкам points"""
+    points = np.asarray(points, dtype=float)
+    # Максимальное расстояние от центра до края фигуры
+    max_distance = num_rings * radius * 2 + padding
+    norm = np.linalg.norm(points, axis=-1, keepdims=True)
+    # Точка в центре сетки (подпись центрального элемента без смещения) - подпись над сеткой
+    direction = np.where(norm > 0, points / np.where(norm > 0, norm, 1), (0, 1))
+    return direction * max_distance
+
+
+class NumberLayer(Artist):
+    """
+    Номера всех элементов одним артистом
+
+    Контуры цифр раскладываются заново только при изменении номеров. При отрисовке
+    контуры видимых номеров масштабируются и сдвигаются в центры элементов одной
+    операцией NumPy и рисуются одним путем, а не отдельным Text на каждый номер,
+    поэтому время отрисовки почти не зависит от количества номеров.
+    """
+
+    zorder = 3
+
+    def __init__(self, renderer, only=None):
+        """
+        :param renderer: HexGridRenderer, номера и центры элементов которого рисуются
+        :param only:     Маска номеров слоя, которые рисуются (см. subset), None - все
+        """
+        super().__init__()
+        self.renderer = renderer
+        self.color = mpl.rcParams['text.color']
+        self._only = only
+        self._dirty = True
+
+    def invalidate(self):
+        """Номера в модели изменились - раскладка пересчитывается при следующей отрисовке"""
+        self._dirty = True
+        self.stale = True
+
+    def _layout(self):
+        """
+        Контуры номеров в долях размера шрифта относительно центра элемента:
+        элементы с номерами, вершины и коды контуров, номер по порядку для каждой вершины
+        """
+        widths, outlines, space, (ascent, descent) = number_glyphs()
+        number = self.renderer.grid.number
+        self.cells = np.flatnonzero(number != NO_NUMBER)
+        # Строка номера -> таблица символов (номер, позиция), -1 - позиция пустая
+        chars = number[self.cells].astype(str)
+        chars = chars.view('U1').reshape(len(chars), -1) if chars.size else np.zeros((0, 1), dtype='U1')
+        glyph = np.full(chars.shape, -1)
+        for code, char in enumerate(NUMBER_CHARS):
+            glyph[chars == char] = code
+        advance = np.where(glyph >= 0, widths[glyph], 0)
+        self.half_width = (advance.sum(axis=1) + space) / 2
+        left = np.cumsum(advance, axis=1) - advance - self.half_width[:, None]
+        # Центр строки по вертикали, как у Text с va='center'
+        baseline = (descent - ascent) / 2
+        self.half_height = (ascent + descent) / 2
+
+        vertices, codes, owner = [np.zeros((0, 2))], [np.zeros(0, dtype=np.uint8)], [np.zeros(0, dtype=np.int64)]
+        for code, (glyph_vertices, glyph_codes) in enumerate(outlines):
+            rows, positions = np.nonzero(glyph == code)
+            if not rows.size or not len(glyph_codes):
+                continue
+            shift = np.column_stack((left[rows, positions], np.full(rows.size, baseline)))
+            vertices.append((glyph_vertices[None, :, :] + shift[:, None, :]).reshape(-1, 2))
+            codes.append(np.tile(glyph_codes, rows.size))
+            owner.append(np.repeat(rows, len(glyph_codes)))
+        self.vertices, self.codes, self.owner = (np.concatenate(parts) for parts in (vertices, codes, owner))
+        self._dirty = False
+
+    def _ensure_layout(self):
+        if self._dirty:
+            self._layout()
+
+    def subset(self, cells):
+        """Временный слой с теми же номерами, рисующий только номера элементов cells"""
+        self._ensure_layout()
+        layer = NumberLayer(self.renderer, np.isin(self.cells, cells))
+        layer.cells, layer.owner, layer.vertices, layer.codes = self.cells, self.owner, self.vertices, self.codes
+        layer.half_width, layer.half_height, layer._dirty = self.half_width, self.half_height, False
+        layer.set_figure(self.figure)
+        return layer
+
+    def _shown(self):
+        """Маска номеров, которые читаются при текущем масштабе и попадают в видимую область"""
+        self._ensure_layout()
+        renderer = self.renderer
+        if renderer.number_size < renderer.min_number_size:
+            return np.zeros(len(self.cells), dtype=bool)
+        (x0, y0), (x1, y1) = renderer.ax.viewLim.get_points()
+        x0, x1 = min(x0, x1), max(x0, x1)
+        y0, y1 = min(y0, y1), max(y0, y1)
+        x, y = renderer.centers[self.cells].T
+        shown = (x + renderer.radius >= x0) & (x - renderer.radius <= x1) & \
+                (y + renderer.radius >= y0) & (y - renderer.radius <= y1)
+        return shown if self._only is None else shown & self._only
+
+    def extent(self, index, agg):
+        """Область номера элемента index на экране или None, если номер не показан"""
+        self._ensure_layout()
+        position = np.searchsorted(self.cells, index)
+        if position == len(self.cells) or self.cells[position] != index or not self._shown()[position]:
+            return None
+        center = self.renderer.ax.transData.transform(self.renderer.centers[index])
+        scale = agg.points_to_pixels(self.renderer.number_size)
+        half = np.array([self.half_width[position], self.half_height]) * scale
+        return Bbox([center - half, center + half])
+
+    def draw(self, renderer):
+        if not self.get_visible():
+            return
+        shown = self._shown()
+        if not shown.any():
+            return
+        # Центры переводятся в пиксели один раз на номер, а не на каждую вершину контура
+        centers = self.renderer.ax.transData.transform(self.renderer.centers[self.cells[shown]])
+        scale = renderer.points_to_pixels(self.renderer.number_size)
+        if shown.all():
+            path = Path(self.vertices * scale + centers[self.owner], self.codes)
+        else:
+            mask = shown[self.owner]
+            position = np.cumsum(shown) - 1
+            path = Path(self.vertices[mask] * scale + centers[position[self.owner[mask]]], self.codes[mask])
+
+        gc = renderer.new_gc()
+        self._set_gc_clip(gc)
+        gc.set_linewidth(0)
+        renderer.draw_path(gc, path, IdentityTransform(), mpl.colors.to_rgba(self.color))
+        gc.restore()
+        self.stale = False
+
+
+class HexGridRenderer:
+    """
+    Коллекция шестигранников на осях, отображающая состояние модели
+    """
+
+    def __init__(self, ax, grid, centers, vertices, radius, padding, bw_mode=False, font_size=None,
+                 min_number_size=MIN_NUMBER_SIZE):
+        """
+        :param ax:        Оси matplotlib
+        :param grid:      Модель сетки HexGridModel
+        :param centers:   Центры элементов (N, 2) в порядке модели
+        :param vertices:  Вершины элементов (N, 6, 2)
+        :param radius:    Радиус одного шестигранника
+        :param padding:   Отступ между шестигранниками
+        :param bw_mode:   Черно-белый режим
+        :param font_size: Размер шрифта номеров, по умолчанию 2 * radius
+        :param min_number_size: Номера мельче этого размера шрифта скрываются
+        """
+        self.ax = ax
+        self.grid = grid
+        self.centers = centers
+        self.vertices = vertices
+        self.radius = radius
+        self.padding = padding
+        self.bw_mode = bw_mode
+        self.font_size = radius * 2 if font_size is None else font_size
+        self.min_number_size = min_number_size
+
+        self._allocate_styles()
+        # Элементы, входящие в коллекции: все или, у LodGridRenderer, только элементы видимой области
+        self.vector_cells, self._vector_mask = self._initial_vector_cells()
+        self.collection = PolyCollection(vertices[self.vector_cells], closed=True, linewidths=LINE_WIDTH)
+        ax.add_collection(self.collection)
+
+        # Пунктирные границы и штриховки рисуются поверх основной коллекции только для своих элементов
+        self._dashed = np.zeros(len(grid), dtype=bool)
+        self.dashed_layer = PolyCollection(np.zeros((0, 6, 2)), **DASHED_LAYER_STYLE)
+        ax.add_collection(self.dashed_layer)
+        # Слои штриховки поддерживаются и в цветном режиме, черно-белый режим их только показывает
+        self._hatched = np.full(len(grid), -1, dtype=np.int16)
+        self.hatch_layers = {}
+        for color_index, hatch in enumerate(HATCHES):
+            if hatch is not None:
+                layer = PolyCollection(np.zeros((0, 6, 2)), hatch=hatch, visible=bw_mode, **HATCH_LAYER_STYLE)
+                ax.add_collection(layer)
+                self.hatch_layers[color_index] = layer
+        self.highlighted = np.zeros(0, dtype=np.int64)
+        self.highlight_layer = PolyCollection(np.zeros((0, 6, 2)), **HIGHLIGHT_LAYER_STYLE)
+        ax.add_collection(self.highlight_layer)
+
+        # Все номера - один слой, подписи со стрелками - по артисту на элемент
+        self.number_layer = NumberLayer(self)
+        ax.add_artist(self.number_layer)
+        self.texts = {}
+        # Масштаб номеров относительно исходных пределов осей
+        self._number_scale = 1
+
+        self.update_cells()
+        self.draw_labels()
+
+    def _initial_vector_cells(self):
+        """(индексы, маска) элементов в коллекциях, маска None - все элементы"""
+        return slice(None), None
+
+    def _in_vector_cells(self, mask):
+        return mask if self._vector_mask is None else mask & self._vector_mask
+
+    def can_blit(self, cells):  # pylint: disable=unused-argument
+        """Элементы cells нарисованы коллекциями и их можно перерисовать частично (см. CellBlitter)"""
+        return True
+
+    def _allocate_styles(self):
+        """Заливка элементов для цветного и черно-белого режима (по bw_mode) и границы"""
+        self.face_styles = {bw_mode: np.zeros((len(self.centers), 4)) for bw_mode in (False, True)}
+        self.facecolors = self.face_styles[self.bw_mode]
+        self.edgecolors = np.zeros((len(self.centers), 4))
+
+    def set_bw_mode(self, bw_mode):
+        """Переключение режима: заливки обоих режимов и штриховки уже готовы, меняется только их выбор"""
+        self.bw_mode = bw_mode
+        self.facecolors = self.face_styles[bw_mode]
+        self.collection.set_facecolor(self.facecolors[self.vector_cells])
+        for layer in self.hatch_layers.values():
+            layer.set_visible(bw_mode)
+
+    def update_cells(self, index=None):
+        """
+        Переносит состояние элементов из модели в массивы коллекции
+        :param index: Индекс, массив индексов или None для всех элементов
+        """
+        self._update_colors(index)
+        self._update_layers()
+
+    def _update_colors(self, index=None):
+        if index is None:
+            index = slice(None)
+        color, state = self.grid.color[index], self.grid.state[index]
+        for bw_mode, faces in self.face_styles.items():
+            faces[index], self.edgecolors[index] = cell_colors(color, state, bw_mode)
+        self.collection.set_facecolor(self.facecolors[self.vector_cells])
+        self.collection.set_edgecolor(self.edgecolors[self.vector_cells])
+
+    def _update_layers(self, force=False):
+        """Пересобирает слои пунктира и штриховки, если их состав изменился"""
+        dashed = self._in_vector_cells(self.grid.state == STATE_DASHED)
+        if force or not np.array_equal(dashed, self._dashed):
+            self._dashed = dashed
+            self._set_layer_cells(self.dashed_layer, dashed)
+
+        hatched = np.where(self._in_vector_cells(self.grid.visible()), self.grid.color, -1).astype(np.int16)
+        if force:
+            changed = list(self.hatch_layers)
+        else:
+            changed = np.unique(np.concatenate((hatched[hatched != self._hatched],
+                                                self._hatched[hatched != self._hatched])))
+        self._hatched = hatched
+        for color_index in changed:
+            if color_index in self.hatch_layers:
+                self._set_layer_cells(self.hatch_layers[color_index], hatched == color_index)
+
+    def _set_layer_cells(self, layer, mask):
+        """Элементы mask в слое: слой получает готовые пути основной коллекции, а не строит свои"""
+        paths = self.collection.get_paths()
+        layer.get_paths()[:] = [paths[position] for position in np.flatnonzero(mask[self.vector_cells])]
+        layer.stale = True
+
+    def resize(self, source, centers, vertices):
+        """
+        Обновление после изменения числа колец без пересоздания коллекции
+        :param source:   Прежний индекс каждого элемента или -1 для новых (см. HexGridModel.resize)
+        :param centers:  Новые центры элементов
+        :param vertices: Новые вершины элементов
+        """
+        kept = source >= 0
+        added = np.flatnonzero(~kept)
+
+        # Пути сохранившихся элементов переиспользуются, создаются только пути новых
+        old_paths = np.empty(len(self.centers), dtype=object)
+        old_paths[:] = self.collection.get_paths()
+        paths = np.empty(len(source), dtype=object)
+        paths[kept] = old_paths[source[kept]]
+        paths[added] = [Path(np.concatenate((xy, xy[:1])), closed=True) for xy in vertices[added]]
+        self.collection.get_paths()[:] = paths.tolist()
+        self.collection.stale = True
+
+        self._relabel(source)
+        self.centers = centers
+        self.vertices = vertices
+        self._geometry_changed()
+
+    def set_geometry(self, centers, vertices, padding):
+        """
+        Новое расстояние между элементами на тех же артистах: сдвигаются центры, форма,
+        цвета, номера и подписи элементов сохраняются
+        :param centers:  Центры элементов при отступе padding (тот же порядок и размер сетки)
+        :param vertices: Вершины элементов
+        :param padding:  Новый отступ между шестигранниками
+        """
+        self.centers = centers
+        self.vertices = vertices
+        self.padding = padding
+        # Цвета коллекции относятся к тем же элементам, меняются только пути; слои берут новые пути коллекции
+        self.collection.set_verts(vertices[self.vector_cells])
+        self._update_layers(force=True)
+        self.highlight_layer.set_verts(vertices[self.highlighted])
+        # Номера ставятся в центры элементов при отрисовке, их раскладка от положения не зависит
+        self.number_layer.stale = True
+        for index, artist in self.texts.items():
+            artist.xy = tuple(self._anchor(index))
+            artist.xyann = self._text_position(index)
+
+    def _relabel(self, source):
+        """Подписи переносятся на новые индексы, у исчезнувших элементов удаляются. Номера берутся из модели"""
+        kept = source >= 0
+        new_index = np.full(len(self.centers), -1, dtype=np.int64)
+        new_index[source[kept]] = np.flatnonzero(kept)
+        texts, self.texts = self.texts, {}
+        for index, artist in texts.items():
+            if new_index[index] >= 0:
+                self.texts[int(new_index[index])] = artist
+            else:
+                artist.remove()
+        self.number_layer.invalidate()
+        # Выделение относится к прежним индексам
+        self.highlighted = np.zeros(0, dtype=np.int64)
+        self.highlight_layer.set_verts(np.zeros((0, 6, 2)))
+
+    def _geometry_changed(self):
+        """Цвета, слои и положение подписей после замены центров и вершин элементов"""
+        self._allocate_styles()
+        self._update_colors()
+        self._update_layers(force=True)
+
+        self.number_layer.invalidate()
+        # Подписи выносятся за внешнее кольцо, поэтому их положение зависит от числа колец
+        for index in self.texts:
+            self.texts[index].xyann = self._text_position(index)
+
+    def subset_collections(self, index):
+        """Временные коллекции с теми же стилями, что и у сетки, только для элементов index"""
+        index = np.asarray(index)
+        collections = [PolyCollection(self.vertices[index], facecolors=self.facecolors[index],
+                                      edgecolors=self.edgecolors[index], linewidths=LINE_WIDTH)]
+        dashed = self._dashed[index]
+        if dashed.any():
+            collections.append(PolyCollection(self.vertices[index[dashed]], **DASHED_LAYER_STYLE))
+        for color_index in self.hatch_layers if self.bw_mode else ():
+            hatched = self._hatched[index] == color_index
+            if hatched.any():
+                collections.append(PolyCollection(self.vertices[index[hatched]], hatch=HATCHES[color_index],
+                                                  **HATCH_LAYER_STYLE))
+        highlighted = np.isin(index, self.highlighted)
+        if highlighted.any():
+            collections.append(PolyCollection(self.vertices[index[highlighted]], **HIGHLIGHT_LAYER_STYLE))
+        for collection in collections:
+            collection.set_transform(self.ax.transData)
+            collection.set_figure(self.ax.figure)
+        return collections
+
+    def set_highlight(self, cells):
+        """Выделение элементов cells контуром поверх сетки, пустой массив снимает выделение"""
+        cells = np.asarray(cells, dtype=np.int64)
+        if np.array_equal(cells, self.highlighted):
+            return
+        self.highlighted = cells
+        self.highlight_layer.set_verts(self.vertices[cells])
+
+    def draw_labels(self):
+        """Номера и подписи из модели"""
+        self.update_numbers()
+        for index in np.flatnonzero(self.grid.text != None):  # pylint: disable=singleton-comparison
+            self.draw_text(index)
+
+    def update_numbers(self):
+        """Номера всех элементов перечитываются из модели (одна раскладка на любое число изменений)"""
+        self.number_layer.invalidate()
+
+    def draw_number(self, index):  # pylint: disable=unused-argument
+        self.update_numbers()
+
+    def remove_number(self, index):  # pylint: disable=unused-argument
+        self.update_numbers()
+
+    @property
+    def number_size(self):
+        """Размер шрифта номеров при текущем масштабе"""
+        return self.font_size * NUMBER_SIZE_SCALE * self._number_scale
+
+    def set_number_view(self, scale_factor):
+        """
+        Размер номеров после изменения пределов осей. Номера вне области и слишком мелкие
+        слой отбирает сам при отрисовке
+        :param scale_factor: Увеличение относительно исходных пределов осей
+        """
+        if scale_factor != self._number_scale:
+            self._number_scale = scale_factor
+            self.number_layer.stale = True
+
+    def _anchor(self, index):
+        return text_anchors(self.centers[index], self.grid.text_anchor[index], self.radius)
+
+    def _text_position(self, index):
+        # Вычисляем позицию для текста вне шестигранника
+        return text_positions(self._anchor(index), self.grid.num_rings, self.radius, self.padding)
+
+    def draw_text(self, index):
+        event_point = self._anchor(index)
+        text_position = self._text_position(index)
+        self.remove_text(index)
+
+        # Добавляем аннотацию со стрелкой
+        self.texts[index] = self.ax.annotate(
+            self.grid.text[index],
+            xy=(event_point[0], event_point[1]),  # координаты, куда указывает стрелка
+            xytext=text_position,  # координаты текста
+            size=TEXT_SIZE,
+            ha='center',
+            va='center',
+            arrowprops=dict(ARROW_PROPS)
+        )
+
+    def remove_text(self, index):
+        if index in self.texts:
+            self.texts.pop(index).remove()
+
+
+class CellBlitter:
+    """
+    Быстрая перерисовка отдельных элементов
+
+    Фоном служит последний кадр Agg, полученный при полной отрисовке. Для
+    измененных элементов перерисовывается только занимаемая ими область
+    (фон осей, элементы, попадающие в область, подписи), и на экран
+    передается только она.
+    """
+
+    # При большем числе элементов дешевле перерисовать фигуру целиком
+    MAX_CELLS = 500
+    # Запас в пикселях на сглаживание границ
+    PAD = 3
+
+    def __init__(self, canvas, renderer):
+        self.canvas = canvas
+        self.renderer = renderer
+        self._frame_ready = False
+        canvas.mpl_connect('draw_event', self._on_draw)
+
+    def _on_draw(self, event=None):
+        self._frame_ready = True
+
+    def invalidate(self):
+        """Кадр больше не соответствует фигуре - до следующей полной отрисовки работать нельзя"""
+        self._frame_ready = False
+
+    def extent(self, artist):
+        """Область артиста на экране (запоминается до его изменения)"""
+        if artist is None or not artist.get_visible() or artist.figure is None:
+            return None
+        agg = self.canvas.get_renderer()
+        if isinstance(artist, Annotation):
+            # Точная область стрелки считается очень долго - берем текст и точку стрелки с запасом
+            arrow_point = Bbox([artist.xy, artist.xy]).transformed(artist.get_transform())
+            reach = agg.points_to_pixels(artist.arrow_patch.get_mutation_scale()) if artist.arrow_patch else 0
+            return Bbox.union([Text.get_window_extent(artist, agg), arrow_point]).padded(reach)
+        return artist.get_window_extent(agg)
+
+    def number_extent(self, index):
+        """Область номера элемента на экране (запоминается до его изменения)"""
+        return self.renderer.number_layer.extent(index, self.canvas.get_renderer())
+
+    def blit(self, cells=(), regions=()):
+        """
+        Перерисовывает элементы cells и дополнительные области regions
+        :return: False, если частичная перерисовка невозможна и нужна полная
+        """
+        cells = np.atleast_1d(np.asarray(cells, dtype=np.int64))
+        if not self._frame_ready or cells.size > self.MAX_CELLS or not self.renderer.can_blit(cells):
+            return False
+        ax = self.renderer.ax
+        areas = [region for region in regions if region is not None]
+        if cells.size:
+            points = ax.transData.transform(self.renderer.vertices[cells].reshape(-1, 2))
+            areas.append(Bbox([points.min(axis=0), points.max(axis=0)]))
+            areas += [self.number_extent(int(index)) for index in cells]
+        for area in self._merge([area.padded(self.PAD) for area in areas if area is not None]):
+            self._repaint(area)
+        return True
+
+    @staticmethod
+    def _merge(areas):
+        """Объединение пересекающихся областей, иначе полупрозрачные элементы на стыке закрасятся дважды"""
+        merged = []
+        for area in areas:
+            area = Bbox(np.array([np.floor(area.p0), np.ceil(area.p1)]))
+            while any(other.overlaps(area) for other in merged):
+                overlapping = [other for other in merged if other.overlaps(area)]
+                merged = [other for other in merged if not other.overlaps(area)]
+                area = Bbox.union([area] + overlapping)
+            merged.append(area)
+        return merged
+
+    def _repaint(self, area):
+        fig = self.canvas.figure
+        area = Bbox.intersection(area, fig.bbox)
+        if area is None or area.width <= 0 or area.height <= 0:
+            return
+        area = Bbox(np.array([np.floor(area.p0), np.ceil(area.p1)]))
+        agg = self.canvas.get_renderer()
+        ax = self.renderer.ax
+
+        # Фон закрашивается с тем же ограничением, что и остальные артисты, чтобы совпали пиксели
+        cover = area.padded(self.PAD)
+        background = Rectangle(cover.p0, cover.width, cover.height, transform=IdentityTransform(),
+                               facecolor=fig.patch.get_facecolor(), edgecolor='none')
+        background.set_figure(fig)
+
+        artists = [background]
+        in_axes = Bbox.intersection(area, ax.bbox)
+        if in_axes is not None and in_axes.width > 0 and in_axes.height > 0:
+            artists.append(ax.patch)
+            cells = self._cells_in(area)
+            if cells.size:
+                artists += self.renderer.subset_collections(cells)
+            artists += list(ax.spines.values())
+            # Номер может быть шире своего элемента, поэтому берем номера элементов с запасом на размер шрифта
+            reach = 2 * agg.points_to_pixels(self.renderer.number_size)
+            artists.append(self.renderer.number_layer.subset(self._cells_in(area.padded(reach))))
+            artists += [text for text in self.renderer.texts.values() if self._overlaps(text, area)]
+        artists += [text for text in fig.texts if self._overlaps(text, area)]
+
+        for artist in artists:
+            self._draw_clipped(artist, area, agg)
+        self.canvas.blit(area)
+
+    def _cells_in(self, area):
+        """Элементы, пересекающие область экрана"""
+        (x0, y0), (x1, y1) = self.renderer.ax.transData.inverted().transform(area.get_points())
+        x0, x1 = min(x0, x1), max(x0, x1)
+        y0, y1 = min(y0, y1), max(y0, y1)
+        centers, radius = self.renderer.centers, self.renderer.radius
+        inside = ((centers[:, 0] + radius >= x0) & (centers[:, 0] - radius <= x1) &
+                  (centers[:, 1] + radius >= y0) & (centers[:, 1] - radius <= y1))
+        return np.flatnonzero(inside)
+
+    def _overlaps(self, artist, area):
+        extent = self.extent(artist)
+        return extent is not None and extent.overlaps(area)
+
+    @staticmethod
+    def _draw_clipped(artist, area, agg):
+        # Стрелка подписи рисуется отдельным артистом со своим ограничением
+        parts = [artist] + [part for part in [getattr(artist, 'arrow_patch', None)] if part is not None]
+        saved = [(part, part.get_clip_box(), part.get_clip_on()) for part in parts]
+        for part in parts:
+            part.set_clip_box(area)
+            part.set_clip_on(True)
+        try:
+            artist.draw(agg)
+        finally:
+            for part, clip_box, clip_on in saved:
+                part.set_clip_box(clip_box)
+                part.set_clip_on(clip_on)
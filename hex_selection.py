@@ -0,0 +1,69 @@
+"""
+Выделение групп элементов сетки
+
+Каждая функция возвращает массив индексов элементов в порядке модели,
+который целиком передается в HexGridModel.set_color / set_state и
+HexGridRenderer.update_cells - одно обновление на всю группу.
+"""
+
+import numpy as np
+
+from hex_geometry import SECTOR_AXES, lattice_coords, lattice_table
+
+
+def ring_cells(grid, index):
+    """Все элементы кольца, в котором лежит элемент index"""
+    return np.flatnonzero(grid.ring == grid.ring[index])
+
+
+def sector_cells(grid, index):
+    """Элементы 60-градусного сектора элемента index (для центрального элемента - только он сам)"""
+    if grid.ring[index] == 0:
+        return np.array([index])
+    return np.flatnonzero((grid.sector == grid.sector[index]) & (grid.ring > 0))
+
+
+def rectangle_cells(centers, corner, opposite):
+    """Элементы, центры которых лежат в прямоугольнике с противоположными углами corner и opposite"""
+    (x0, x1), (y0, y1) = sorted((corner[0], opposite[0])), sorted((corner[1], opposite[1]))
+    x, y = centers.T
+    return np.flatnonzero((x >= x0) & (x <= x1) & (y >= y0) & (y <= y1))
+
+
+def polygon_cells(centers, polygon):
+    """Элементы, центры которых лежат внутри многоугольника (правило четности)"""
+    polygon = np.asarray(polygon, dtype=float)
+    if len(polygon) < 3:
+        return np.zeros(0, dtype=np.int64)
+    candidates = rectangle_cells(centers, polygon.min(axis=0), polygon.max(axis=0))
+    x, y = centers[candidates].T
+    inside = np.zeros(len(candidates), dtype=bool)
+    for (xa, ya), (xb, yb) in zip(polygon, np.roll(polygon, -1, axis=0)):
+        crosses = (ya > y) != (yb > y)
+        if ya != yb:
+            inside ^= crosses & (x < xa + (y - ya) * (xb - xa) / (yb - ya))
+    return candidates[inside]
+
+
+def flood_fill_cells(grid, index):
+    """
+    Связная область элементов того же цвета, что и index. Соседи ищутся по координатам
+    решетки, удаленные элементы разрывают область
+    """
+    same = (grid.color == grid.color[index]) & grid.visible()
+    if not same[index]:
+        return np.array([index])
+    table, shift = lattice_table(grid.num_rings, grid.remove_corners, margin=1)
+    coords = lattice_coords(grid.ring, grid.sector, grid.offset) + shift
+
+    filled = np.zeros(len(grid), dtype=bool)
+    filled[index] = True
+    frontier = np.array([index])
+    # Обход в ширину сразу всем фронтом: шагов столько, сколько колец в области
+    while frontier.size:
+        neighbours = (coords[frontier][:, None, :] + SECTOR_AXES[None, :, :]).reshape(-1, 2)
+        cells = np.unique(table[neighbours[:, 0], neighbours[:, 1]])
+        cells = cells[cells >= 0]
+        frontier = cells[same[cells] & ~filled[cells]]
+        filled[frontier] = True
+    return np.flatnonzero(filled)
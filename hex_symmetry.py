@@ -0,0 +1,76 @@
+"""
+Симметрия сетки
+
+Для каждого числа колец один раз строятся таблицы перестановок: строка
+таблицы - образ каждого элемента при повороте или отражении, в порядке
+модели (кольцо, сектор, смещение). Правка с симметрией и проверка
+симметрии - это одна выборка по таблице, без поиска элементов по геометрии.
+
+Повороты на 60 градусов переводят сектор в следующий сектор. Отражение -
+зеркальное отображение слева направо (x -> -x) относительно центра сетки,
+в координатах решетки (a, b) -> (a + b, -b).
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+from hex_geometry import lattice_coords, lattice_table
+from hex_model import cell_keys
+
+
+# Режим симметрии -> преобразования группы (поворот на k * 60 градусов или отражение)
+SYMMETRY_MODES = {
+    '1/6': ('rot0', 'rot1', 'rot2', 'rot3', 'rot4', 'rot5'),
+    '1/3': ('rot0', 'rot2', 'rot4'),
+    '1/2': ('rot0', 'rot3'),
+    'mirror': ('rot0', 'mirror'),
+}
+
+
+@lru_cache(maxsize=16)
+def _transforms(num_rings, remove_corners):
+    """Образы всех элементов при каждом преобразовании: {имя: массив индексов}"""
+    ring, sector, offset, _ = cell_keys(num_rings, remove_corners)
+    table, shift = lattice_table(num_rings, remove_corners, margin=0)
+    a, b = (lattice_coords(ring, sector, offset) + shift).T
+    centered_a, centered_b = a - shift, b - shift
+
+    transforms = {}
+    # Поворот на 60 градусов: (a, b) -> (-b, a + b), т.е. ось сектора переходит в ось следующего
+    for k in range(6):
+        transforms[f'rot{k}'] = table[centered_a + shift, centered_b + shift]
+        centered_a, centered_b = -centered_b, centered_a + centered_b
+    transforms['mirror'] = table[a + b - shift, 2 * shift - b]
+    for name, image in transforms.items():
+        if (image < 0).any():
+            raise ValueError(f'Преобразование {name} выводит элементы за пределы сетки')
+        image.flags.writeable = False
+    return transforms
+
+
+@lru_cache(maxsize=16)
+def symmetry_table(num_rings, remove_corners=False, mode='1/6'):
+    """
+    Таблица перестановок (G, N): строка g - индекс образа каждого элемента при g-м преобразовании
+    режима mode (первая строка - тождественное преобразование)
+    """
+    transforms = _transforms(num_rings, remove_corners)
+    table = np.stack([transforms[name] for name in SYMMETRY_MODES[mode]])
+    table.flags.writeable = False
+    return table
+
+
+def symmetric_cells(table, cells):
+    """Элементы cells вместе со всеми их симметричными образами"""
+    return np.unique(table[:, np.atleast_1d(cells)])
+
+
+def asymmetric_cells(grid, mode='1/6'):
+    """
+    Элементы, цвет или состояние которых отличается хотя бы у одного из их образов
+    (номера и подписи не учитываются - они обычно у каждого элемента свои)
+    """
+    table = symmetry_table(grid.num_rings, grid.remove_corners, mode)
+    differs = (grid.color[table] != grid.color[None, :]) | (grid.state[table] != grid.state[None, :])
+    return np.flatnonzero(differs.any(axis=0))
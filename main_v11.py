@@ -2,59 +2,85 @@
 Основной скрипт
 """
 
-import math
+import sys
 
-import pickle
+from profiling import StartupProfile, LatencyLog, InteractionTrace
+
+# Профиль запуска создается до остальных импортов, чтобы замерить и их (см. --profile-startup)
+STARTUP = StartupProfile(enabled=__name__ == '__main__' and '--profile-startup' in sys.argv)
+
+# pylint: disable=wrong-import-position
+import multiprocessing
+import os
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 
 import numpy as np
-import matplotlib as mpl
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.backends.backend_tkagg import NavigationToolbar2Tk
-from matplotlib.figure import Figure
 
-from helpers import is_corner_hexagon, find_closest_edge, hex_to_name, key_by_value
+from background import BackgroundTask
+from cartogram_io import save_cartogram, CARTOGRAM_EXTENSION, LEGACY_EXTENSION
+from hex_geometry import grid_geometry, base_radius, HexHitIndex
+from hex_model import HexGridModel, STATE_NORMAL, STATE_DASHED, STATE_REMOVED, NO_NUMBER
 from info import MESSAGE_INFO
+from settings import BASE_COLOR, COLORS, COLOR_TO_HATCH, SAVE_DPI
+# Модули с matplotlib (chart_view, cartogram_figure, cartogram_cli) импортируются после показа окна
 
 
-# pylint:disable=line-too-long,attribute-defined-outside-init
-mpl.rcParams['savefig.dpi'] = 840  # Устанавливаем DPI для сохраняемых изображений
-
+# pylint:disable=line-too-long,attribute-defined-outside-init,import-outside-toplevel
 BUTTON_FONT = ("Times New Roma", 12)
 BUTTON_PADDING = 3
-NUM_SIDES_HEXAGON = 6
-BASE_COLOR = 'white'
-
-# Яркость
-ALPHA = 0.6
-
-# Размер окна графика
-FIGSIZE = (16, 8)
 
 # Шаг расстояния между элементами (шаг конфигурации)
 STEP_PADDING = 1.2
 
-# Цвета
-COLORS = [('Красный', 'red'),
-          ('Желтый', 'yellow'),
-          ('Зеленый', 'green'),
-          ('Синий', 'blue'),
-          ('Оранжевый', 'orange'),
-          ('Серый', 'gray'),
-          ('Белый', 'white')]
-
-# Цвета в черно-белом режиме
-COLOR_TO_HATCH = {
-            'red': '//////',
-            'yellow': 'xxxxxx',
-            'green': '......',
-            'blue': 'oooo',
-            'orange': '-----',
-            'gray': '\\\\\\\\\\\\',
-            'white': None
-        }
+# Изображение пишется во временный файл и переименовывается только после успешного сохранения
+PARTIAL_SUFFIX = '.part'
+
+# Файл отчета о запуске по умолчанию
+STARTUP_REPORT = 'startup_profile.txt'
+
+# Трасса обработчиков (--trace): файл Chrome trace, сохраняется по F12 и при закрытии окна
+TRACE_REPORT = 'interaction_trace.json'
+# Обработчики, время которых пишется в трассу. Оборачиваются до создания кнопок
+TRACED_CALLBACKS = ('on_click', 'replace_chart', 'set_padding', 'update_legend', 'update_text_size',
+                    'toggle_bw_mode', 'save_fig', 'load_fig', 'apply_to_cells')
+# Период обновления строки трассы в окне, мс
+TRACE_OVERLAY_MS = 500
+# Имя замера LatencyLog для правки одного элемента нажатием (показывается в строке трассы)
+CLICK_LATENCY = 'click'
+
+# Режимы выделения группы элементов (см. hex_selection) и действия над группой.
+# Действие None - закрасить выбранным цветом, иначе - новое состояние элементов
+SELECTION_MODES = {
+    "Выделить кольцо": 'ring',
+    "Выделить сектор": 'sector',
+    "Выделить прямоугольник": 'rectangle',
+    "Выделить лассо": 'lasso',
+    "Заливка одного цвета": 'fill',
+}
+# Правка одного элемента повторяется на его образах при симметрии (см. hex_symmetry)
+SYMMETRY_OPTIONS = {
+    "Без симметрии": None,
+    "Поворот на 60° (1/6)": '1/6',
+    "Поворот на 120° (1/3)": '1/3',
+    "Поворот на 180° (1/2)": '1/2',
+    "Зеркально": 'mirror',
+}
+# Сколько несимметричных элементов перечислять в сообщении проверки
+SYMMETRY_REPORT_CELLS = 15
+# Схемы автонумерации (см. hex_numbering), None - удалить все номера
+NUMBERING_OPTIONS = {
+    "По кольцам (спираль)": 'spiral',
+    "По строкам": 'rows',
+    "По секторам": 'sectors',
+    "Удалить все номера": None,
+}
+BULK_ACTIONS = {
+    "Закрасить": None,
+    "Сделать пунктирными": STATE_DASHED,
+    "Удалить": STATE_REMOVED,
+    "Восстановить": STATE_NORMAL,
+}
 
 
 class HexagonChartApp:
@@ -63,94 +89,155 @@ class HexagonChartApp:
     """
 
     # pylint: disable=redefined-outer-name
-    def __init__(self, root):
+    def __init__(self, root, startup=None, trace=None):
+        """
+        :param startup: StartupProfile, в который пишутся этапы запуска
+        :param trace:   InteractionTrace, в который пишется время обработчиков
+        """
         # Основные настройки
         self.root = root
         self.root.title("Рисовалка")
+        self.startup = startup or StartupProfile()
+        self.trace = trace or InteractionTrace()
 
         self.initialize_attributes()
+        self.trace.wrap(self, TRACED_CALLBACKS)
         self.setup_UI()
+        if self.trace.enabled:
+            self._create_trace_overlay()
 
     def initialize_attributes(self):
         """
         Определение атрибутов программы
         """
-        self.color_map = {}
-        self.original_colors = {}
         self.num_rings = 1
         self.min_rings = 1
-        self.max_rings = 30
+        self.max_rings = 300  # Большие сетки рисуются с уровнем детализации, см. hex_lod
         self.padding = 0  # Расстояние между шестигранниками и текстом
         self.radius = 0
-        self.hexagon_patches = []
+        self.renderer = None  # Коллекция элементов сетки, см. hex_render
+        self.hit_index = None  # Поиск элемента по точке, строится вместе с сеткой
+        self.blitter = None  # Частичная перерисовка элементов, строится вместе с холстом
+        self.latency = LatencyLog()
+        self.legend_text_element = None
+        self.compare_grid = None  # Картограмма, с которой сравнивается текущая (см. cartogram_diff)
+        self.diff_text_element = None
         self.selected_color = BASE_COLOR
-        self.remove_corners = tk.BooleanVar(value=False)
+        self.remove_corners = tk.BooleanVar(self.root, value=False)
         self.toolbar = None
         self.editing_color = False
         self.adding_number = False
         self.adding_text = False
         self.editing_hexagon = False
+        self.selection_mode = None  # Значение из SELECTION_MODES
+        self.selectors = {}  # Выделение прямоугольником и лассо, строится вместе с холстом
         self.scale_factor = None
         self.coeff_padding = 0.4
-        self.hexagon_numbers = {}
-        self.hexagon_texts = {}
-        self.removed_hexagons = set()
-        self.dashed_hexagons = set()
+        # Состояние элементов хранится в модели, отображение - в self.renderer
+        self.grid = HexGridModel(self.num_rings, self.remove_corners.get())
         self.color_titles = {}  # Добавьте эту строку
         self.initial_xlim = None
-        self.bw_mode = tk.BooleanVar(value=False)  # Черно-белый режим по умолчанию выключен
+        self.bw_mode = tk.BooleanVar(self.root, value=False)  # Черно-белый режим по умолчанию выключен
         self.color_to_hatch = COLOR_TO_HATCH
+        self.task = None  # Фоновая задача, см. background
+        self.task_title = None
+        self.grid_locked = False  # Задача строит фигуру по текущей модели, правка сетки ждет ее окончания
 
     def setup_UI(self):
         self.canvas_frame = ttk.Frame(self.root)
         self.canvas_frame.pack(fill=tk.BOTH, expand=True)
         self.canvas = None
+        self.fig = None
 
-        self.fig = self.draw_hexagon_chart()
+        self._create_controls()
+        self._create_status_bar()
+        self.startup.phase('окно и кнопки')
+
+        # Сначала показываются окно и кнопки, фигура строится, когда Tk освободится.
+        # До этого кнопки, которым нужна фигура, недоступны
+        self.chart_widgets = self.grid_widgets + [self.save_button, self.load_button, self.import_button,
+                                                 self.numbering_button, self.edit_colors_button, self.compare_button]
+        for widget in self.chart_widgets:
+            widget.state(['disabled'])
+        self.root.after_idle(self.draw_initial_chart)
+
+    def draw_initial_chart(self):
+        self.startup.phase('показ окна')
+        import chart_view  # pylint: disable=unused-import
+        self.startup.phase('импорт matplotlib')
+        self.draw_hexagon_chart()
+        self.startup.phase('построение фигуры')
         self.canvas = self._create_canvas()
-
         self.canvas.mpl_connect('button_press_event', self.on_click)
-        self.canvas.mpl_connect('draw_event', self.update_text_size)
-        self._create_controls()
+        self.update_legend(draw=False)
+        for widget in self.chart_widgets:
+            widget.state(['!disabled'])
+        self.startup.phase('холст')
+        if self.startup.enabled:
+            self._first_draw_id = self.canvas.mpl_connect('draw_event', self._first_draw)
+
+    def _first_draw(self, event=None):
+        self.canvas.mpl_disconnect(self._first_draw_id)
+        self.startup.phase('первая отрисовка')
+        self.startup.stop()
+        report = self.startup.report()
+        print(report)
+        with open(STARTUP_REPORT, 'w', encoding='utf-8') as file:
+            file.write(report + '\n')
+
+    def _create_trace_overlay(self):
+        # Строка с временем последнего взаимодействия под кнопками
+        self.trace_label = ttk.Label(self.root, font=("Consolas", 10))
+        self.trace_label.pack(side=tk.BOTTOM, fill=tk.X)
+        self.root.bind('<F12>', lambda event: self.dump_trace())
+        self.root.protocol('WM_DELETE_WINDOW', self._close_traced)
+        self._update_trace_overlay()
+
+    def _update_trace_overlay(self):
+        text = self.trace.overlay_text()
+        click = self.latency.last_ms(CLICK_LATENCY)
+        if click is not None:
+            text += f' | правка нажатием {click:.1f} мс'
+        self.trace_label.config(text=text)
+        self.root.after(TRACE_OVERLAY_MS, self._update_trace_overlay)
+
+    def dump_trace(self):
+        self.trace.dump(TRACE_REPORT, {'latency': self.latency.summary()})
+        print(f'Трасса сохранена в {TRACE_REPORT}')
+
+    def _close_traced(self):
+        self.dump_trace()
+        self.root.destroy()
 
     def _create_canvas(self):
-        canvas = FigureCanvasTkAgg(self.fig, master=self.canvas_frame)
-        self.toolbar = NavigationToolbar2Tk(canvas, self.canvas_frame)
-        self.toolbar.update()
-        # canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
-        canvas.get_tk_widget().pack(fill=tk.NONE, expand=False)
+        from chart_view import create_canvas, region_selectors
+        canvas, self.toolbar, self.blitter = create_canvas(self.fig, self.canvas_frame, self.renderer,
+                                                           self.save_image)
+        self.trace.watch_canvas(canvas)
+        self.selectors = region_selectors(self.renderer.ax, self.select_rectangle, self.select_lasso)
+        self._activate_selectors()
         return canvas
 
-    def update_text_size(self, event=None):
-        xlim = self.fig.axes[0].get_xlim()
+    def update_text_size(self, ax=None):
+        """
+        Размер номеров и уровень детализации сетки по масштабу. Вызывается при изменении
+        пределов осей (в т.ч. панелью инструментов), т.е. до отрисовки, поэтому сам ничего не перерисовывает
+        """
+        if self.renderer is None:
+            return
+        ax = self.renderer.ax
+        xlim = ax.get_xlim()
         if self.initial_xlim is None:
             self.initial_xlim = xlim  # Сохраняем исходные пределы при первом вызове
-            scale_factor = 1
-        else:
-            scale_factor = (self.initial_xlim[1] - self.initial_xlim[0]) / (xlim[1] - xlim[0])
-        for hexagon, elements in self.hexagon_numbers.items():
-            text_element = elements
-            current_font_size = self.radius * 2  # Исходный размер шрифта
-            new_font_size = current_font_size * scale_factor * 0.8  # Новый размер шрифта
-            text_element.set_fontsize(new_font_size)
-        self.canvas.draw_idle()
+        scale_factor = (self.initial_xlim[1] - self.initial_xlim[0]) / (xlim[1] - xlim[0])
+        self.renderer.set_view(xlim, ax.get_ylim())
+        self.renderer.set_number_view(scale_factor)
 
     def toggle_bw_mode(self):
-        if self.bw_mode.get():
-            for hexagon in self.hexagon_patches:
-                color = hexagon.get_facecolor()
-                color = hex_to_name(mpl.colors.to_hex(color))
-                hatch_pattern = self.color_to_hatch.get(color, BASE_COLOR)
-                hexagon.set_hatch(hatch_pattern)
-                hexagon.set_facecolor(BASE_COLOR)
-        else:
-            for hexagon in self.hexagon_patches:
-                original_color = self.color_map.get(hexagon, BASE_COLOR)
-                hexagon.set_alpha(ALPHA)
-                hexagon.set_facecolor(original_color)
-                hexagon.set_hatch(None)
-        self.canvas.draw_idle()
-        self.update_legend()
+        # Стили обоих режимов уже рассчитаны: переключение - выбор массива заливки и одна перерисовка
+        with self.latency.timer('bw_toggle'):
+            self.renderer.set_bw_mode(self.bw_mode.get())
+            self.update_legend()
 
     def _create_controls(self):
         style = ttk.Style()
@@ -170,13 +257,20 @@ class HexagonChartApp:
             "Добавить/Удалить элемент": ("editing_hexagon", True)
         }
 
-        if value in modes:
-            attribute, mode_value = modes[value]
+        if value in modes or value in SELECTION_MODES:
             self.editing_color = False
             self.adding_number = False
             self.adding_text = False
             self.editing_hexagon = False
-            setattr(self, attribute, mode_value)
+            self.selection_mode = SELECTION_MODES.get(value)
+            if value in modes:
+                attribute, mode_value = modes[value]
+                setattr(self, attribute, mode_value)
+            self._activate_selectors()
+
+    def _activate_selectors(self):
+        for name, selector in self.selectors.items():
+            selector.set_active(name == self.selection_mode)
 
     def _setup_top_controls(self):
         top_frame = ttk.Frame(self.root)
@@ -189,17 +283,21 @@ class HexagonChartApp:
         self.mode_var = tk.StringVar(self.root)
         self.mode_var.set("Просмотр")
         self.mode_options = ["Просмотр", "Просмотр", "Изменить цвет", "Добавить номер",
-                             "Добавить текст", "Добавить/Удалить элемент"]
+                             "Добавить текст", "Добавить/Удалить элемент", *SELECTION_MODES]
         self.mode_dropdown = ttk.OptionMenu(top_frame, self.mode_var, *self.mode_options, command=self.set_mode)
 
         self.save_button = ttk.Button(top_frame, text="Сохранить фигуру", command=self.save_fig)
         self.load_button = ttk.Button(top_frame, text="Загрузить фигуру", command=self.load_fig)
+        self.import_button = ttk.Button(top_frame, text="Импорт раскладки", command=self.import_pattern)
+        self.numbering_button = ttk.Menubutton(top_frame, text="Автонумерация", menu=self._create_numbering_menu())
 
         self.increase_padding_button = ttk.Button(top_frame, text="Увеличить расстояние", command=self.increase_padding)
         self.decrease_padding_button = ttk.Button(top_frame, text="Уменьшить расстояние", command=self.decrease_padding)
 
         self.info_button = ttk.Button(top_frame, text="Информация", command=self.show_info)
         self.edit_colors_button = ttk.Button(top_frame, text="Изменить имена цветов", command=self.edit_color_names)
+        self.check_symmetry_button = ttk.Button(top_frame, text="Проверить симметрию", command=self.check_symmetry)
+        self.compare_button = ttk.Button(top_frame, text="Сравнить с файлом", command=self.compare_fig)
 
         padx = 7
         pady = 3
@@ -211,12 +309,21 @@ class HexagonChartApp:
 
         self.save_button.grid(row=0, column=2, padx=padx, pady=pady)
         self.load_button.grid(row=1, column=2, padx=padx, pady=pady)
+        self.import_button.grid(row=2, column=2, padx=padx, pady=pady)
+        self.numbering_button.grid(row=2, column=3, padx=padx, pady=pady)
 
         self.increase_padding_button.grid(row=0, column=3, padx=padx, pady=pady)
         self.decrease_padding_button.grid(row=1, column=3, padx=padx, pady=pady)
         self.info_button.grid(row=1, column=4, padx=padx, pady=pady)
 
         self.edit_colors_button.grid(row=1, column=5, padx=padx, pady=pady)
+        self.check_symmetry_button.grid(row=0, column=5, padx=padx, pady=pady)
+        self.compare_button.grid(row=2, column=4, padx=padx, pady=pady)
+
+        self.symmetry_var = tk.StringVar(self.root)
+        self.symmetry_dropdown = ttk.OptionMenu(top_frame, self.symmetry_var, next(iter(SYMMETRY_OPTIONS)),
+                                                *SYMMETRY_OPTIONS)
+        self.symmetry_dropdown.grid(row=2, column=0, padx=padx, pady=pady)
 
     def _setup_middle_controls(self):
         middle_frame = ttk.Frame(self.root)
@@ -226,7 +333,7 @@ class HexagonChartApp:
         self.color_label = ttk.Label(middle_frame, text="Текущий цвет: " + self.selected_color, font=BUTTON_FONT)
         self.remove_corners_checkbutton = ttk.Checkbutton(middle_frame, text="Удалить угловые элементы",
                                                           variable=self.remove_corners,
-                                                          command=self.update_hexagon_chart)
+                                                          command=self.toggle_remove_corners)
 
         for col, widget in enumerate([self.color_button, self.color_label, self.remove_corners_checkbutton]):
             widget.grid(row=0, column=col, padx=10)
@@ -235,6 +342,93 @@ class HexagonChartApp:
                                          command=self.toggle_bw_mode)
         self.bw_button.grid(row=0, column=4, padx=10)
 
+        # Что делать с элементами, выделенными в режимах SELECTION_MODES
+        self.bulk_action_label = ttk.Label(middle_frame, text="Выделенные элементы:", font=BUTTON_FONT)
+        self.bulk_action_var = tk.StringVar(self.root)
+        first_action = next(iter(BULK_ACTIONS))
+        self.bulk_action_dropdown = ttk.OptionMenu(middle_frame, self.bulk_action_var, first_action, *BULK_ACTIONS)
+        self.bulk_action_label.grid(row=0, column=5, padx=(10, 0))
+        self.bulk_action_dropdown.grid(row=0, column=6, padx=(0, 10))
+
+    def _create_status_bar(self):
+        # Ход фоновой задачи, показывается только пока задача выполняется
+        self.status_frame = ttk.Frame(self.root)
+        self.status_label = ttk.Label(self.status_frame, font=BUTTON_FONT)
+        self.progress_bar = ttk.Progressbar(self.status_frame, length=300)
+        self.cancel_button = ttk.Button(self.status_frame, text="Отмена", command=self.cancel_task)
+        for col, widget in enumerate([self.status_label, self.progress_bar, self.cancel_button]):
+            widget.grid(row=0, column=col, padx=10)
+        # Кнопки, меняющие сетку, недоступны, пока по ней строится новая фигура
+        self.grid_widgets = [self.size_button, self.add_layer_button, self.remove_layer_button,
+                             self.increase_padding_button, self.decrease_padding_button,
+                             self.remove_corners_checkbutton, self.bw_button]
+
+    def start_task(self, title, function, args, on_done, on_stop=None, process=False, lock_grid=False,
+                   cancellable=True):
+        """
+        Запуск фоновой задачи с индикатором хода работы и кнопкой отмены
+        :param on_done:     on_done(result) после успешного завершения
+        :param on_stop:     on_stop() после ошибки или отмены
+        :param lock_grid:   Задача читает текущую модель, поэтому правка сетки до ее окончания запрещена
+        :param cancellable: Показывать кнопку отмены. Задача в потоке останавливается только в progress,
+                            поэтому для функций, которые его не вызывают, кнопки нет
+        :return: False, если уже выполняется другая задача
+        """
+        if self.task is not None:
+            messagebox.showinfo('Подождите', f'Дождитесь окончания операции: {self.task_title}')
+            return False
+
+        def finish(callback, *args):
+            self._end_task()
+            if callback:
+                callback(*args)
+
+        def failed(error):
+            finish(on_stop)
+            messagebox.showerror('Ошибка', f'{title}: {error}')
+
+        self.task_title = title
+        self.grid_locked = lock_grid
+        for widget in self.grid_widgets if lock_grid else []:
+            widget.state(['disabled'])
+        self.status_label.config(text=title)
+        self.progress_bar.config(mode='indeterminate', value=0)
+        self.progress_bar.start()
+        if not cancellable:
+            self.cancel_button.grid_remove()
+        self.status_frame.pack(pady=5)
+        self.task = BackgroundTask(self.root, function, args,
+                                   on_done=lambda result: finish(on_done, result),
+                                   on_error=failed,
+                                   on_cancel=lambda: finish(on_stop),
+                                   on_progress=self._show_progress,
+                                   process=process, latency=self.latency).start()
+        return True
+
+    def _show_progress(self, done, total):
+        if total is None:
+            return
+        if str(self.progress_bar['mode']) != 'determinate':
+            self.progress_bar.stop()
+            self.progress_bar.config(mode='determinate')
+        self.progress_bar.config(maximum=total, value=done)
+
+    def cancel_task(self):
+        if self.task is not None:
+            self.cancel_button.state(['disabled'])  # Поток остановится на ближайшей проверке
+            self.task.cancel()
+
+    def _end_task(self):
+        self.task = None
+        self.task_title = None
+        self.grid_locked = False
+        for widget in self.grid_widgets:
+            widget.state(['!disabled'])
+        self.progress_bar.stop()
+        self.cancel_button.state(['!disabled'])
+        self.cancel_button.grid()
+        self.status_frame.pack_forget()
+
     def edit_color_names(self):
         # Создаем новое окно
         window = tk.Toplevel(self.root)
@@ -279,56 +473,60 @@ class HexagonChartApp:
             color_menu.add_command(label=label, command=lambda col=color: self.set_selected_color(col))
         return color_menu
 
-    def add_number_to_hexagon(self, hexagon):
+    def _create_numbering_menu(self):
+        numbering_menu = tk.Menu(self.root, tearoff=0)
+        for label, scheme in NUMBERING_OPTIONS.items():
+            numbering_menu.add_command(label=label, command=lambda scheme=scheme: self.auto_number(scheme))
+        return numbering_menu
+
+    def auto_number(self, scheme):
+        """
+        Номера всем не удаленным элементам сразу по схеме scheme (None - удалить все номера).
+        Номера рисуются одним слоем, поэтому это одна раскладка и одна перерисовка
+        """
+        if self.grid_locked:
+            return
+        from hex_numbering import auto_numbers
+        if scheme is None:
+            numbers = NO_NUMBER
+        else:
+            start = tk.simpledialog.askinteger("Автонумерация", "Номер первого элемента:", initialvalue=1, minvalue=1)
+            if start is None:
+                return
+            numbers = auto_numbers(self.grid, scheme, start)
+        with self.latency.timer('auto_number'):
+            self.grid.set_number(slice(None), numbers)
+            self.renderer.update_numbers()
+            self.update_legend()
+
+    def add_number_to_hexagon(self, index):
         # Проверяем, есть ли у шестигранника номер
-        if hexagon in self.hexagon_numbers:
+        if self.grid.number[index] != NO_NUMBER:
             if messagebox.askyesno("Удалить номер", "Вы хотите удалить номер с этого элемента?"):
-                self.hexagon_numbers[hexagon].remove()
-                del self.hexagon_numbers[hexagon]
-                self.canvas.draw_idle()
+                self.grid.set_number(index, NO_NUMBER)
+                self.renderer.remove_number(index)
         else:
             # Спрашиваем у пользователя номер для добавления
             number = tk.simpledialog.askinteger("Добавить номер", "Введите номер для элемента:")
             if number:
-                radius = self.radius * 2
-                x_center = np.mean(hexagon.get_xy()[:, 0])
-                y_center = np.mean(hexagon.get_xy()[:, 1])
-                text_element = self.fig.axes[0].text(x_center, y_center, str(number) + ' ',
-                                                     ha='center', va='center', fontsize=radius)
-                self.hexagon_numbers[hexagon] = text_element
-
-    def add_text_to_hexagon(self, hexagon, event_point):
+                self.grid.set_number(index, number)
+                self.renderer.draw_number(index)
+
+    def add_text_to_hexagon(self, index, event_point):
         """Добавляет или удаляет текст рядом с шестигранником."""
-        if hexagon in self.hexagon_texts:
+        if self.grid.text[index] is not None:
             if messagebox.askyesno("Удалить текст", "Вы хотите удалить текст с этого элемента?"):
                 # Удаляем текст
-                self.hexagon_texts[hexagon].remove()
-                del self.hexagon_texts[hexagon]
+                self.grid.set_text(index, None)
+                self.renderer.remove_text(index)
         else:
             # Спрашиваем у пользователя текст для добавления
             text = tk.simpledialog.askstring("Добавить текст", "Введите текст для шестигранника:")
             if text:
-                # Вычисляем позицию для текста вне шестигранника
-                direction = np.array([event_point[0], event_point[1]]) - np.array([0, 0])
-                norm_direction = direction / np.linalg.norm(direction)
-
-                # Вычисляем максимальное расстояние от центра до края фигуры
-                max_distance = self.num_rings * self.radius * 2 + self.padding
-
-                # Вычисляем позицию текста на этом максимальном расстоянии в направлении клика
-                text_position = np.array([0, 0]) + norm_direction * max_distance
-
-                # Добавляем аннотацию со стрелкой
-                annotation = self.fig.axes[0].annotate(
-                    text,
-                    xy=(event_point[0], event_point[1]),  # координаты, куда указывает стрелка
-                    xytext=text_position,  # координаты текста
-                    size=10,
-                    ha='center',
-                    va='center',
-                    arrowprops=dict(facecolor='black', arrowstyle='->', lw=0.5)
-                )
-                self.hexagon_texts[hexagon] = annotation
+                # Точку стрелки храним относительно центра элемента, чтобы она пережила перестроение сетки
+                anchor = (np.array(event_point) - self.renderer.centers[index]) / self.radius
+                self.grid.set_text(index, text, anchor)
+                self.renderer.draw_text(index)
 
     def prompt_num_rings(self):
         num_rings = tk.simpledialog.askinteger("Изменить количество колец",
@@ -336,18 +534,14 @@ class HexagonChartApp:
                                                f" ({self.min_rings}-{self.max_rings}):",
                                                minvalue=self.min_rings, maxvalue=self.max_rings)
         if num_rings is not None:
-            self.num_rings = num_rings
-            self.color_map = {}
-            self.update_hexagon_chart()
+            self.resize_grid(num_rings)
 
     def add_ring(self):
         """Добавляем внешний слой."""
         if self.num_rings >= self.max_rings:
             messagebox.showerror('Ошибка', f'Количество колец не может быть больше {self.max_rings}')
             return
-        self.num_rings += 1
-        self.color_map = {}
-        self.update_hexagon_chart()
+        self.resize_grid(self.num_rings + 1)
 
     def remove_ring(self):
         """Удаляем внешний слой, если он существует."""
@@ -355,294 +549,420 @@ class HexagonChartApp:
             messagebox.showerror('Ошибка', f'Количество колец не может быть меньше {self.min_rings}')
             return
         if self.num_rings > 1:
-            self.num_rings -= 1
-            self.color_map = {}
-            self.update_hexagon_chart()
+            self.resize_grid(self.num_rings - 1)
+
+    def toggle_remove_corners(self):
+        self.resize_grid(self.num_rings)
+
+    def resize_grid(self, num_rings):
+        """
+        Изменение числа колец на текущей фигуре: добавляются или удаляются только
+        изменившиеся элементы, холст, панель инструментов и состояние элементов сохраняются
+        """
+        self.num_rings = num_rings
+        source = self.grid.resize(num_rings, self.remove_corners.get())
+        # Сетка остается в масштабе, в котором была построена фигура, меняются только пределы осей
+        centers, vertices = grid_geometry(num_rings, self.radius, self.padding, self.remove_corners.get())
+        self.renderer.font_size = base_radius(num_rings) * 2
+        self.renderer.resize(source, centers, vertices)
+        self.hit_index = HexHitIndex(num_rings, self.radius, self.padding, self.remove_corners.get())
+        self._set_limits(self.fig.axes[0])
+        self.toolbar.update()  # Сбрасываем историю масштабирования
+        self.update_legend()
 
     def increase_padding(self):
         """
         Увеличение расстояния между шестигранниками
         """
-        self.coeff_padding *= STEP_PADDING
-        self.update_hexagon_chart()
+        self.set_padding(self.coeff_padding * STEP_PADDING)
 
     def decrease_padding(self):
         """
         Уменьшение расстояния между шестигранниками
         """
-        self.coeff_padding /= STEP_PADDING
-        self.update_hexagon_chart()
+        self.set_padding(self.coeff_padding / STEP_PADDING)
+
+    def set_padding(self, coeff_padding):
+        """
+        Новое расстояние между элементами на текущей фигуре: элементы сдвигаются на тех же
+        артистах, холст, панель инструментов, цвета, номера и подписи сохраняются
+        """
+        with self.latency.timer('set_padding'):
+            self.coeff_padding = coeff_padding
+            self.padding = self.radius * coeff_padding
+            centers, vertices = grid_geometry(self.num_rings, self.radius, self.padding, self.remove_corners.get())
+            self.renderer.set_geometry(centers, vertices, self.padding)
+            self.hit_index = HexHitIndex(self.num_rings, self.radius, self.padding, self.remove_corners.get())
+            self._set_limits(self.fig.axes[0])
+            self.toolbar.update()  # Сбрасываем историю масштабирования
+            self.update_legend()
 
     def find_closest_hexagon(self, x, y):
-        min_dist = float('inf')
-        closest_hexagon = None
-        for hexagon in self.hexagon_patches:
-            dist = np.sqrt((x - hexagon.get_xy()[:, 0]) ** 2 + (y - hexagon.get_xy()[:, 1]) ** 2)
-            if dist.min() < min_dist:
-                min_dist = dist.min()
-                closest_hexagon = hexagon
-        return closest_hexagon
-
-    def update_legend(self):
-        total_count, color_count, color_names = self.count_hexagons_by_color()
-        legend_text = [f"Всего {total_count} элементов"]
-
-        if self.bw_mode.get():
-            for color, count in color_count.items():
-                legend_text.append(f"{color} "
-                                   f"({self.color_titles.get(key_by_value(COLOR_TO_HATCH, color), '')}"
-                                   f"): {count}")
-        else:
-            for color, count in color_count.items():
-                legend_text.append(f"{color} ({self.color_titles.get(color, '')}): {count}")
+        """Индекс элемента под точкой или None, если точка попала между элементами или вне сетки"""
+        return self.hit_index.find(x, y)
+
+    def update_legend(self, draw=True):
+        # Легенда создается один раз на фигуру, дальше меняется только ее текст
+        from cartogram_figure import add_legend, legend_text
+        if self.legend_text_element is None or self.legend_text_element.figure is not self.fig:
+            self.legend_text_element = add_legend(self.fig)
+        self.legend_text_element.set_text(legend_text(self.grid, self.color_titles, self.bw_mode.get()))
+        self._update_diff()
+        if draw:
+            if self.blitter:
+                self.blitter.invalidate()
+            self.canvas.draw_idle()
+
+    def _update_diff(self):
+        """Выделение отличий от картограммы сравнения и их сводка над легендой"""
+        from cartogram_diff import CartogramDiff
+        from cartogram_figure import add_legend, DIFF_POSITION
+        diff = None
+        if self.compare_grid is not None:
+            with self.latency.timer('diff'):
+                try:
+                    diff = CartogramDiff(self.compare_grid, self.grid)
+                except ValueError:
+                    # Размер сетки изменился - сравнение снимается
+                    self.compare_grid = None
+                    self.compare_button.config(text="Сравнить с файлом")
+        if diff is None and self.diff_text_element is None:
+            return
+        if self.diff_text_element is None or self.diff_text_element.figure is not self.fig:
+            self.diff_text_element = add_legend(self.fig, position=DIFF_POSITION)
+        self.diff_text_element.set_text(diff.legend_text(self.color_titles) if diff else '')
+        self.renderer.set_highlight(diff.cells() if diff else [])
 
-        # Удаление старой легенды (если она существует) и добавление новой:
-        if hasattr(self, 'legend_text_element'):
-            self.legend_text_element.remove()
-        self.legend_text_element = self.fig.text(0.85, 0.2, '\n'.join(legend_text), fontsize=12,
-                                                 verticalalignment='center')
-        self.canvas.draw_idle()
+    def _legend_extents(self):
+        """Области легенды и сводки сравнения на экране (для частичной перерисовки)"""
+        return [self.blitter.extent(element) for element in (self.legend_text_element, self.diff_text_element)]
 
     def on_click(self, event):
+        if self.grid_locked:
+            return
         # Получаем координаты точки нажатия
         x, y = event.xdata, event.ydata
-        closest_hexagon = self.find_closest_hexagon(x, y)
         if x is not None and y is not None:
-            if closest_hexagon:
-                if self.adding_text:
-                    self.add_text_to_hexagon(closest_hexagon, (x, y))
-                elif self.adding_number:
-                    self.add_number_to_hexagon(closest_hexagon)
-                elif self.editing_color:
-                    self.color_map[closest_hexagon] = self.selected_color
-                    closest_hexagon.set_alpha(ALPHA)
-                    if self.bw_mode.get():
-                        closest_hexagon.set_hatch(self.color_to_hatch.get(self.selected_color, BASE_COLOR))
-                    else:
-                        closest_hexagon.set_facecolor(self.selected_color)
-                elif self.editing_hexagon:
-                    self.edit_hexagon(closest_hexagon)
-                self.canvas.draw_idle()  # Обновляем отображение
+            closest_index = self.find_closest_hexagon(x, y)
+            if closest_index is not None and self.selection_mode in ('ring', 'sector', 'fill'):
+                self.select_group(closest_index)
+            elif closest_index is not None and self.selection_mode is None:
+                # Время правки одного элемента от нажатия до перерисовки
+                with self.latency.timer(CLICK_LATENCY):
+                    self._edit_clicked(closest_index, x, y)
+
+    def _edit_clicked(self, closest_index, x, y):
+        """Правка элемента closest_index по текущему режиму и перерисовка его области"""
+        # Области легенды и номера до изменения - их тоже нужно перерисовать
+        dirty_regions = self._legend_extents() + [self.blitter.number_extent(closest_index)]
+        # Цвет и состояние меняются сразу у элемента и всех его симметричных образов
+        cells = self.symmetric_cells(closest_index) if self.editing_color or self.editing_hexagon \
+            else [closest_index]
+        if self.adding_text:
+            self.add_text_to_hexagon(closest_index, (x, y))
+        elif self.adding_number:
+            self.add_number_to_hexagon(closest_index)
+        elif self.editing_color:
+            self.grid.set_color(cells, self.selected_color)
+            self.renderer.update_cells(cells)
+        elif self.editing_hexagon:
+            self.edit_hexagon(closest_index, cells)
+
+        # Правка одного элемента перерисовывает только его область и легенду
+        self.update_legend(draw=False)
+        dirty_regions += self._legend_extents()
+        blitted = (self.editing_color or self.editing_hexagon or self.adding_number) \
+            and self.blitter.blit(cells, dirty_regions)
+        if not blitted:
+            self.update_legend()  # Обновляем отображение
+
+    def select_group(self, index):
+        from hex_selection import ring_cells, sector_cells, flood_fill_cells
+        select = {'ring': ring_cells, 'sector': sector_cells, 'fill': flood_fill_cells}[self.selection_mode]
+        self.apply_to_cells(select(self.grid, index))
+
+    def select_rectangle(self, corner, opposite):
+        from hex_selection import rectangle_cells
+        if None not in corner + opposite:
+            self.apply_to_cells(rectangle_cells(self.renderer.centers, corner, opposite))
+
+    def select_lasso(self, vertices):
+        from hex_selection import polygon_cells
+        self.apply_to_cells(polygon_cells(self.renderer.centers, vertices))
+
+    def apply_to_cells(self, cells):
+        """
+        Действие BULK_ACTIONS над группой элементов: одно обновление модели и отображения
+        для всех элементов сразу, одна перерисовка и один пересчет легенды
+        """
+        if self.grid_locked or not len(cells):
+            return
+        cells = self.symmetric_cells(cells)
+        with self.latency.timer('bulk_update'):
+            dirty_regions = self._legend_extents()
+            state = BULK_ACTIONS[self.bulk_action_var.get()]
+            if state is None:
+                self.grid.set_color(cells, self.selected_color)
+            else:
+                self.grid.set_state(cells, state)
+            self.renderer.update_cells(cells)
+
+            self.update_legend(draw=False)
+            dirty_regions += self._legend_extents()
+            # Небольшая группа перерисовывается частично, большая - вся фигура за один раз
+            if not self.blitter.blit(cells, dirty_regions):
                 self.update_legend()
 
-    def edit_hexagon(self, closest_hexagon):
-        if closest_hexagon not in self.removed_hexagons and closest_hexagon not in self.dashed_hexagons:
+    def edit_hexagon(self, index, cells=None):
+        """
+        Следующее состояние элемента index: обычный -> пунктирный -> удален -> обычный
+        :param cells: Элементы, которым назначается то же состояние (index и его симметричные образы)
+        """
+        cells = index if cells is None else cells
+        state = self.grid.state[index]
+        if state == STATE_NORMAL:
             # Сначала делаем границу шестигранника прерывистой
-            closest_hexagon.set_linestyle("--")
-            self.dashed_hexagons.add(closest_hexagon)
-        elif closest_hexagon in self.dashed_hexagons:
+            self.grid.set_state(cells, STATE_DASHED)
+        elif state == STATE_DASHED:
             # Если шестигранник уже имеет прерывистую линию, удаляем его
-            closest_hexagon.set_visible(False)
-            self.removed_hexagons.add(closest_hexagon)
-            self.dashed_hexagons.remove(closest_hexagon)
+            self.grid.set_state(cells, STATE_REMOVED)
         else:
             # Восстанавливаем шестигранник
-            closest_hexagon.set_visible(True)
-            closest_hexagon.set_linestyle("-")
-            self.removed_hexagons.remove(closest_hexagon)
+            self.grid.set_state(cells, STATE_NORMAL)
+        self.renderer.update_cells(cells)
+
+    def symmetric_cells(self, cells):
+        """Элементы cells вместе с их образами в выбранном режиме симметрии"""
+        mode = SYMMETRY_OPTIONS[self.symmetry_var.get()]
+        if mode is None:
+            return np.atleast_1d(cells)
+        from hex_symmetry import symmetry_table, symmetric_cells
+        return symmetric_cells(symmetry_table(self.grid.num_rings, self.grid.remove_corners, mode), cells)
+
+    def check_symmetry(self):
+        """Сообщение об элементах, нарушающих выбранную симметрию (без симметрии - поворот на 60°)"""
+        from hex_symmetry import asymmetric_cells
+        mode = SYMMETRY_OPTIONS[self.symmetry_var.get()] or '1/6'
+        cells = asymmetric_cells(self.grid, mode)
+        if not cells.size:
+            messagebox.showinfo("Симметрия", "Картограмма симметрична")
+            return
+        shown = [f"кольцо {self.grid.ring[index]}, сектор {self.grid.sector[index]}, смещение {self.grid.offset[index]}"
+                 for index in cells[:SYMMETRY_REPORT_CELLS]]
+        more = f"\n... и еще {cells.size - len(shown)}" if cells.size > len(shown) else ""
+        messagebox.showwarning("Симметрия", f"Несимметричных элементов: {cells.size}\n" + "\n".join(shown) + more)
 
     def set_selected_color(self, color):
         self.selected_color = color
-        for hexagon in self.hexagon_patches:
-            self.original_colors[hexagon] = hexagon.get_facecolor()
         self.color_label.config(text="Текущий цвет: " + self.selected_color)
 
-    def update_hexagon_chart(self):
-        plt.close(self.fig)  # Закрыть текущую фигуру
-        self.fig.clf()
-        self.hexagon_patches = []  # Очищаем список элементов
-
-        # Удаляем старый холст и панель инструментов
-        self.canvas.get_tk_widget().pack_forget()
-        self.canvas.get_tk_widget().destroy()  # Уничтожаем текущий виджет холста
-        if self.toolbar:
-            self.toolbar.destroy()
+    def replace_chart(self, chart):
+        """Замена фигуры и холста на новую фигуру из build_chart"""
+        with self.latency.timer('replace_chart'):
+            self.fig.clf()  # Фигура создана без pyplot, закрывать ее в pyplot не нужно
 
-        self.canvas.get_tk_widget().destroy()
+            # Удаляем старый холст и панель инструментов
+            self.canvas.get_tk_widget().pack_forget()
+            self.canvas.get_tk_widget().destroy()  # Уничтожаем текущий виджет холста
+            if self.toolbar:
+                self.toolbar.destroy()
 
-        self.fig = self.draw_hexagon_chart()  # Создаем новую фигуру
+            self.set_chart(chart)
 
-        self.canvas = self._create_canvas()  # Используем метод для создания нового холста и панели инструментов
-        self.canvas.mpl_connect('button_press_event', self.on_click)
-        self.canvas.mpl_connect('draw_event', self.update_text_size)
-        # Обновляем область видимости для скроллинга
-        self.canvas.get_tk_widget().configure(scrollregion=self.canvas.get_tk_widget().bbox(tk.ALL))
+            self.canvas = self._create_canvas()  # Используем метод для создания нового холста и панели инструментов
+            self.canvas.mpl_connect('button_press_event', self.on_click)
+            # Обновляем область видимости для скроллинга
+            self.canvas.get_tk_widget().configure(scrollregion=self.canvas.get_tk_widget().bbox(tk.ALL))
+            self.update_legend()
 
     def draw_hexagon_chart(self):
-        origin = (0, 0)  # Стартовая точка
-        base_radius = 100 / (1.5 * self.num_rings + 1)
-        self.radius = base_radius  # Радиус шестигранников
-        self.padding = base_radius * self.coeff_padding  # Расстояние между шестигранниками
-        self.fig = self.draw_hex_grid(origin, self.num_rings, self.radius, self.padding)
+        if (self.grid.num_rings, self.grid.remove_corners) != (self.num_rings, self.remove_corners.get()):
+            self.grid.resize(self.num_rings, self.remove_corners.get())
+        from chart_view import build_chart
+        self.set_chart(build_chart(self.grid, self.coeff_padding, self.bw_mode.get()))
         if self.canvas:
             self.update_legend()
         return self.fig
 
-    def draw_hex(self, ax, x, y, size):
-        angle = 2 * np.pi / NUM_SIDES_HEXAGON
-        x_coords = [x + size * math.cos(angle * i) for i in range(NUM_SIDES_HEXAGON)]
-        y_coords = [y + size * math.sin(angle * i) for i in range(NUM_SIDES_HEXAGON)]
-        hexagon = plt.Polygon(np.column_stack((x_coords, y_coords)), edgecolor='black', facecolor=BASE_COLOR)
-        hexagon.set_alpha(ALPHA)
-        # Если шестигранник уже был окрашен, применяем предыдущий цвет:
-        if hexagon in self.color_map:
-            hexagon.set_facecolor(self.color_map[hexagon])
-        self.patches.append(hexagon)
-        self.hexagon_patches.append(hexagon)
-        ax.add_patch(hexagon)
-
-    def draw_hex_grid(self, origin, num_rings, radius, padding):
-        """
-        Рисование сетки шестигранников
-        :param origin:    Центр для сетки
-        :param num_rings: Кольца
-        :param radius:    Радиус одного шестигранника
-        :param padding:   Отступ между шестигранниками
-        :return:
-        """
-        self.patches = []  # Список для хранения кругов
-        fig = Figure(figsize=FIGSIZE)
-        ax = fig.add_subplot(111)
-
-        ax.set_aspect(1, 'box')  # Оставим такой тип, т.к. он не растягивает фигуру при приближении
-
-        # При желании можно поиграться с этими стилями
-        # ax.set_aspect('equal', 'box')
-        # ax.set_aspect(1, adjustable='datalim')
-        ang60 = math.radians(60)
-        x_off = 1.5 * (radius + padding)
-        y_off = math.sqrt(3) * (radius + padding)
-
-        x_center, y_center = origin
-
-        for ring in range(num_rings):
-            for i in range(6):
-                for j in range(ring):
-                    if self.remove_corners.get() and is_corner_hexagon(i, j, num_rings, ring):
-                        continue
-                    angle = i * ang60
-                    x_shift = j * x_off * math.cos(angle + ang60) + (ring - j) * x_off * math.cos(angle)
-                    y_shift = j * y_off * math.sin(angle + ang60) + (ring - j) * y_off * math.sin(angle)
-
-                    x = x_center + x_shift
-                    y = y_center + y_shift
-
-                    self.draw_hex(ax, y, x, radius)
-
-
-        # Центр шестигранника
-        if num_rings > 0:
-            self.draw_hex(ax, x_center, y_center, radius)
-
-        ax.set_xlim(-x_off * self.num_rings * 2.5, x_off * self.num_rings * 2.5)
-        ax.set_ylim(-y_off * self.num_rings, y_off * self.num_rings)
-        # ax.set_autoscale_on(False)
-        # ax.set_axis_off()
-        ax.xaxis.set_major_locator(plt.NullLocator())
-        ax.yaxis.set_major_locator(plt.NullLocator())
+    def set_chart(self, chart):
+        """Фигура из build_chart становится текущей: масштаб номеров следит за пределами ее осей"""
+        self.fig, self.renderer, self.hit_index = chart
+        self.radius = self.renderer.radius
+        self.padding = self.renderer.padding
+
+        # Масштабирование и сдвиг меняют пределы осей - по ним пересчитываются номера
+        ax = self.renderer.ax
         self.initial_xlim = ax.get_xlim()
-        fig.tight_layout()
-        return fig
-
-    def count_hexagons_by_color(self):
-        color_count = {}
-        color_names = {}
-        total_count = 0
-
-        if self.bw_mode.get():
-            for hexagon in self.hexagon_patches:
-                if hexagon not in self.removed_hexagons:  # Не учитываем удаленные шестигранники
-                    color = hexagon.get_hatch()
-                    color_count[color] = color_count.get(color, 0) + 1
-                    if hexagon in self.color_map:
-                        color_names[color] = self.color_map[hexagon]
-                    total_count += 1
-                    if hexagon in self.dashed_hexagons:
-                        hexagon.set_linestyle("--")
-        else:
-            for hexagon in self.hexagon_patches:
-                if hexagon not in self.removed_hexagons:  # Не учитываем удаленные шестигранники
-                    color = hexagon.get_facecolor()
-                    color = mpl.colors.to_hex(color)      # Преобразование цвета к шестнадцатеричному формату
-                    color = hex_to_name(color)            # Получаем имя цвета
-                    color_count[color] = color_count.get(color, 0) + 1
-                    color_names[color] = self.color_map.get(hexagon, BASE_COLOR)
-                    total_count += 1
-                    if hexagon in self.dashed_hexagons:
-                        hexagon.set_linestyle("--")
-
-        return total_count, color_count, color_names
+        ax.callbacks.connect('xlim_changed', self.update_text_size)
+        ax.callbacks.connect('ylim_changed', self.update_text_size)
+
+    def _set_limits(self, ax):
+        from cartogram_figure import grid_limits
+        xlim, ylim = grid_limits(self.num_rings, self.radius, self.padding)
+        # Исходные пределы задаются до изменения осей, от них считается масштаб номеров
+        self.initial_xlim = xlim
+        ax.set_xlim(xlim)
+        ax.set_ylim(ylim)
 
     def save_fig(self):
-        file_path = filedialog.asksaveasfilename(defaultextension=".pkl", filetypes=[("Pickle файлы", "*.pkl")])
+        file_path = filedialog.asksaveasfilename(defaultextension=CARTOGRAM_EXTENSION,
+                                                 filetypes=[("Картограмма", "*" + CARTOGRAM_EXTENSION)])
         if file_path:
-            with open(file_path, 'wb') as f:
-                if hasattr(self, 'legend_text_element'):
-                    self.legend_text_element.remove()
-                # Сохраняем все атрибуты класса, чтобы могли потом изменять фигуру
-                attributes_to_save = {
-                    "color_map": self.color_map,
-                    "num_rings": self.num_rings,
-                    "padding": self.padding,
-                    "hexagon_patches": self.hexagon_patches,
-                    "selected_color": self.selected_color,
-                    "removed_hexagons": self.removed_hexagons,
-                    "remove_corners": self.remove_corners.get(),
-                    "hexagon_numbers": self.hexagon_numbers,
-                    "hexagon_texts": self.hexagon_texts,
-                    "scale_factor": self.scale_factor,
-                    "initial_xlim": self.initial_xlim,
-                    "fig": self.fig
-                }
-                pickle.dump(attributes_to_save, f)
-                self.update_legend()
+            # Сохраняется только состояние сетки, фигура по нему перестраивается при загрузке.
+            # Файл пишется из копии модели, поэтому сетку можно править во время сохранения
+            self._save_cartogram(file_path)
+
+    def _save_cartogram(self, file_path):
+        arguments = (file_path, self.grid.copy(), self.coeff_padding, dict(self.color_titles), self.selected_color)
+        # Запись файла не прерывается: отмена оставила бы недописанную картограмму
+        self.start_task('Сохранение картограммы', lambda *args, progress: save_cartogram(*args), arguments,
+                        on_done=None, cancellable=False)
 
     def load_fig(self):
-        file_path = filedialog.askopenfilename(defaultextension=".pkl", filetypes=[("Pickle файлы", "*.pkl")])
+        file_path = filedialog.askopenfilename(
+            defaultextension=CARTOGRAM_EXTENSION,
+            filetypes=[("Картограмма", "*" + CARTOGRAM_EXTENSION), ("Старый формат (Pickle)", "*" + LEGACY_EXTENSION)])
         if file_path:
-            with open(file_path, 'rb') as file:
-                loaded_attributes = pickle.load(file)
+            # Файл читается и массивы фигуры считаются в фоне, текущая картограмма остается до окончания загрузки.
+            # Сама фигура строится в потоке Tk: объекты matplotlib создаются только в нем
+            from chart_view import load_chart
+            self.start_task('Загрузка картограммы', load_chart, (file_path,),
+                            lambda result: self._loaded(file_path, *result), lock_grid=True)
+
+    def _loaded(self, file_path, grid, attributes, prepared):
+        # Восстанавливаем атрибуты
+        self.grid = grid
+        self.num_rings = self.grid.num_rings
+        self.remove_corners.set(self.grid.remove_corners)
+        self.coeff_padding = attributes['coeff_padding']
+        self.color_titles = attributes['color_titles']
+        self.selected_color = attributes['selected_color']
+        self.color_label.config(text="Текущий цвет: " + self.selected_color)
 
-            # Закрыть текущую фигуру и очистить холст
-            plt.close(self.fig)
-            self.canvas.get_tk_widget().pack_forget()
-            self.canvas.get_tk_widget().destroy()
-            if self.toolbar:
-                self.toolbar.destroy()
+        from chart_view import build_chart
+        self.replace_chart(build_chart(grid, self.coeff_padding, self.bw_mode.get(), prepared))
 
-            # Восстанавливаем атрибуты
-            self.color_map = loaded_attributes["color_map"]
-            self.num_rings = loaded_attributes["num_rings"]
-            self.hexagon_patches = loaded_attributes["hexagon_patches"]
-            self.selected_color = loaded_attributes["selected_color"]
-            self.remove_corners.set(loaded_attributes["remove_corners"])
-            self.hexagon_numbers = loaded_attributes["hexagon_numbers"]
-            self.hexagon_texts = loaded_attributes["hexagon_texts"]
-            self.fig = loaded_attributes["fig"]
-            self.scale_factor = loaded_attributes["scale_factor"]
-
-            # Для поддержания старых картограм
-            try:
-                self.padding = loaded_attributes["padding"]
-            except:
-                self.padding = 0.4
-            try:
-                self.removed_hexagons = loaded_attributes["removed_hexagons"]
-            except:
-                self.removed_hexagons = None
+        if file_path.endswith(LEGACY_EXTENSION) and messagebox.askyesno(
+                "Старый формат", "Сохранить картограмму в новом формате рядом со старым файлом?"):
+            self._save_cartogram(file_path[:-len(LEGACY_EXTENSION)] + CARTOGRAM_EXTENSION)
+
+    def compare_fig(self):
+        """
+        Сравнение с картограммой из файла того же размера: отличия выделяются на сетке, их количество
+        и переходы цветов показываются над легендой и пересчитываются после каждой правки.
+        Повторное нажатие снимает сравнение
+        """
+        if self.compare_grid is not None:
+            self._compare_with(None)
+            return
+        file_path = filedialog.askopenfilename(
+            filetypes=[("Картограмма", "*" + CARTOGRAM_EXTENSION), ("Старый формат (Pickle)", "*" + LEGACY_EXTENSION)])
+        if file_path:
+            from cartogram_cli import read_cartogram
+            self.start_task('Чтение картограммы', lambda path, progress: read_cartogram(path)[0], (file_path,),
+                            self._compare_with, cancellable=False)
+
+    def _compare_with(self, grid):
+        if grid is not None:
+            from cartogram_diff import CartogramDiff
             try:
-                self.initial_xlim = loaded_attributes["initial_xlim"]
-            except:
-                self.initial_xlim = None
-            # Пересоздаем холст и обновляем его содержимое
-            self.canvas = self._create_canvas()
-            self.canvas.mpl_connect('button_press_event', self.on_click)
-            self.canvas.mpl_connect('draw_event', self.update_text_size)
-            self.canvas.draw()
+                CartogramDiff(grid, self.grid)
+            except ValueError as error:
+                messagebox.showerror("Сравнение", str(error))
+                return
+        self.compare_grid = grid
+        self.compare_button.config(text="Сбросить сравнение" if grid is not None else "Сравнить с файлом")
+        self.update_legend()
+
+    def import_pattern(self):
+        """
+        Импорт цветов, номеров и подписей из CSV, TSV или .npy (см. pattern_import).
+        Файл читается в фоне в копию модели, результат применяется одной перерисовкой
+        """
+        file_path = filedialog.askopenfilename(
+            filetypes=[("Раскладка", "*.csv *.tsv *.txt *.npy"), ("Все файлы", "*.*")])
+        if file_path:
+            from pattern_import import import_pattern
+            grid = self.grid.copy()
+            self.start_task('Импорт раскладки', import_pattern, (grid, file_path),
+                            lambda report: self._imported(grid, report), lock_grid=True)
+
+    def _imported(self, grid, report):
+        # Модель не заменяется, а получает массивы копии: на нее ссылаются отрисовщик и фигура
+        with self.latency.timer('import_pattern'):
+            old = self.grid
+            recolored = np.flatnonzero(old.color != grid.color)
+            retexted = np.flatnonzero(old.text != grid.text).tolist()
+            old.color[:], old.number[:], old.text[:], old.text_anchor[:] = \
+                grid.color, grid.number, grid.text, grid.text_anchor
+            old.recount()
+
+            self.renderer.update_cells(recolored)
+            self.renderer.update_numbers()
+            for index in retexted:
+                if old.text[index] is None:
+                    self.renderer.remove_text(index)
+                else:
+                    self.renderer.draw_text(index)
             self.update_legend()
+        show = messagebox.showwarning if report.skipped else messagebox.showinfo
+        show('Импорт раскладки', report.summary())
 
+    def save_image(self):
+        """
+        Сохранение изображения (кнопка панели инструментов). Рисование при SAVE_DPI идет в отдельном
+        процессе по копии модели, приближенная область сохраняется так же, как видна на экране
+        """
+        from cartogram_cli import export_grid, EXPORT_FORMATS
+        file_path = filedialog.asksaveasfilename(
+            defaultextension='.png', filetypes=[(export_format.upper(), '*.' + export_format)
+                                                for export_format in EXPORT_FORMATS])
+        if not file_path:
+            return
+        export_format = os.path.splitext(file_path)[1][1:].lower()
+        if export_format not in EXPORT_FORMATS:
+            messagebox.showerror('Ошибка', f'Поддерживаются форматы: {", ".join(EXPORT_FORMATS)}')
+            return
 
-root = tk.Tk()
-app = HexagonChartApp(root)
-root.state('zoomed')
-root.mainloop()
+        partial_path = file_path + PARTIAL_SUFFIX
+
+        def remove_partial():
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+        attributes = {'coeff_padding': self.coeff_padding, 'color_titles': dict(self.color_titles)}
+        self.start_task('Сохранение изображения', export_grid,
+                        (self.grid.copy(), attributes, partial_path, export_format, SAVE_DPI, self.bw_mode.get(),
+                         self._export_view()),
+                        on_done=lambda path: os.replace(path, file_path), on_stop=remove_partial, process=True)
+
+    def _export_view(self):
+        """
+        Пределы осей приближенной области в масштабе фигуры для файла или None, если видна вся сетка.
+        Фигура окна могла быть построена для другого числа колец, а для файла радиус берется по текущему
+        """
+        from cartogram_figure import grid_limits
+        ax = self.renderer.ax
+        view = np.array([ax.get_xlim(), ax.get_ylim()])
+        if np.allclose(view, grid_limits(self.num_rings, self.radius, self.padding)):
+            return None
+        scale = base_radius(self.num_rings) / self.radius
+        return tuple(tuple(float(limit) for limit in limits) for limits in view * scale)
+
+
+def _option_value(name):
+    """Значение параметра командной строки 'name значение' или None"""
+    if name in sys.argv[:-1]:
+        return sys.argv[sys.argv.index(name) + 1]
+    return None
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()  # Процесс сохранения изображений в сборке PyInstaller
+    STARTUP.phase('импорт модулей окна')
+    root = tk.Tk()
+    profiled = _option_value('--trace-profile')
+    trace = InteractionTrace(enabled='--trace' in sys.argv or profiled is not None, profile=profiled)
+    app = HexagonChartApp(root, STARTUP, trace)
+    root.state('zoomed')
+    root.mainloop()
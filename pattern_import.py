@@ -0,0 +1,253 @@
+"""
+Импорт раскладки: цвета, номера и подписи элементов из CSV, TSV или .npy
+
+Файл читается порциями по CHUNK_ROWS строк, каждая порция записывается в
+массивы модели одной векторной операцией, поэтому память не зависит от
+размера файла. Строки с неизвестным элементом, цветом или числом
+пропускаются и попадают в отчет.
+
+Столбцы (первая строка CSV/TSV или имена полей .npy):
+    index                  - индекс элемента в модели, или
+    ring, sector, offset   - координаты элемента, или
+    ring, position         - кольцо и номер элемента в кольце (sector * ring + offset);
+    color                  - имя цвета из settings.COLORS (по-русски или matplotlib) или его номер;
+    number                 - номер элемента (0 - без номера);
+    text                   - подпись элемента.
+Пустое значение не меняет соответствующее свойство элемента.
+Для .npy без имен полей столбцы по умолчанию - index, color, number.
+"""
+
+import csv
+import os
+
+import numpy as np
+
+from hex_model import PALETTE
+from settings import COLORS
+
+
+CHUNK_ROWS = 65536
+# Сколько пропущенных строк перечислять в отчете
+MAX_MESSAGES = 20
+NPY_COLUMNS = ('index', 'color', 'number')
+# Разделители CSV, из которых выбирается разделитель файла
+DELIMITERS = ',;\t'
+DEFAULT_DELIMITER = ','
+
+COLUMN_ALIASES = {
+    'индекс': 'index', 'кольцо': 'ring', 'сектор': 'sector', 'смещение': 'offset', 'позиция': 'position',
+    'цвет': 'color', 'номер': 'number', 'текст': 'text',
+}
+KEY_COLUMNS = (('index',), ('ring', 'sector', 'offset'), ('ring', 'position'))
+VALUE_COLUMNS = ('color', 'number', 'text')
+
+# Цвет по имени (русскому или matplotlib, без учета регистра) или номеру в палитре
+COLOR_CODES = {**{label.lower(): PALETTE.index(color) for label, color in COLORS},
+               **{color.lower(): index for index, color in enumerate(PALETTE)},
+               **{str(index): index for index in range(len(PALETTE))}}
+
+
+class ImportReport:
+    """
+    Итог импорта: сколько строк прочитано и применено, причины пропуска первых строк
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.applied = 0
+        self.skipped = 0
+        self.messages = []
+
+    def skip(self, rows, reason):
+        """Пропуск строк rows (номера строк файла) по причине reason"""
+        self.skipped += len(rows)
+        for row in rows[:MAX_MESSAGES - len(self.messages)]:
+            self.messages.append(f'строка {row}: {reason}')
+
+    def summary(self):
+        lines = [f'Прочитано строк: {self.rows}, применено: {self.applied}, пропущено: {self.skipped}']
+        lines += self.messages
+        if self.skipped > len(self.messages):
+            lines.append(f'... и еще {self.skipped - len(self.messages)} пропущенных строк')
+        return '\n'.join(lines)
+
+
+def _to_int(values):
+    """(целые, маска допустимых) из строк или чисел; пустые и дробные значения недопустимы"""
+    values = np.asarray(values)
+    if values.dtype.kind in 'iub':
+        return values.astype(np.int64), np.ones(len(values), dtype=bool)
+    if values.dtype.kind == 'f':
+        valid = np.isfinite(values) & (values == np.round(values))
+        return np.where(valid, values, 0).astype(np.int64), valid
+    try:
+        # Быстрый путь: все строки - целые числа
+        return values.astype(np.int64), np.ones(len(values), dtype=bool)
+    except (ValueError, TypeError, OverflowError):
+        pass
+    result = np.zeros(len(values), dtype=np.int64)
+    valid = np.zeros(len(values), dtype=bool)
+    for position, value in enumerate(values):
+        try:
+            result[position] = int(value)
+            valid[position] = True
+        except (ValueError, TypeError):
+            pass
+    return result, valid
+
+
+def _key_columns(columns):
+    for key in KEY_COLUMNS:
+        if all(column in columns for column in key):
+            return key
+    raise ValueError('Нет столбцов элемента: нужен index, ring + sector + offset или ring + position')
+
+
+def apply_chunk(grid, chunk, first_row, report):
+    """
+    Запись порции строк в модель
+    :param chunk:     {имя столбца: массив значений} одинаковой длины
+    :param first_row: Номер первой строки порции в файле (для отчета)
+    """
+    size = len(next(iter(chunk.values())))
+    rows = first_row + np.arange(size)
+    report.rows += size
+    key = _key_columns(chunk)
+    coords = {}
+    bad = np.zeros(size, dtype=bool)
+    for column in key:
+        coords[column], valid = _to_int(chunk[column])
+        report.skip(rows[~valid & ~bad].tolist(), f'{column} не является целым числом')
+        bad |= ~valid
+
+    if key == ('index',):
+        index = coords['index']
+        index = np.where((index >= 0) & (index < len(grid)), index, -1)
+    else:
+        ring = coords['ring']
+        if key == ('ring', 'position'):
+            width = np.maximum(ring, 1)
+            position = coords['position']
+            sector, offset = position // width, position % width
+            outside = (position < 0) | (position >= 6 * width) | (ring == 0) & (position != 0)
+        else:
+            sector, offset = coords['sector'], coords['offset']
+            outside = np.zeros(size, dtype=bool)
+        index = np.where(outside, -1, grid.indices_of(ring, sector, offset))
+    report.skip(rows[~bad & (index < 0)].tolist(), 'нет такого элемента')
+    bad |= index < 0
+
+    values = {}
+    present = {}
+    if 'color' in chunk:
+        colors = np.asarray(chunk['color'])
+        if colors.dtype.kind in 'iuf':
+            # Номера цветов из .npy
+            present['color'] = np.ones(size, dtype=bool)
+            codes, valid = _to_int(colors)
+            codes = np.where(valid & (codes >= 0) & (codes < len(PALETTE)), codes, -1)
+        else:
+            names = np.char.lower(np.char.strip(colors.astype(str)))
+            present['color'] = names != ''
+            unique, inverse = np.unique(names, return_inverse=True)
+            codes = np.array([COLOR_CODES.get(name, -1) for name in unique], dtype=np.int64)[inverse]
+        unknown = present['color'] & (codes < 0) & ~bad
+        report.skip(rows[unknown].tolist(), 'неизвестный цвет')
+        bad |= unknown
+        values['color'] = codes
+    if 'number' in chunk:
+        numbers = np.asarray(chunk['number'])
+        present['number'] = np.char.strip(numbers.astype(str)) != '' if numbers.dtype.kind in 'OUS' \
+            else np.ones(size, dtype=bool)
+        values['number'], valid = _to_int(numbers)
+        wrong = present['number'] & ~valid & ~bad
+        report.skip(rows[wrong].tolist(), 'номер не является целым числом')
+        bad |= wrong
+    if 'text' in chunk:
+        texts = np.asarray(chunk['text']).astype(str)
+        present['text'] = np.char.strip(texts) != ''
+        values['text'] = texts.astype(object)
+
+    good = ~bad
+    report.applied += int(np.count_nonzero(good))
+    targets = {'color': grid.color, 'number': grid.number, 'text': grid.text}
+    for column, value in values.items():
+        mask = good & present[column]
+        targets[column][index[mask]] = value[mask]
+        if column == 'text':
+            grid.text_anchor[index[mask]] = 0
+
+
+def _sniff_delimiter(header_line):
+    """Разделитель по строке заголовка; у одного столбца его не определить - тогда запятая"""
+    try:
+        return csv.Sniffer().sniff(header_line, delimiters=DELIMITERS).delimiter
+    except csv.Error:
+        return DEFAULT_DELIMITER
+
+
+def _csv_chunks(file_path, delimiter=None, chunk_rows=CHUNK_ROWS, progress=None):
+    """Порции CSV/TSV: (номер первой строки, {столбец: список значений})"""
+    size = os.path.getsize(file_path)
+    with open(file_path, newline='', encoding='utf-8-sig') as file:
+        if delimiter is None:
+            delimiter = '\t' if file_path.lower().endswith('.tsv') else _sniff_delimiter(file.readline())
+            file.seek(0)
+        reader = csv.reader(file, delimiter=delimiter)
+        header = [COLUMN_ALIASES.get(name.strip().lower(), name.strip().lower()) for name in next(reader)]
+        columns = [position for position, name in enumerate(header) if name in VALUE_COLUMNS + ('index', 'ring',
+                                                                                                'sector', 'offset',
+                                                                                                'position')]
+        first_row = 2
+        rows = []
+        for row in reader:
+            rows.append(row)
+            if len(rows) == chunk_rows:
+                yield first_row, _columns(rows, header, columns)
+                first_row += len(rows)
+                rows = []
+                if progress:
+                    progress(file.buffer.tell(), size)
+        if rows:
+            yield first_row, _columns(rows, header, columns)
+
+
+def _columns(rows, header, columns):
+    # Короткие строки дополняются пустыми значениями
+    width = len(header)
+    rows = [row + [''] * (width - len(row)) if len(row) < width else row for row in rows]
+    return {header[position]: [row[position] for row in rows] for position in columns}
+
+
+def _npy_chunks(file_path, columns=NPY_COLUMNS, chunk_rows=CHUNK_ROWS, progress=None):
+    """Порции .npy, отображенного в память: структурный массив или двумерный массив чисел"""
+    data = np.load(file_path, mmap_mode='r', allow_pickle=False)
+    if data.dtype.names is None and data.ndim != 2:
+        raise ValueError('Ожидался структурный массив или двумерный массив (строки x столбцы)')
+    names = [COLUMN_ALIASES.get(name.lower(), name.lower()) for name in data.dtype.names] \
+        if data.dtype.names else list(columns)
+    for start in range(0, len(data), chunk_rows):
+        part = data[start:start + chunk_rows]
+        if data.dtype.names:
+            chunk = {name: np.asarray(part[field]) for name, field in zip(names, data.dtype.names)}
+        else:
+            chunk = {name: np.asarray(part[:, position]) for position, name in enumerate(names)}
+        yield start + 1, chunk
+        if progress:
+            progress(start + len(part), len(data))
+
+
+def import_pattern(grid, file_path, chunk_rows=CHUNK_ROWS, progress=None):
+    """
+    Импорт раскладки из файла в модель (изменяет grid)
+    :param progress: progress(done, total) после каждой порции, см. background
+    :return: ImportReport
+    """
+    report = ImportReport()
+    chunks = _npy_chunks(file_path, chunk_rows=chunk_rows, progress=progress) \
+        if file_path.lower().endswith('.npy') else _csv_chunks(file_path, chunk_rows=chunk_rows, progress=progress)
+    for first_row, chunk in chunks:
+        apply_chunk(grid, chunk, first_row, report)
+    # Счетчики цветов пересчитываются один раз после прямой записи в массивы
+    grid.recount()
+    return report
@@ -0,0 +1,306 @@
+"""
+Замеры времени отклика интерфейса
+"""
+
+import bisect
+import functools
+import sys
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+
+class LatencyLog:
+    """
+    Время выполнения операций по имени операции
+    """
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def record(self, name, seconds):
+        self.samples[name].append(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def last_ms(self, name):
+        """Последнее время операции name в миллисекундах или None, если ее еще не было"""
+        values = self.samples.get(name)
+        return 1000 * values[-1] if values else None
+
+    def summary(self):
+        """Количество вызовов, среднее, максимальное и последнее время в миллисекундах"""
+        return {name: {'count': len(values),
+                       'mean_ms': 1000 * sum(values) / len(values),
+                       'max_ms': 1000 * max(values),
+                       'last_ms': 1000 * values[-1]}
+                for name, values in self.samples.items() if values}
+
+
+# Верхние границы интервалов гистограмм времени, мс (последний интервал - больше последней границы)
+HISTOGRAM_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+# Сколько последних вызовов хранится для трассы
+MAX_TRACE_EVENTS = 100000
+
+
+def histogram(values_ms, bounds=HISTOGRAM_BOUNDS_MS):
+    """Количество значений в интервалах {'<=1': n, ..., '>5000': n}"""
+    counts = [0] * (len(bounds) + 1)
+    for value in values_ms:
+        counts[bisect.bisect_left(bounds, value)] += 1
+    labels = [f'<={bound}' for bound in bounds] + [f'>{bounds[-1]}']
+    return dict(zip(labels, counts))
+
+
+class InteractionTrace:
+    """
+    Время обработчиков окна по взаимодействиям пользователя (параметр --trace)
+
+    Взаимодействие - вызов обработчика верхнего уровня вместе с вложенными вызовами
+    обработчиков; для него считаются запросы draw_idle (лишние - повторные до отрисовки)
+    и отрисовки холста, в т.ч. отложенные после самого обработчика. Выключенная трасса
+    ничего не оборачивает, поэтому ничего и не стоит
+    """
+
+    def __init__(self, enabled=False, profile=None):
+        """:param profile: Имя обработчика, вызовы которого записываются cProfile"""
+        self.enabled = enabled
+        self.start = time.perf_counter()
+        self.events = deque(maxlen=MAX_TRACE_EVENTS)  # (имя, начало, длительность, глубина) в секундах
+        self.samples = defaultdict(list)  # Имя -> длительности в мс
+        self.interactions = deque(maxlen=MAX_TRACE_EVENTS)
+        self.draws = 0
+        self._depth = 0
+        self._current = None  # Взаимодействие, которому достаются запросы и отрисовки
+        self._draw_pending = False
+        self.profile_name = profile
+        self.profiler = None
+        if enabled and profile:
+            import cProfile  # pylint: disable=import-outside-toplevel
+            self.profiler = cProfile.Profile()
+        self._profiling = False
+
+    def wrap(self, owner, names):
+        """Замена методов names объекта owner замеряющими. Вызывать до того, как методы привязаны к кнопкам"""
+        if not self.enabled:
+            return
+        for name in names:
+            setattr(owner, name, self._timed(name, getattr(owner, name)))
+
+    def watch_canvas(self, canvas):
+        """Замер отрисовок холста и подсчет запросов draw_idle"""
+        if not self.enabled:
+            return
+        draw, draw_idle = canvas.draw, canvas.draw_idle
+
+        @functools.wraps(draw_idle)
+        def counted_draw_idle(*args, **kwargs):
+            interaction = self._interaction()
+            interaction['draw_idle'] += 1
+            # Запрос до отрисовки по предыдущему запросу ничего не добавляет
+            if self._draw_pending:
+                interaction['redundant_draw_idle'] += 1
+            self._draw_pending = True
+            return draw_idle(*args, **kwargs)
+
+        @functools.wraps(draw)
+        def counted_draw(*args, **kwargs):
+            self._draw_pending = False
+            self.draws += 1
+            self._interaction()['draws'] += 1
+            return self._timed('canvas_draw', draw)(*args, **kwargs)
+
+        canvas.draw_idle, canvas.draw = counted_draw_idle, counted_draw
+
+    def _interaction(self, name=None):
+        if name is not None or self._current is None:
+            self._current = {'name': name or 'idle', 'start_ms': 1000 * (time.perf_counter() - self.start),
+                             'ms': 0.0, 'draw_idle': 0, 'redundant_draw_idle': 0, 'draws': 0}
+            self.interactions.append(self._current)
+        return self._current
+
+    def _timed(self, name, method):
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            top = self._depth == 0 and name != 'canvas_draw'
+            interaction = self._interaction(name) if top else None
+            profile = self.profiler is not None and name == self.profile_name and not self._profiling
+            self._depth += 1
+            if profile:
+                self._profiling = True
+                self.profiler.enable()
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                end = time.perf_counter()
+                if profile:
+                    self.profiler.disable()
+                    self._profiling = False
+                self._depth -= 1
+                self.samples[name].append(1000 * (end - start))
+                self.events.append((name, start - self.start, end - start, self._depth))
+                if interaction is not None:
+                    interaction['ms'] = 1000 * (end - start)
+        return timed
+
+    def overlay_text(self):
+        """Одна строка для окна: последнее взаимодействие и последняя отрисовка"""
+        if not self.interactions:
+            return 'Трасса: нет данных'
+        last = self.interactions[-1]
+        draw = self.samples['canvas_draw'][-1] if self.samples['canvas_draw'] else 0
+        return (f"{last['name']}: {last['ms']:.1f} мс | отрисовка {draw:.1f} мс | "
+                f"draw_idle {last['draw_idle']} (лишних {last['redundant_draw_idle']}) | отрисовок {self.draws}")
+
+    def summary(self):
+        """Количество вызовов, среднее и наибольшее время и гистограмма по каждому обработчику"""
+        return {name: {'count': len(values), 'mean_ms': sum(values) / len(values), 'max_ms': max(values),
+                       'histogram_ms': histogram(values)}
+                for name, values in self.samples.items() if values}
+
+    def dump(self, file_path, extra=None):
+        """
+        Трасса в формате Chrome trace (chrome://tracing, Perfetto) со сводкой в otherData.
+        Записи cProfile, если были, - в file_path + '.prof' (pstats)
+        """
+        import json  # pylint: disable=import-outside-toplevel
+        events = [{'name': name, 'ph': 'X', 'ts': 1e6 * start, 'dur': 1e6 * duration, 'pid': 1, 'tid': 1,
+                   'args': {'depth': depth}} for name, start, duration, depth in self.events]
+        other = {'handlers': self.summary(), 'interactions': list(self.interactions), 'draws': self.draws}
+        other.update(extra or {})
+        with open(file_path, 'w', encoding='utf-8') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': other}, file, ensure_ascii=False)
+        if self.profiler is not None and self.profiler.getstats():
+            import pstats  # pylint: disable=import-outside-toplevel
+            pstats.Stats(self.profiler).dump_stats(file_path + '.prof')
+
+
+class StartupProfile:
+    """
+    Время этапов запуска и импорта модулей. Выключенный профиль ничего не замеряет.
+    Время считается от создания профиля, т.е. без запуска интерпретатора (и распаковки exe)
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.start = self._last = time.perf_counter()
+        self.phases = []  # (этап, длительность, время от начала) в секундах
+        self.imports = []  # (модуль, собственное время, время с вложенными импортами) в секундах
+        self._importer = None
+        if enabled:
+            self._importer = _ImportTimer(self.imports)
+            sys.meta_path.insert(0, self._importer)
+
+    def phase(self, name):
+        """Отметка конца этапа name: его длительность - время от предыдущей отметки"""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.phases.append((name, now - self._last, now - self.start))
+        self._last = now
+
+    def stop(self):
+        """Отключение замера импортов"""
+        if self._importer in sys.meta_path:
+            sys.meta_path.remove(self._importer)
+        self._importer = None
+
+    def report(self, top_imports=25):
+        """Текст отчета: этапы и самые долгие импорты"""
+        lines = [f'Запуск: {1000 * (self._last - self.start):.0f} мс', '', 'Этапы (длительность, от начала), мс:']
+        lines += [f'{1000 * seconds:8.1f} {1000 * elapsed:8.1f}  {name}' for name, seconds, elapsed in self.phases]
+        total = sum(own for _, own, _ in self.imports)
+        lines += ['', f'Импорт модулей: {len(self.imports)} модулей, {1000 * total:.0f} мс',
+                  f'Самые долгие (собственное время, с вложенными импортами), мс:']
+        lines += [f'{1000 * own:8.1f} {1000 * cumulative:8.1f}  {name}'
+                  for name, own, cumulative in sorted(self.imports, key=lambda item: -item[1])[:top_imports]]
+        return '\n'.join(lines)
+
+
+class _ImportTimer:
+    """
+    Подменяет загрузчик каждого импортируемого модуля замеряющим время выполнения модуля.
+    Для sys.meta_path достаточно метода find_spec, поэтому importlib.abc не импортируется
+    """
+
+    def __init__(self, records):
+        self.records = records
+        self.stack = []  # Время вложенных импортов по каждому выполняющемуся модулю
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if hasattr(spec.loader, 'exec_module'):
+                    spec.loader = _TimedLoader(spec.loader, self)
+                return spec
+        return None
+
+    def exec_module(self, loader, module):
+        start = time.perf_counter()
+        self.stack.append(0)
+        try:
+            loader.exec_module(module)
+        finally:
+            cumulative = time.perf_counter() - start
+            nested = self.stack.pop()
+            if self.stack:
+                self.stack[-1] += cumulative
+            self.records.append((module.__name__, cumulative - nested, cumulative))
+
+
+class _TimedLoader:
+    """Загрузчик модуля, передающий все, кроме exec_module, исходному загрузчику"""
+
+    def __init__(self, loader, timer):
+        self._loader = loader
+        self._timer = timer
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._timer.exec_module(self._loader, module)
+
+
+def peak_rss_mb():
+    """Пиковый объем памяти процесса (RSS) в МБ или None, если его не удалось узнать"""
+    if sys.platform == 'win32':
+        return _windows_peak_rss_mb()
+    import resource  # pylint: disable=import-outside-toplevel
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux возвращает килобайты, macOS - байты
+    return peak / 1024 / (1024 if sys.platform == 'darwin' else 1)
+
+
+def _windows_peak_rss_mb():
+    import ctypes  # pylint: disable=import-outside-toplevel
+
+    class ProcessMemoryCounters(ctypes.Structure):  # pylint: disable=too-few-public-methods
+        _fields_ = [('cb', ctypes.c_ulong), ('PageFaultCount', ctypes.c_ulong)] + \
+                   [(name, ctypes.c_size_t) for name in ('PeakWorkingSetSize', 'WorkingSetSize',
+                                                         'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                                                         'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage',
+                                                         'PagefileUsage', 'PeakPagefileUsage')]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    try:
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+    except (AttributeError, OSError):
+        return None
+    return counters.PeakWorkingSetSize / 1024 / 1024
@@ -0,0 +1,35 @@
+"""
+Общие настройки картограммы
+"""
+
+NUM_SIDES_HEXAGON = 6
+BASE_COLOR = 'white'
+
+# Яркость
+ALPHA = 0.6
+
+# Размер окна графика
+FIGSIZE = (16, 8)
+
+# DPI сохраняемых изображений
+SAVE_DPI = 840
+
+# Цвета
+COLORS = [('Красный', 'red'),
+          ('Желтый', 'yellow'),
+          ('Зеленый', 'green'),
+          ('Синий', 'blue'),
+          ('Оранжевый', 'orange'),
+          ('Серый', 'gray'),
+          ('Белый', 'white')]
+
+# Цвета в черно-белом режиме
+COLOR_TO_HATCH = {
+            'red': '//////',
+            'yellow': 'xxxxxx',
+            'green': '......',
+            'blue': 'oooo',
+            'orange': '-----',
+            'gray': '\\\\\\\\\\\\',
+            'white': None
+        }
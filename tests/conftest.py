@@ -0,0 +1,32 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Модули программы лежат в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hex_model import HexGridModel, PALETTE, STATE_DASHED, STATE_REMOVED  # pylint: disable=wrong-import-position
+
+REMOVED_SHARE = 0.1
+DASHED_SHARE = 0.1
+NUMBERED_SHARE = 0.3
+
+
+@pytest.fixture
+def make_grid():
+    """Картограмма со случайными цветами, удаленными и пунктирными элементами и номерами"""
+    def make(num_rings, seed=0):
+        rng = np.random.default_rng(seed)
+        grid = HexGridModel(num_rings)
+        colors = rng.integers(0, len(PALETTE), len(grid))
+        for index, color in enumerate(PALETTE):
+            grid.set_color(np.flatnonzero(colors == index), color)
+        share = rng.random(len(grid))
+        grid.set_state(np.flatnonzero(share < REMOVED_SHARE), STATE_REMOVED)
+        grid.set_state(np.flatnonzero((share >= REMOVED_SHARE) & (share < REMOVED_SHARE + DASHED_SHARE)), STATE_DASHED)
+        numbered = np.flatnonzero(rng.random(len(grid)) < NUMBERED_SHARE)
+        grid.set_number(numbered, np.arange(1, numbered.size + 1))
+        return grid
+    return make
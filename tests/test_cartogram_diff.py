@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from cartogram_diff import CartogramDiff
+from hex_model import HexGridModel, PALETTE, BASE_COLOR_INDEX, STATE_NORMAL, STATE_DASHED, STATE_REMOVED
+
+BASE = BASE_COLOR_INDEX
+# Два других цвета палитры
+FIRST, SECOND = [index for index in range(len(PALETTE)) if index != BASE][:2]
+
+
+def test_same_grid_has_no_changes(make_grid):
+    grid = make_grid(6)
+    diff = CartogramDiff(grid, grid.copy())
+    assert not diff.cells().size
+    assert set(diff.counts().values()) == {0}
+    assert diff.transition_lines() == []
+    # Все видимые элементы остались своего цвета
+    assert diff.transitions.trace() == np.count_nonzero(grid.visible())
+
+
+def test_changes_by_kind():
+    old = HexGridModel(4)
+    old.set_state(9, STATE_REMOVED)
+    new = old.copy()
+    new.set_color([1, 2], PALETTE[FIRST])
+    new.set_color(3, PALETTE[SECOND])
+    new.set_number(4, 5)
+    new.set_text(5, 'подпись')
+    new.set_state(6, STATE_DASHED)
+    new.set_state(7, STATE_REMOVED)
+    new.set_state(9, STATE_NORMAL)
+    # Цвет удаленного элемента не считается переходом цвета
+    new.set_color(7, PALETTE[SECOND])
+
+    diff = CartogramDiff(old, new)
+    assert diff.cells().tolist() == [1, 2, 3, 4, 5, 6, 7, 9]
+    assert diff.counts() == {'changed': 8, 'color': 3, 'number': 1, 'text': 1, 'state': 3, 'removed': 1,
+                             'restored': 1}
+    assert diff.transitions[BASE, FIRST] == 2 and diff.transitions[BASE, SECOND] == 1
+    assert diff.transition_lines({PALETTE[FIRST]: 'первый'}) == [
+        f'{PALETTE[BASE]} -> {PALETTE[FIRST]} (первый): 2', f'{PALETTE[BASE]} -> {PALETTE[SECOND]}: 1']
+    assert len(diff.cell_lines()) == 8
+
+
+def test_moved_text_anchor_is_a_change():
+    old = HexGridModel(3)
+    old.set_text(2, 'подпись', (0, 0))
+    new = old.copy()
+    new.set_text(2, 'подпись', (0.5, 0))
+    assert CartogramDiff(old, new).cells().tolist() == [2]
+
+
+def test_transition_lines_limit():
+    old = HexGridModel(5)
+    new = old.copy()
+    for index, color in enumerate(PALETTE):
+        new.set_color(index, color)
+    lines = CartogramDiff(old, new).transition_lines(limit=2)
+    assert len(lines) == 3 and lines[-1].startswith('... и еще')
+
+
+@pytest.mark.parametrize('other', [HexGridModel(5), HexGridModel(4, remove_corners=True)])
+def test_size_mismatch(other):
+    with pytest.raises(ValueError):
+        CartogramDiff(HexGridModel(4), other)
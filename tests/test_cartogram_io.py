@@ -0,0 +1,84 @@
+import pickle
+
+import numpy as np
+import pytest
+from matplotlib.patches import Polygon
+from matplotlib.text import Annotation, Text
+
+from cartogram_io import save_cartogram, load_cartogram, grid_from_legacy, convert_legacy, FORMAT_VERSION
+from hex_geometry import hex_grid_geometry
+from hex_model import HexGridModel, PALETTE, STATE_DASHED, STATE_REMOVED
+from settings import COLOR_TO_HATCH
+
+ARRAYS = ('color', 'state', 'number', 'text', 'text_anchor')
+
+
+def _assert_same(grid, other, anchor_tolerance=0):
+    assert (grid.num_rings, grid.remove_corners) == (other.num_rings, other.remove_corners)
+    for name in ARRAYS[:-1]:
+        assert np.array_equal(getattr(grid, name), getattr(other, name)), name
+    assert np.allclose(grid.text_anchor, other.text_anchor, rtol=0, atol=anchor_tolerance)
+    assert np.array_equal(grid.count_by_color(), other.count_by_color())
+
+
+@pytest.mark.parametrize('remove_corners', [False, True])
+def test_save_load_round_trip(tmp_path, make_grid, remove_corners):
+    grid = make_grid(7)
+    grid.resize(7, remove_corners)
+    grid.set_text(2, 'подпись', (0.25, -0.5))
+    # Пустая подпись отличается от ее отсутствия
+    grid.set_text(5, '')
+    titles = {PALETTE[1]: 'первый', PALETTE[2]: ''}
+    save_cartogram(tmp_path / 'grid.npz', grid, 0.3, titles, PALETTE[2])
+
+    loaded, attributes = load_cartogram(tmp_path / 'grid.npz')
+    _assert_same(grid, loaded)
+    assert attributes == {'coeff_padding': 0.3, 'color_titles': titles, 'selected_color': PALETTE[2]}
+
+
+def test_newer_format_rejected(tmp_path):
+    save_cartogram(tmp_path / 'grid.npz', HexGridModel(2), 0.1)
+    with np.load(tmp_path / 'grid.npz') as data:
+        arrays = dict(data)
+    arrays['version'] = np.int32(FORMAT_VERSION + 1)
+    np.savez(tmp_path / 'newer.npz', **arrays)
+    with pytest.raises(ValueError):
+        load_cartogram(tmp_path / 'newer.npz')
+
+
+def test_convert_pickled_model(tmp_path, make_grid):
+    grid = make_grid(5)
+    grid.set_text(0, 'центр', (1, 0))
+    with open(tmp_path / 'old.pkl', 'wb') as file:
+        pickle.dump({'grid': grid, 'coeff_padding': 0.2, 'color_titles': {PALETTE[0]: 'база'}}, file)
+
+    loaded, attributes = load_cartogram(convert_legacy(str(tmp_path / 'old.pkl')))
+    _assert_same(grid, loaded)
+    assert attributes['coeff_padding'] == 0.2
+    assert attributes['color_titles'] == {PALETTE[0]: 'база'}
+
+
+def test_grid_from_polygons():
+    # Старый формат: объекты Polygon в порядке модели и словари по ним
+    num_rings = 3
+    expected = HexGridModel(num_rings)
+    centers, vertices = hex_grid_geometry(num_rings, 1.0, 0.1)
+    patches = [Polygon(points, facecolor='white') for points in vertices]
+    hatched = next(color for color, hatch in COLOR_TO_HATCH.items() if hatch and color in PALETTE)
+    patches[1].set_hatch(COLOR_TO_HATCH[hatched])
+    expected.set_color(1, hatched)
+    color_map = {patches[2]: PALETTE[3]}
+    expected.set_color(2, PALETTE[3])
+    expected.set_state(3, STATE_REMOVED)
+    patches[4].set_linestyle('--')
+    expected.set_state(4, STATE_DASHED)
+    numbers = {patches[5]: Text(*centers[5], ' 12 ')}
+    expected.set_number(5, 12)
+    texts = {patches[6]: Annotation('подпись', xy=centers[6] + (0.5, 0))}
+    expected.set_text(6, 'подпись', (0.5, 0))
+
+    grid = grid_from_legacy({'num_rings': num_rings, 'remove_corners': False, 'hexagon_patches': patches,
+                             'color_map': color_map, 'removed_hexagons': {patches[3]},
+                             'hexagon_numbers': numbers, 'hexagon_texts': texts})
+    # Якорь подписи восстанавливается по вершинам многоугольника
+    _assert_same(expected, grid, anchor_tolerance=1e-6)
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from matplotlib.patches import Polygon
+from matplotlib.path import Path
+
+from hex_geometry import HexHitIndex, hex_grid_geometry
+
+RADIUS = 1.0
+
+
+def _brute_force(x, y, centers, vertices):
+    """Элемент под точкой перебором всех шестигранников: при перекрытии - с ближайшим центром"""
+    inside = [index for index in range(len(vertices)) if Path(vertices[index]).contains_point((x, y))]
+    if not inside:
+        return None
+    return min(inside, key=lambda index: np.hypot(*(centers[index] - (x, y))))
+
+
+def _polygon_closest_edge(hexagon, point):
+    """Прежний перебор граней matplotlib Polygon"""
+    x, y = point
+    vertices = hexagon.get_xy()
+    min_dist, closest = float('inf'), (0, 0)
+    for i in range(6):
+        (x1, y1), (x2, y2) = vertices[i], vertices[(i + 1) % 6]
+        mx, my = (x1 + x2) / 2, (y1 + y2) / 2
+        dist = np.sqrt((x - mx) ** 2 + (y - my) ** 2)
+        if dist < min_dist:
+            min_dist, closest = dist, (mx, my)
+    return closest
+
+
+@pytest.mark.parametrize('num_rings, coeff_padding, remove_corners',
+                         [(1, 0.1, False), (4, 0.1, False), (5, 0.3, True), (6, 0, False)])
+def test_find_matches_brute_force(num_rings, coeff_padding, remove_corners):
+    padding = RADIUS * coeff_padding
+    centers, vertices = hex_grid_geometry(num_rings, RADIUS, padding, remove_corners)
+    index = HexHitIndex(num_rings, RADIUS, padding, remove_corners)
+
+    rng = np.random.default_rng(num_rings)
+    extent = np.abs(vertices).max() * 1.1
+    for x, y in rng.uniform(-extent, extent, (500, 2)):
+        assert index.find(x, y) == _brute_force(x, y, centers, vertices)
+
+
+def test_find_centers():
+    centers, _ = hex_grid_geometry(7, RADIUS, RADIUS * 0.1, True)
+    index = HexHitIndex(7, RADIUS, RADIUS * 0.1, True)
+    assert [index.find(x, y) for x, y in centers] == list(range(len(centers)))
+
+
+def test_closest_edge_matches_polygon():
+    num_rings, padding = 5, RADIUS * 0.2
+    centers, vertices = hex_grid_geometry(num_rings, RADIUS, padding)
+    index = HexHitIndex(num_rings, RADIUS, padding)
+    for cell in range(len(centers)):
+        assert np.allclose(index.vertices(cell), vertices[cell])
+
+    rng = np.random.default_rng(0)
+    cells = rng.integers(0, len(centers), 300)
+    points = centers[cells] + rng.uniform(-0.8, 0.8, (300, 2)) * RADIUS
+    for cell, (x, y) in zip(cells, points):
+        found, midpoint = index.closest_edge(x, y)
+        if found is None:
+            continue
+        assert found == cell
+        assert np.allclose(midpoint, _polygon_closest_edge(Polygon(vertices[cell]), (x, y)))
+    assert index.closest_edge(*(np.abs(vertices).max(axis=(0, 1)) * 2)) == (None, None)
@@ -0,0 +1,62 @@
+import numpy as np
+
+from hex_model import HexGridModel, PALETTE, STATE_DASHED, STATE_REMOVED, cell_count
+
+ARRAYS = ('color', 'state', 'number', 'text', 'text_anchor')
+
+
+def test_index_of_matches_keys():
+    grid = HexGridModel(6, remove_corners=True)
+    assert len(grid) == cell_count(6) - 6
+    indices = grid.indices_of(grid.ring, grid.sector, grid.offset)
+    assert np.array_equal(indices, np.arange(len(grid)))
+    assert [grid.index_of(r, s, o) for r, s, o in zip(grid.ring, grid.sector, grid.offset)] == list(range(len(grid)))
+    # Угол удален, за пределами сетки - нет элемента
+    assert grid.index_of(5, 0, 0) == -1
+    assert grid.index_of(6, 0, 0) == -1
+
+
+def test_count_by_color(make_grid):
+    grid = make_grid(8)
+    visible = grid.visible()
+    assert np.array_equal(grid.count_by_color(), [np.count_nonzero(grid.color[visible] == index)
+                                                  for index in range(len(PALETTE))])
+
+
+def test_color_counts_follow_edits(make_grid):
+    grid = make_grid(8)
+    rng = np.random.default_rng(1)
+    for _ in range(200):
+        index = rng.integers(0, len(grid), rng.integers(1, 5))
+        if rng.random() < 0.5:
+            grid.set_color(index, PALETTE[rng.integers(len(PALETTE))])
+        else:
+            grid.set_state(index, rng.choice([0, STATE_DASHED, STATE_REMOVED]))
+    counts = grid.count_by_color().copy()
+    grid.recount()
+    assert np.array_equal(counts, grid.count_by_color())
+
+
+def test_resize_keeps_common_cells(make_grid):
+    grid = make_grid(6)
+    grid.set_text(3, 'подпись', (0.5, -0.5))
+    old = {name: getattr(grid, name).copy() for name in ARRAYS}
+    keys = list(zip(grid.ring, grid.sector, grid.offset))
+    grid.resize(9)
+    moved = [grid.index_of(*key) for key in keys]
+    for name in ARRAYS:
+        assert np.array_equal(getattr(grid, name)[moved], old[name])
+    grid.resize(6)
+    for name in ARRAYS:
+        assert np.array_equal(getattr(grid, name), old[name])
+
+
+def test_copy_is_independent(make_grid):
+    grid = make_grid(4)
+    color, number, counts = grid.color.copy(), grid.number.copy(), grid.count_by_color().copy()
+    copy = grid.copy()
+    copy.set_color(np.arange(len(copy)), PALETTE[1])
+    copy.set_number(1, 99)
+    assert np.array_equal(grid.color, color)
+    assert np.array_equal(grid.number, number)
+    assert np.array_equal(grid.count_by_color(), counts)
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from hex_geometry import hex_grid_geometry, lattice_coords
+from hex_model import HexGridModel, PALETTE
+from hex_symmetry import SYMMETRY_MODES, symmetry_table, symmetric_cells, asymmetric_cells
+
+
+@pytest.mark.parametrize('remove_corners', [False, True])
+def test_tables_match_lattice(remove_corners):
+    num_rings = 6
+    grid = HexGridModel(num_rings, remove_corners)
+    coords = lattice_coords(grid.ring, grid.sector, grid.offset)
+    table = symmetry_table(num_rings, remove_corners, '1/6')
+    for row in table:
+        assert np.array_equal(np.sort(row), np.arange(len(grid)))
+    # Поворот на 60 градусов в координатах решетки: (a, b) -> (-b, a + b)
+    rotated = coords
+    for row in table:
+        assert np.array_equal(coords[row], rotated)
+        rotated = np.column_stack((-rotated[:, 1], rotated[:, 0] + rotated[:, 1]))
+    assert np.array_equal(rotated, coords)
+
+    # Отражение слева направо на рисунке
+    centers, _ = hex_grid_geometry(num_rings, 1.0, 0.2, remove_corners)
+    mirror = symmetry_table(num_rings, remove_corners, 'mirror')[1]
+    assert np.allclose(centers[mirror], centers * (-1, 1))
+
+
+@pytest.mark.parametrize('mode', list(SYMMETRY_MODES))
+def test_symmetric_edit_is_symmetric(mode):
+    grid = HexGridModel(7, remove_corners=True)
+    table = symmetry_table(grid.num_rings, grid.remove_corners, mode)
+    grid.set_color(symmetric_cells(table, [3, 40, 100]), PALETTE[1])
+    assert not asymmetric_cells(grid, mode).size
+    grid.set_color(40, PALETTE[2])
+    assert 40 in asymmetric_cells(grid, mode)
@@ -0,0 +1,52 @@
+import tkinter as tk
+
+import pytest
+from matplotlib.backend_bases import MouseEvent
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from chart_view import build_chart
+from hex_model import PALETTE, BASE_COLOR_INDEX
+from hex_render import CellBlitter
+from main_v11 import HexagonChartApp, CLICK_LATENCY, SYMMETRY_OPTIONS
+
+# Цвет палитры, отличный от исходного
+COLOR = next(color for index, color in enumerate(PALETTE) if index != BASE_COLOR_INDEX)
+
+
+@pytest.fixture
+def app():
+    """Окно программы без дисплея: интерпретатор Tcl для переменных и холст Agg вместо Tk"""
+    app = HexagonChartApp.__new__(HexagonChartApp)
+    app.root = tk.Tcl()
+    app.initialize_attributes()
+    app.symmetry_var = tk.StringVar(app.root, next(iter(SYMMETRY_OPTIONS)))
+    app.num_rings = 4
+    app.grid.resize(app.num_rings)
+    app.set_chart(build_chart(app.grid, app.coeff_padding))
+    app.canvas = FigureCanvasAgg(app.fig)
+    app.blitter = CellBlitter(app.canvas, app.renderer)
+    app.update_legend(draw=False)
+    app.canvas.draw()
+    return app
+
+
+def click(app, x, y):
+    """Нажатие левой кнопкой в точке (x, y) координат осей"""
+    ax = app.renderer.ax
+    app.on_click(MouseEvent('button_press_event', app.canvas, *ax.transData.transform((x, y)), button=1))
+
+
+def test_click_records_one_latency_entry(app):
+    app.editing_color = True
+    app.selected_color = COLOR
+    index = 0
+    click(app, *app.renderer.centers[index])
+    assert len(app.latency.samples[CLICK_LATENCY]) == 1
+    assert app.latency.last_ms(CLICK_LATENCY) is not None
+    assert PALETTE[app.grid.color[index]] == COLOR
+
+
+def test_click_outside_grid_is_not_timed(app):
+    app.editing_color = True
+    click(app, *app.renderer.ax.get_xlim()[:1], 0)
+    assert app.latency.last_ms(CLICK_LATENCY) is None
@@ -0,0 +1,45 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from hex_geometry import hex_grid_geometry
+from hex_model import HexGridModel
+from hex_render import text_anchors, text_positions
+from pattern_import import import_pattern
+
+
+def test_single_column_csv(tmp_path):
+    # Разделитель одного столбца не определить - берется запятая
+    path = tmp_path / 'pattern.csv'
+    path.write_text('index\n0\n1\n', encoding='utf-8')
+    assert import_pattern(HexGridModel(3), str(path)).rows == 2
+    # Без столбцов элемента - понятная ошибка, а не csv.Error
+    path.write_text('color\nred\n', encoding='utf-8')
+    with pytest.raises(ValueError, match='Нет столбцов элемента'):
+        import_pattern(HexGridModel(3), str(path))
+
+
+def test_semicolon_csv(tmp_path):
+    path = tmp_path / 'pattern.csv'
+    path.write_text('ring;sector;offset;number\n1;0;0;7\n2;1;1;8\n', encoding='utf-8')
+    grid = HexGridModel(3)
+    report = import_pattern(grid, str(path))
+    assert report.applied == 2
+    assert grid.number[grid.index_of(1, 0, 0)] == 7
+    assert grid.number[grid.index_of(2, 1, 1)] == 8
+
+
+def test_center_text_position(tmp_path):
+    # Подпись центрального элемента импортируется без смещения - точка стрелки в центре сетки
+    path = tmp_path / 'pattern.csv'
+    path.write_text('ring,sector,offset,text\n0,0,0,центр\n1,2,0,сосед\n', encoding='utf-8')
+    grid = HexGridModel(3)
+    assert import_pattern(grid, str(path)).applied == 2
+    index = [grid.index_of(0, 0, 0), grid.index_of(1, 2, 0)]
+    centers, _ = hex_grid_geometry(grid.num_rings, 1.0, 0.1)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        positions = text_positions(text_anchors(centers[index], grid.text_anchor[index], 1.0), grid.num_rings, 1.0, 0.1)
+    assert np.isfinite(positions).all()
+    assert np.all(np.linalg.norm(positions, axis=1) > 0)
@@ -0,0 +1,97 @@
+import io
+
+import numpy as np
+import pytest
+from matplotlib.figure import Figure
+from matplotlib.patches import Rectangle
+from PIL import Image
+
+import tiled_export
+from cartogram_figure import cartogram_figure
+from hex_model import STATE_DASHED
+from tiled_export import render_strips, save_png_tiled
+
+COEFF_PADDING = 0.1
+HATCHES = ('//////', 'xxxxxx', '......', 'oooo', '-----', '\\\\\\', '+', 'O', '*')
+# Доля пикселей, которые могут отличаться от savefig: сглаживание наклонных контуров на краях плиток
+# и концы линий ровно на середине пикселя (см. tiled_export)
+MAX_DIFFERENT_SHARE = 1e-3
+
+
+def _figure(make_grid, num_rings, bw_mode=False):
+    grid = make_grid(num_rings, seed=3)
+    grid.state[::7] = STATE_DASHED
+    grid.set_text(1, 'подпись', (1, 0))
+    grid.recount()
+    return cartogram_figure(grid, COEFF_PADDING, bw_mode=bw_mode)
+
+
+def _patterns_figure():
+    """Штриховки и пунктиры без наклонных контуров: плитки должны совпадать с savefig точно"""
+    fig = Figure(figsize=(len(HATCHES), 2))
+    axes = fig.add_axes((0, 0, 1, 1))
+    axes.set_axis_off()
+    axes.set_xlim(0, len(HATCHES))
+    axes.set_ylim(0, 2)
+    for column, hatch in enumerate(HATCHES):
+        axes.add_patch(Rectangle((column + 0.1, 1.1), 0.8, 0.8, facecolor='white', hatch=hatch))
+        axes.add_patch(Rectangle((column + 0.1, 0.1), 0.8, 0.8, fill=False, linestyle=(0, (3, 2, 1, 2))))
+    axes.axhline(1, linestyle=':')
+    return fig
+
+
+def _strips(fig, dpi, *tile_size):
+    return np.concatenate([strip.copy() for strip in render_strips(fig, dpi, *tile_size)])
+
+
+def _assert_close(tiled, full):
+    assert tiled.shape == full.shape
+    different = (tiled != full).any(axis=-1)
+    assert np.count_nonzero(different) <= MAX_DIFFERENT_SHARE * different.size
+
+
+def _full(fig, dpi):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='rgba', dpi=dpi)
+    width, height = (int(round(size * dpi)) for size in fig.get_size_inches())
+    return np.frombuffer(buffer.getvalue(), dtype=np.uint8).reshape(height, width, 4)
+
+
+@pytest.mark.parametrize('num_rings, dpi, bw_mode', [(2, 100, False), (12, 100, False), (12, 150, False),
+                                                     (6, 137, True)])
+def test_strips_match_savefig(make_grid, num_rings, dpi, bw_mode):
+    # Пунктирные контуры и штриховка пересекают границы плиток
+    full = _full(_figure(make_grid, num_rings, bw_mode), dpi)
+    _assert_close(_strips(_figure(make_grid, num_rings, bw_mode), dpi, 150, 250), full)
+
+
+@pytest.mark.parametrize('dpi', [100, 137, 72.5])
+def test_hatch_and_dash_phase(dpi):
+    # Плитки не кратны квадрату штриховки и периоду пунктира
+    assert np.array_equal(_strips(_patterns_figure(), dpi, 53, 97), _full(_patterns_figure(), dpi))
+
+
+def test_canvas_does_not_grow_with_dpi(monkeypatch, make_grid):
+    sizes = []
+
+    class Renderer(tiled_export._TileRenderer):  # pylint: disable=protected-access
+        def __init__(self, width, height, dpi):
+            super().__init__(width, height, dpi)
+            sizes.append((width, height))
+
+    monkeypatch.setattr(tiled_export, '_TileRenderer', Renderer)
+    peaks = []
+    for dpi in (50, 200):
+        sizes.clear()
+        for _ in render_strips(_figure(make_grid, 2), dpi, 64, 128):
+            pass
+        peaks.append(max(width * height for width, height in sizes))
+    assert peaks == [64 * 128, 64 * 128]
+
+
+def test_png_matches_savefig(tmp_path, make_grid):
+    fig = _figure(make_grid, 6)
+    save_png_tiled(fig, tmp_path / 'tiled.png', 100)
+    with Image.open(tmp_path / 'tiled.png') as image:
+        assert image.info['dpi'] == pytest.approx((100, 100), abs=0.01)
+        _assert_close(np.asarray(image.convert('RGBA')), _full(fig, 100))
@@ -0,0 +1,309 @@
+"""
+Экспорт PNG полосами с ограниченной памятью
+
+Фигура рисуется плитками постоянного размера в пикселях во временный холст Agg.
+Плитки одного ряда собираются в полосу, и полоса сразу сжимается и дописывается
+в файл PNG. В памяти одновременно находятся холст плитки и одна полоса, а не весь
+растр (при 840 DPI и фигуре 16x8 дюймов это 13440x6720 пикселей, около 360 МБ).
+Холст плитки не растет с разрешением, полоса растет только по ширине.
+
+Плитки совпадают с fig.savefig попиксельно, кроме сглаживания на краях плиток:
+- штриховка Agg - квадрат int(dpi) пикселей, отсчитанный от левого верхнего угла
+  холста, поэтому плитка получает тот же узор, сдвинутый на свое положение в изображении;
+- контур без заливки Agg обрезает по краю холста: концы обрезанного отрезка округляются
+  иначе, а пунктир начинается заново от точки обреза, поэтому контуры без заливки
+  рисуются с невидимой заливкой, с которой Agg их не обрезает;
+- наклонный контур, пересекающий край плитки, Agg все равно режет по холсту (так устроен
+  растеризатор), и сглаживание вдоль такого контура может отличаться на единицы;
+- сдвиг плитки входит в преобразование координат, и конец линии ровно на середине пикселя
+  после округления может привязаться к соседнему пикселю.
+"""
+
+from functools import lru_cache
+import struct
+import zlib
+
+import numpy as np
+from matplotlib.backend_bases import GraphicsContextBase
+from matplotlib.backends.backend_agg import RendererAgg
+from matplotlib.path import Path
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# Размер плитки в пикселях: холст Agg 512x2048 RGBA - 4 МБ при любом разрешении
+TILE_ROWS = 512
+TILE_COLUMNS = 2048
+# Запас вокруг квадрата штриховки в его долях: толщина линий и фигур узора
+HATCH_MARGIN = 0.1
+# Сдвиги копий фигур узора на целые квадраты
+HATCH_COPIES = np.array([(i, j) for i in range(-2, 3) for j in range(-2, 3)], dtype=float)
+# Точность ключа при поиске повторов узора на соседних квадратах
+HATCH_KEY_SCALE = 10 ** 6
+# Заливка, с которой Agg не обрезает контур: альфа не нулевая, но в 8 битах округляется до нуля
+INVISIBLE_FACE = (0.0, 0.0, 0.0, 1e-6)
+
+
+class PngStripWriter:
+    """
+    Потоковая запись RGBA PNG: строки изображения дописываются полосами
+    """
+
+    def __init__(self, file, width, height, dpi=None, level=6):
+        """
+        :param file:   Открытый двоичный файл
+        :param width:  Ширина изображения в пикселях
+        :param height: Высота изображения в пикселях
+        :param dpi:    Разрешение для заголовка pHYs
+        :param level:  Степень сжатия zlib
+        """
+        self.file = file
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self._compressor = zlib.compressobj(level)
+
+        file.write(PNG_SIGNATURE)
+        # 8 бит на канал, тип цвета 6 - RGBA
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+        if dpi:
+            pixels_per_meter = int(round(dpi / 0.0254))
+            self._chunk(b'pHYs', struct.pack('>IIB', pixels_per_meter, pixels_per_meter, 1))
+
+    def _chunk(self, kind, data):
+        self.file.write(struct.pack('>I', len(data)) + kind + data)
+        self.file.write(struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+    def write(self, rows):
+        """Следующие строки изображения, массив (h, width, 4) uint8"""
+        if rows.shape[1:] != (self.width, 4):
+            raise ValueError(f'Ожидалась полоса шириной {self.width} пикселей RGBA, получено {rows.shape}')
+        if self.rows_written + len(rows) > self.height:
+            raise ValueError('Строк больше, чем высота изображения')
+
+        # Фильтр Sub: разность с соседним пикселем слева хорошо сжимается на заливках
+        filtered = np.empty((len(rows), self.width * 4 + 1), dtype=np.uint8)
+        filtered[:, 0] = 1
+        flat = rows.reshape(len(rows), -1)
+        filtered[:, 1:5] = flat[:, :4]
+        np.subtract(flat[:, 4:], flat[:, :-4], out=filtered[:, 5:])
+
+        data = self._compressor.compress(filtered.tobytes())
+        if data:
+            self._chunk(b'IDAT', data)
+        self.rows_written += len(rows)
+
+    def close(self):
+        if self.rows_written != self.height:
+            raise ValueError(f'Записано {self.rows_written} строк из {self.height}')
+        self._chunk(b'IDAT', self._compressor.flush())
+        self._chunk(b'IEND', b'')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+
+
+@lru_cache(maxsize=16)
+def _hatch_pattern(hatch, density):
+    """
+    Path.hatch как периодический узор: прямые и фигуры без повторов на соседних квадратах
+    :return: (lines, shapes): lines - [(направление, нормаль, начало отрезка)],
+             shapes - [(коды пути фигуры, опорные точки (M, 2) в [0, 1), вершины (M, K, 2) от опорной точки)]
+    """
+    path = Path.hatch(hatch, density)
+    starts = np.flatnonzero(path.codes == Path.MOVETO).tolist() + [len(path.codes)]
+    lines, shapes = {}, {}
+    for start, end in zip(starts[:-1], starts[1:]):
+        part, codes = path.vertices[start:end], path.codes[start:end]
+        if end - start == 2 and codes[1] == Path.LINETO:
+            # Направления отрезков штриховки целочисленные, поэтому сдвиг на целый квадрат
+            # меняет положение прямой вдоль нормали на целое число
+            direction = part[1] - part[0]
+            normal = np.array((-direction[1], direction[0]))
+            key = tuple(np.round(direction, 6)), round(float(normal @ part[0]) * HATCH_KEY_SCALE) % HATCH_KEY_SCALE
+            lines.setdefault(key, (direction, normal, part[0]))
+        else:
+            key = tuple(codes), tuple(np.round(part[0] * HATCH_KEY_SCALE).astype(np.int64) % HATCH_KEY_SCALE)
+            shapes.setdefault(key, (codes, part[0] % 1, part - part[0]))
+
+    grouped = {}
+    for codes, anchor, relative in shapes.values():
+        grouped.setdefault(tuple(codes), []).append((anchor, relative))
+    return list(lines.values()), [(np.array(codes, dtype=Path.code_type),
+                                   np.array([anchor for anchor, _ in group]),
+                                   np.array([relative for _, relative in group]))
+                                  for codes, group in grouped.items()]
+
+
+@lru_cache(maxsize=64)
+def _shifted_hatch(hatch, density, size, dx, dy):
+    """
+    Путь штриховки единичного квадрата, узор которой сдвинут на (dx, dy) пикселей
+    :param size: Сторона квадрата штриховки в пикселях
+    """
+    lines, shapes = _hatch_pattern(hatch, density)
+    shift = np.array((dx, dy)) / size
+    vertices, codes = [], []
+    low, high = -HATCH_MARGIN, 1 + HATCH_MARGIN
+    corners = np.array([(low, low), (high, low), (low, high), (high, high)])
+    for direction, normal, point in lines:
+        # Прямые класса - сдвиги отрезка point + [0, 1] * direction на целые векторы k, номер прямой - normal @ k.
+        # Концы отрезков сдвинуты от исходных на целое число пикселей, иначе Agg округляет их по-другому
+        step = next(np.array(k) for k in HATCH_COPIES if normal @ k == 1)
+        origin = point + shift
+        reach = corners @ normal - normal @ origin
+        numbers = np.arange(np.floor(reach.min()), np.ceil(reach.max()) + 1)
+        starts = origin + numbers[:, None] * step
+        # Часть прямой внутри квадрата с запасом по осям, вдоль которых прямая идет, с концами в целых пикселях
+        moving = direction != 0
+        bounds = np.sort((np.array((low, high))[:, None, None] - starts[:, moving]) / direction[moving], axis=0)
+        first, last = np.floor(bounds[0].max(axis=1) * size) / size, np.ceil(bounds[1].min(axis=1) * size) / size
+        crossing = first < last
+        ends = np.stack((first, last), axis=1)[crossing, :, None] * direction + starts[crossing, None]
+        vertices.append(ends.reshape(-1, 2))
+        codes.append(np.tile([Path.MOVETO, Path.LINETO], np.count_nonzero(crossing)))
+    for shape_codes, anchors, relative in shapes:
+        # Копии фигур на соседних квадратах, задевающие квадрат с запасом
+        origins = (anchors + shift) % 1 + HATCH_COPIES[:, None]
+        inside = ((origins + relative.max(axis=1) > low) & (origins + relative.min(axis=1) < high)).all(axis=-1)
+        copies, shapes_inside = np.nonzero(inside)
+        vertices.append((relative[shapes_inside] + origins[copies, shapes_inside][:, None]).reshape(-1, 2))
+        codes.append(np.tile(shape_codes, len(copies)))
+    return Path(np.concatenate(vertices), np.concatenate(codes).astype(Path.code_type))
+
+
+class _TileGraphicsContext(GraphicsContextBase):
+    """Контекст рисования плитки: штриховка сдвинута на положение плитки в изображении"""
+
+    def __init__(self, hatch_shift):
+        """:param hatch_shift: (сторона квадрата штриховки, сдвиг узора по x, по y) в пикселях"""
+        super().__init__()
+        self.hatch_shift = hatch_shift
+
+    def get_hatch_path(self, density=6.0):
+        hatch = self.get_hatch()
+        if hatch is None:
+            return None
+        return _shifted_hatch(hatch, density, *self.hatch_shift)
+
+
+def _unclipped(gc):
+    """Можно ли дать контуру без заливки INVISIBLE_FACE, чтобы Agg не обрезал его по краю холста"""
+    return gc.get_hatch() is None and not gc.get_forced_alpha()
+
+
+class _TileRenderer(RendererAgg):
+    """
+    Холст Agg одной плитки изображения
+    """
+
+    def __init__(self, width, height, dpi):
+        super().__init__(width, height, dpi)
+        # RendererAgg кладет метод Agg в экземпляр, а нужен draw_path_collection этого класса
+        del self.draw_path_collection
+        self.hatch_shift = (int(dpi), 0, 0)
+
+    def move(self, left, top):
+        """Очистка холста под плитку с левым верхним углом (left, top) в пикселях изображения"""
+        size = int(self.dpi)
+        # Узор сдвигается на положение плитки; ось y квадрата штриховки направлена вверх
+        self.hatch_shift = (size, -left % size, top % size)
+        self.clear()
+
+    def new_gc(self):
+        return _TileGraphicsContext(self.hatch_shift)
+
+    def draw_path(self, gc, path, transform, rgbFace=None):
+        # С заливкой Agg и не упрощает путь, поэтому длинные пути, которые упрощаются, остаются как есть
+        if rgbFace is None and not path.should_simplify and _unclipped(gc):
+            rgbFace = INVISIBLE_FACE
+        super().draw_path(gc, path, transform, rgbFace)
+
+    def draw_path_collection(self, gc, master_transform, paths, all_transforms, offsets, offset_trans,
+                             facecolors, edgecolors, linewidths, linestyles, antialiaseds, urls,
+                             offset_position, **kwargs):
+        properties = [facecolors, edgecolors, linewidths, linestyles, antialiaseds, urls]
+        if 'hatchcolors' in kwargs:
+            properties.append(kwargs['hatchcolors'])
+        if len(paths) and not len(all_transforms) and len(offsets) <= 1:
+            # Пути, которые не задевают плитку, не передаются в Agg (с одним смещением оно общее для всех)
+            shift = offset_trans.transform(offsets[0]) if len(offsets) else (0, 0)
+            visible = self._visible(master_transform, paths, shift, max(linewidths, default=0))
+            paths = [paths[index] for index in visible]
+            properties = [[values[index % len(values)] for index in visible] if len(values) else values
+                          for values in properties]
+            if not paths:
+                return
+        facecolors, edgecolors, linewidths, linestyles, antialiaseds, urls = properties[:6]
+        if 'hatchcolors' in kwargs:
+            kwargs['hatchcolors'] = properties[6]
+        if not len(facecolors) and _unclipped(gc):
+            facecolors = np.array([INVISIBLE_FACE])
+        self._renderer.draw_path_collection(gc, master_transform, paths, all_transforms, offsets, offset_trans,
+                                            facecolors, edgecolors, linewidths, linestyles, antialiaseds, urls,
+                                            offset_position, **kwargs)
+
+    def _visible(self, transform, paths, shift, linewidth):
+        """Индексы путей, рамка которых со сдвигом shift в пикселях и толщиной линии задевает холст"""
+        sizes = np.array([len(path.vertices) for path in paths])
+        points = transform.transform(np.concatenate([path.vertices for path in paths])) + shift
+        starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+        low = np.fmin.reduceat(points, starts)
+        high = np.fmax.reduceat(points, starts)
+        pad = self.points_to_pixels(linewidth) + 2
+        return np.flatnonzero((sizes > 0) & (high[:, 0] >= -pad) & (low[:, 0] <= self.width + pad)
+                              & (high[:, 1] >= -pad) & (low[:, 1] <= self.height + pad))
+
+
+def render_strips(fig, dpi, tile_rows=TILE_ROWS, tile_columns=TILE_COLUMNS):
+    """
+    Растр фигуры полосами сверху вниз, строки совпадают с fig.savefig при том же dpi.
+    Полоса высотой tile_rows собирается из плиток tile_rows x tile_columns пикселей,
+    каждая плитка рисуется на холсте своего размера (см. _TileRenderer)
+    :param fig:          Фигура matplotlib
+    :param dpi:          Разрешение
+    :param tile_rows:    Высота плитки и полосы в пикселях
+    :param tile_columns: Ширина плитки в пикселях
+    :return: Генератор массивов (h, width, 4) uint8; массив действителен до следующей полосы
+    """
+    original_dpi = fig.dpi
+    fig.set_dpi(dpi)
+    width, height = int(round(fig.bbox.width)), int(round(fig.bbox.height))
+    strip = np.empty((min(tile_rows, height), width, 4), dtype=np.uint8)
+    renderer = None
+    try:
+        for top in range(0, height, tile_rows):
+            rows = min(tile_rows, height - top)
+            for left in range(0, width, tile_columns):
+                columns = min(tile_columns, width - left)
+                # Фигура сдвигается на целое число пикселей, плитка оказывается на холсте
+                fig.dpi_scale_trans.clear().scale(dpi).translate(-left, -(height - top - rows))
+                if renderer is None or (renderer.width, renderer.height) != (columns, rows):
+                    renderer = _TileRenderer(columns, rows, dpi)
+                renderer.move(left, top)
+                fig.draw(renderer)
+                strip[:rows, left:left + columns] = renderer.buffer_rgba()
+            yield strip[:rows]
+    finally:
+        fig.set_dpi(original_dpi)
+        fig.dpi_scale_trans.clear().scale(original_dpi)
+        fig.stale = True
+
+
+def save_png_tiled(fig, file_path, dpi, tile_rows=TILE_ROWS, tile_columns=TILE_COLUMNS, progress=None):
+    """
+    Сохранение фигуры в PNG полосами, см. render_strips
+    :param progress: progress(записано строк, высота) после каждой полосы
+    """
+    original_dpi = fig.dpi
+    fig.set_dpi(dpi)
+    width, height = int(round(fig.bbox.width)), int(round(fig.bbox.height))
+    fig.set_dpi(original_dpi)
+    with open(file_path, 'wb') as file, PngStripWriter(file, width, height, dpi) as writer:
+        for strip in render_strips(fig, dpi, tile_rows, tile_columns):
+            writer.write(strip)
+            if progress:
+                progress(writer.rows_written, height)
@@ -0,0 +1,496 @@
+"""
+Векторный экспорт картограммы в SVG и PDF напрямую из модели сетки
+
+matplotlib записывает каждый элемент отдельным путем со всеми атрибутами стиля.
+Здесь шестигранник описывается один раз (<path> в <defs> SVG, Form XObject в PDF)
+и только ставится в центры элементов, элементы одного стиля собраны в группы,
+штриховки - общие узоры, а цифры и буквы - общие контуры глифов. Раскладка
+страницы (поля, пределы осей, легенда) берется у matplotlib, поэтому рисунок
+совпадает с сохраненным через savefig.
+"""
+
+import zlib
+from functools import lru_cache
+
+import matplotlib as mpl
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.hatch import get_path as get_hatch_path
+from matplotlib.path import Path
+
+from cartogram_figure import grid_axes, legend_text, LEGEND_POSITION, LEGEND_FONT_SIZE
+from glyphs import GlyphSet, POINTS_PER_INCH
+from hex_geometry import hex_grid_geometry, base_radius, UNIT_HEXAGON
+from hex_model import STATE_NORMAL, STATE_DASHED, NO_NUMBER
+from hex_render import (FACE_COLORS, BW_FACE_COLOR, EDGE_COLOR, HATCHES, LINE_WIDTH, NUMBER_SIZE_SCALE,
+                        TEXT_SIZE, ARROW_PROPS, text_anchors, text_positions)
+from settings import FIGSIZE
+
+
+VECTOR_FORMATS = ('svg', 'pdf')
+
+# Значения matplotlib: отступ рамки подписи, укорочение стрелки и размер ее головки
+TEXT_BOX_PAD = 4
+ARROW_SHRINK = 2
+ARROW_HEAD_LENGTH = 0.4
+ARROW_HEAD_WIDTH = 0.2
+SPINE_WIDTH = 0.8
+# Плотность штриховки matplotlib: узор рассчитан на квадрат в дюйм
+HATCH_DENSITY = 6
+
+
+def _cubic(path):
+    """Вершины и коды пути, в котором квадратичные кривые (контуры TrueType) заменены кубическими"""
+    vertices, codes = path.vertices, path.codes
+    if codes is None:
+        codes = np.full(len(vertices), Path.LINETO, dtype=Path.code_type)
+        codes[:1] = Path.MOVETO
+    if not (codes == Path.CURVE3).any():
+        return vertices, codes
+
+    new_vertices, new_codes = [], []
+    current = start = np.zeros(2)
+    index = 0
+    while index < len(codes):
+        code, point = codes[index], vertices[index]
+        if code == Path.CURVE3:
+            control, end = point, vertices[index + 1]
+            new_vertices += [current + 2 / 3 * (control - current), end + 2 / 3 * (control - end), end]
+            new_codes += [Path.CURVE4] * 3
+            current = end
+            index += 2
+            continue
+        if code == Path.MOVETO:
+            start = point
+        current = start if code == Path.CLOSEPOLY else point
+        new_vertices.append(point)
+        new_codes.append(code)
+        index += 1
+    return np.array(new_vertices), np.array(new_codes)
+
+
+@lru_cache(maxsize=None)
+def hatch_tile(hatch):
+    """
+    Наименьший повторяющийся участок штриховки: (путь в единичном квадрате, сторона в пунктах).
+    Узор matplotlib с плотностью 6 на дюйм обычно повторяется 6 раз по каждой оси, и в файл
+    достаточно записать шестую часть, иначе мелкие точки и кружки дают сотни килобайт
+    """
+    for repeats in (HATCH_DENSITY, 3, 2):
+        density = HATCH_DENSITY // repeats
+        try:
+            tile = get_hatch_path(hatch, density=density)
+            # Участок подходит, если узор вдвое большей плотности на вдвое большем квадрате - это 2x2 таких участков
+            double = get_hatch_path(hatch, density=density * 2)
+        except ValueError:
+            # При нечетном числе рядов кружков matplotlib не может построить узор малой плотности
+            continue
+        if _same_points(tile.vertices, double.vertices * 2):
+            return tile, POINTS_PER_INCH / repeats
+    return get_hatch_path(hatch, density=HATCH_DENSITY), POINTS_PER_INCH
+
+
+def _same_points(first, second):
+    """Совпадают ли наборы точек по модулю единичного квадрата"""
+    first, second = (np.unique(np.round(np.mod(points, 1), 4) % 1, axis=0) for points in (first, second))
+    return np.array_equal(first, second)
+
+
+def _number(value):
+    return f'{round(value, 2) + 0.0:.6g}'
+
+
+def _coordinates(points):
+    """Точки (N, 2) строками 'x y' с точностью до сотой пункта"""
+    rounded = np.round(np.asarray(points, dtype=float).reshape(-1, 2), 2) + 0.0
+    flat = rounded.ravel().tolist()
+    return ['%.6g %.6g' % point for point in zip(flat[0::2], flat[1::2])]
+
+
+def _path_data(path, transform=None, pdf=False):
+    """Путь matplotlib как данные пути SVG или операторы построения пути PDF"""
+    vertices, codes = _cubic(path)
+    points = _coordinates(vertices if transform is None else transform(vertices))
+    parts = []
+    curve = 0
+    for point, code in zip(points, codes.tolist()):
+        if code == Path.CLOSEPOLY:
+            parts.append(' h' if pdf else 'Z')
+        elif code == Path.CURVE4:
+            # Кубическая кривая - три точки подряд с кодом CURVE4
+            curve += 1
+            if pdf:
+                parts.append(' ' + point + (' c' if curve % 3 == 0 else ''))
+            else:
+                parts.append(('C' if curve % 3 == 1 else ' ') + point)
+        elif code in (Path.MOVETO, Path.LINETO):
+            curve = 0
+            if pdf:
+                parts.append(' ' + point + (' m' if code == Path.MOVETO else ' l'))
+            else:
+                parts.append(('M' if code == Path.MOVETO else 'L') + point)
+    return ''.join(parts).strip()
+
+
+def _polygons(outlines, pdf=False):
+    """Замкнутые многоугольники (N, k, 2) одним путем SVG или PDF"""
+    outlines = np.asarray(outlines)
+    points = _coordinates(outlines)
+    corners = outlines.shape[1] if outlines.ndim == 3 else 0
+    if pdf:
+        return '\n'.join(f'{points[start]} m ' + ' '.join(point + ' l' for point in points[start + 1:start + corners])
+                         + ' h' for start in range(0, len(points), corners))
+    return ''.join('M' + 'L'.join(points[start:start + corners]) + 'Z' for start in range(0, len(points), corners))
+
+
+class VectorScene:
+    """
+    Все, что рисуется в файл, в пунктах страницы (начало координат - левый нижний угол)
+    """
+
+    def __init__(self, grid, coeff_padding, color_titles=None, bw_mode=False, geometry=None):
+        """
+        :param grid:          Модель сетки HexGridModel
+        :param coeff_padding: Отступ между шестигранниками в долях радиуса
+        :param color_titles:  Подписи цветов легенды
+        :param bw_mode:       Черно-белый режим
+        :param geometry:      Готовые (centers, vertices) для радиуса base_radius(grid.num_rings)
+        """
+        radius = base_radius(grid.num_rings)
+        padding = radius * coeff_padding
+        if geometry is None:
+            geometry = hex_grid_geometry(grid.num_rings, radius, padding, grid.remove_corners)
+        centers = geometry[0]
+
+        # Поля и пределы осей те же, что у фигуры cartogram_figure, но без элементов сетки
+        fig = Figure(figsize=FIGSIZE, dpi=POINTS_PER_INCH)
+        ax = grid_axes(fig, grid.num_rings, radius, padding)
+        ax.apply_aspect()
+        transform = ax.transData
+        self.width, self.height = fig.bbox.size
+        self.axes_box = tuple(ax.bbox.extents)
+        self.cell_radius = radius * transform.get_matrix()[0, 0]
+        self.centers = transform.transform(centers) if len(centers) else np.zeros((0, 2))
+        self.hexagon = self.cell_radius * UNIT_HEXAGON
+
+        # Слои в порядке HexGridRenderer: заливка с границей, пунктир, штриховка
+        visible = grid.visible()
+        color = grid.color
+        normal = grid.state == STATE_NORMAL
+        self.fills = []
+        if bw_mode:
+            styles = [(BW_FACE_COLOR, visible)]
+        else:
+            styles = [(FACE_COLORS[color_index], visible & (color == color_index))
+                      for color_index in range(len(FACE_COLORS))]
+        for face, cells in styles:
+            for edge, mask in ((EDGE_COLOR, cells & normal), (None, cells & ~normal)):
+                if mask.any():
+                    self.fills.append((face, edge, np.flatnonzero(mask)))
+        self.dashed = np.flatnonzero(grid.state == STATE_DASHED)
+        self.hatches = {}
+        if bw_mode:
+            for color_index, hatch in enumerate(HATCHES):
+                cells = np.flatnonzero(visible & (color == color_index))
+                if hatch is not None and cells.size:
+                    self.hatches[hatch] = cells
+
+        self.glyphs = GlyphSet()
+        self.text_runs = []
+        number_size = radius * 2 * NUMBER_SIZE_SCALE
+        for index in np.flatnonzero(grid.number != NO_NUMBER):
+            x, y = self.centers[index]
+            self.text_runs += self.glyphs.runs(f'{grid.number[index]} ', x, y, number_size, digits=True)[0]
+
+        # Подписи со стрелками, как у Annotation: стрелка видна, только если ее точка внутри осей
+        self.arrows = []
+        labeled = np.flatnonzero(grid.text != None)  # pylint: disable=singleton-comparison
+        if labeled.size:
+            anchors = text_anchors(centers[labeled], grid.text_anchor[labeled], radius)
+            points = transform.transform(anchors)
+            positions = transform.transform(text_positions(anchors, grid.num_rings, radius, padding))
+            x0, y0, x1, y1 = self.axes_box
+            for index, point, position in zip(labeled, points, positions):
+                if not (x0 <= point[0] <= x1 and y0 <= point[1] <= y1):
+                    continue
+                runs, box = self.glyphs.runs(str(grid.text[index]), *position, TEXT_SIZE)
+                self.text_runs += runs
+                arrow = self._arrow(position, box, point)
+                if arrow is not None:
+                    self.arrows.append(arrow)
+
+        text = legend_text(grid, color_titles, bw_mode)
+        legend_x, legend_y = LEGEND_POSITION
+        self.text_runs += self.glyphs.runs(text, legend_x * self.width, legend_y * self.height,
+                                           LEGEND_FONT_SIZE, ha='left')[0]
+
+    @staticmethod
+    def _arrow(center, box, tip):
+        """Линии стрелки '->' от рамки текста к точке tip или None, если стрелка не помещается"""
+        center, tip = np.asarray(center, dtype=float), np.asarray(tip, dtype=float)
+        direction = tip - center
+        length = np.hypot(*direction)
+        if not length:
+            return None
+        unit = direction / length
+        # Начало - выход луча из рамки текста, расширенной на половину отступа
+        half = (np.array(box[2:]) - box[:2]) / 2 + TEXT_BOX_PAD / 2
+        with np.errstate(divide='ignore'):
+            exit_distance = np.min(half / np.abs(unit))
+        start = center + unit * (exit_distance + ARROW_SHRINK)
+        end = tip - unit * ARROW_SHRINK
+        if np.dot(end - start, unit) <= 0:
+            return None
+        normal = np.array((-unit[1], unit[0]))
+        head = end - unit * ARROW_HEAD_LENGTH * TEXT_SIZE
+        width = ARROW_HEAD_WIDTH * TEXT_SIZE
+        return (start, end), (head + normal * width, end, head - normal * width)
+
+    def cell_outlines(self, cells):
+        """Вершины элементов cells в пунктах страницы, (N, 6, 2)"""
+        return self.centers[cells][:, None, :] + self.hexagon[None, :, :]
+
+
+def _hex_color(rgba):
+    return mpl.colors.to_hex(rgba[:3])
+
+
+class SvgWriter:
+    """
+    Запись сцены в SVG: шестигранник - путь в <defs>, элементы - <use>, штриховки - <pattern>
+    """
+
+    def __init__(self, scene):
+        self.scene = scene
+
+    def _flip(self, points):
+        """Точки страницы в координатах SVG, где ось y направлена вниз"""
+        points = np.array(points, dtype=float)
+        points[..., 1] = self.scene.height - points[..., 1]
+        return points
+
+    def write(self, file):
+        scene = self.scene
+        out = [
+            '<?xml version="1.0" encoding="utf-8" standalone="no"?>',
+            f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" version="1.1" '
+            f'width="{_number(scene.width)}pt" height="{_number(scene.height)}pt" '
+            f'viewBox="0 0 {_number(scene.width)} {_number(scene.height)}">',
+            '<defs>',
+        ]
+        hexagon = _polygons(scene.hexagon[None] * (1, -1))
+        # Путь, а не <symbol>: внутри <clipPath> <use> может ссылаться только на фигуру
+        out.append(f'<path id="hex" d="{hexagon}"/>')
+
+        edge = _hex_color(EDGE_COLOR)
+        hatch_width = _number(mpl.rcParams['hatch.linewidth'])
+        for number, hatch in enumerate(scene.hatches):
+            tile, size = hatch_tile(hatch)
+            # Узор отсчитывается от верхнего края страницы, как штриховка Agg на экране
+            tile = _path_data(tile, lambda points: (points * (1, -1) + (0, 1)) * size)
+            out.append(f'<pattern id="hatch{number}" patternUnits="userSpaceOnUse" x="0" y="0" '
+                       f'width="{_number(size)}" height="{_number(size)}">'
+                       f'<path d="{tile}" fill="{edge}" stroke="{edge}" stroke-width="{hatch_width}" '
+                       f'fill-opacity="{_number(EDGE_COLOR[3])}" stroke-opacity="{_number(EDGE_COLOR[3])}"/>'
+                       '</pattern>')
+
+        for glyph_id, (vertices, codes) in scene.glyphs.paths.items():
+            if len(vertices):
+                out.append(f'<path id="{glyph_id}" d="{_path_data(Path(vertices, codes))}"/>')
+
+        x0, y0, x1, y1 = scene.axes_box
+        axes_rect = f'x="{_number(x0)}" y="{_number(scene.height - y1)}" width="{_number(x1 - x0)}" ' \
+                    f'height="{_number(y1 - y0)}"'
+        out.append(f'<clipPath id="axes"><rect {axes_rect}/></clipPath>')
+        for number, cells in enumerate(scene.hatches.values()):
+            out.append(f'<clipPath id="hatched{number}">')
+            out += self._uses(cells)
+            out.append('</clipPath>')
+        out.append('</defs>')
+        out.append(f'<rect width="{_number(scene.width)}" height="{_number(scene.height)}" fill="#ffffff"/>')
+        out.append(f'<rect {axes_rect} fill="#ffffff"/>')
+
+        out.append(f'<g clip-path="url(#axes)" stroke-width="{_number(LINE_WIDTH)}" stroke-linejoin="round">')
+        for face, edge_color, cells in scene.fills:
+            style = f'fill="{_hex_color(face)}" fill-opacity="{_number(face[3])}"'
+            style += f' stroke="{_hex_color(edge_color)}" stroke-opacity="{_number(edge_color[3])}"' \
+                if edge_color is not None else ' stroke="none"'
+            out.append(f'<g {style}>')
+            out += self._uses(cells)
+            out.append('</g>')
+        if scene.dashed.size:
+            dashes = ','.join(_number(dash * LINE_WIDTH) for dash in mpl.rcParams['lines.dashed_pattern'])
+            out.append(f'<g fill="none" stroke="{edge}" stroke-opacity="{_number(EDGE_COLOR[3])}" '
+                       f'stroke-dasharray="{dashes}">')
+            out += self._uses(scene.dashed)
+            out.append('</g>')
+        # Узор заливает прямоугольник осей, обрезанный по элементам: у самих <use> узор сдвигался бы с каждым
+        for number in range(len(scene.hatches)):
+            out.append(f'<rect {axes_rect} fill="url(#hatch{number})" clip-path="url(#hatched{number})"/>')
+        out.append('</g>')
+
+        out.append(f'<rect {axes_rect} fill="none" stroke="#000000" stroke-width="{_number(SPINE_WIDTH)}" '
+                   'stroke-linejoin="miter" stroke-linecap="square"/>')
+
+        out.append('<g fill="#000000">')
+        for x, baseline, scale, glyphs in scene.text_runs:
+            uses = ''.join(f'<use xlink:href="#{glyph_id}" x="{_number(offset)}"/>' for glyph_id, offset in glyphs
+                           if len(scene.glyphs.paths[glyph_id][0]))
+            out.append(f'<g transform="translate({_number(x)} {_number(scene.height - baseline)}) '
+                       f'scale({scale:.6g} {-scale:.6g})">{uses}</g>')
+        out.append('</g>')
+
+        if scene.arrows:
+            out.append(f'<g fill="none" stroke="#000000" stroke-width="{_number(ARROW_PROPS["lw"])}" '
+                       'stroke-linecap="round" stroke-linejoin="round">')
+            for line in scene.arrows:
+                for polyline in line:
+                    out.append(f'<path d="M{"L".join(_coordinates(self._flip(polyline)))}"/>')
+            out.append('</g>')
+        out.append('</svg>\n')
+        file.write('\n'.join(out).encode('utf-8'))
+
+    def _uses(self, cells):
+        return [f'<use xlink:href="#hex" x="{x}" y="{y}"/>'
+                for x, y in (point.split() for point in _coordinates(self._flip(self.scene.centers[cells])))]
+
+
+class PdfWriter:
+    """
+    Запись сцены в PDF: шестигранник - Form XObject, штриховки - узоры Pattern, глифы - Form XObject
+    """
+
+    def __init__(self, scene):
+        self.scene = scene
+        self._objects = []
+
+    def _add(self, body, stream=None):
+        """Новый объект PDF, возвращает его номер"""
+        if stream is not None:
+            stream = zlib.compress(stream.encode('latin-1'))
+            body = f'<< {body} /Filter /FlateDecode /Length {len(stream)} >>'.encode('latin-1')
+            body += b'\nstream\n' + stream + b'\nendstream'
+        else:
+            body = body.encode('latin-1')
+        self._objects.append(body)
+        return len(self._objects)
+
+    def write(self, file):
+        scene = self.scene
+        # Номера 1 и 2 - каталог и дерево страниц, содержимое страницы добавляется последним
+        self._objects = [b'', b'']
+        resources = {'XObject': {}, 'ExtGState': {}, 'Pattern': {}}
+
+        hexagon = _polygons(scene.hexagon[None], pdf=True)
+        reach = _number(scene.cell_radius + LINE_WIDTH)
+        for name, operator in (('HB', 'B'), ('Hf', 'f'), ('HS', 'S')):
+            resources['XObject'][name] = self._add(
+                f'/Type /XObject /Subtype /Form /BBox [-{reach} -{reach} {reach} {reach}]', f'{hexagon} {operator}')
+
+        glyph_names = {}
+        for number, (glyph_id, (vertices, codes)) in enumerate(scene.glyphs.paths.items()):
+            if not len(vertices):
+                continue
+            (gx0, gy0), (gx1, gy1) = np.min(vertices, axis=0), np.max(vertices, axis=0)
+            glyph_names[glyph_id] = f'G{number}'
+            resources['XObject'][f'G{number}'] = self._add(
+                f'/Type /XObject /Subtype /Form /BBox [{_number(gx0)} {_number(gy0)} {_number(gx1)} {_number(gy1)}]',
+                _path_data(Path(vertices, codes), pdf=True) + ' f')
+
+        edge = ' '.join(_number(channel) for channel in EDGE_COLOR[:3])
+        hatch_width = _number(mpl.rcParams['hatch.linewidth'])
+        for number, hatch in enumerate(scene.hatches):
+            tile, size = hatch_tile(hatch)
+            tile = _path_data(tile, lambda points, size=size: points * size, pdf=True)
+            size = _number(size)
+            resources['Pattern'][f'P{number}'] = self._add(
+                f'/Type /Pattern /PatternType 1 /PaintType 1 /TilingType 1 '
+                f'/BBox [0 0 {size} {size}] /XStep {size} /YStep {size} '
+                f'/Resources << >>', f'{edge} rg {edge} RG {hatch_width} w {tile} B')
+
+        def alpha(fill, stroke):
+            name = f'A{_number(fill * 100)}_{_number(stroke * 100)}'.replace('.', '_')
+            if name not in resources['ExtGState']:
+                resources['ExtGState'][name] = self._add(
+                    f'<< /Type /ExtGState /ca {_number(fill)} /CA {_number(stroke)} >>')
+            return f'/{name} gs'
+
+        x0, y0, x1, y1 = scene.axes_box
+        axes_rect = f'{_number(x0)} {_number(y0)} {_number(x1 - x0)} {_number(y1 - y0)} re'
+        content = [f'1 1 1 rg 0 0 {_number(scene.width)} {_number(scene.height)} re f', f'{axes_rect} f',
+                   f'q {axes_rect} W n {_number(LINE_WIDTH)} w 1 j 0 J']
+        for face, edge_color, cells in scene.fills:
+            color = ' '.join(_number(channel) for channel in face[:3])
+            if edge_color is not None:
+                content.append(f'{alpha(face[3], edge_color[3])} {color} rg {edge} RG')
+            else:
+                content.append(f'{alpha(face[3], 1)} {color} rg')
+            content += self._placed(cells, 'HB' if edge_color is not None else 'Hf')
+        if scene.dashed.size:
+            dashes = ' '.join(_number(dash * LINE_WIDTH) for dash in mpl.rcParams['lines.dashed_pattern'])
+            content.append(f'{alpha(1, EDGE_COLOR[3])} {edge} RG [{dashes}] 0 d')
+            content += self._placed(scene.dashed, 'HS')
+            content.append('[] 0 d')
+        for number, cells in enumerate(scene.hatches.values()):
+            # Прозрачность штриховки задается при заливке узором
+            content.append(f'{alpha(EDGE_COLOR[3], 1)} /Pattern cs /P{number} scn')
+            content.append(self._outlines(cells))
+        content.append('Q')
+
+        content.append(f'{alpha(1, 1)} 0 0 0 RG {_number(SPINE_WIDTH)} w 0 j 2 J {axes_rect} S')
+        content.append('0 0 0 rg')
+        for x, baseline, scale, glyphs in scene.text_runs:
+            placed = ' '.join(f'q 1 0 0 1 {_number(offset)} 0 cm /{glyph_names[glyph_id]} Do Q'
+                              for glyph_id, offset in glyphs if glyph_id in glyph_names)
+            content.append(f'q {scale:.6g} 0 0 {scale:.6g} {_number(x)} {_number(baseline)} cm {placed} Q')
+        if scene.arrows:
+            content.append(f'{_number(ARROW_PROPS["lw"])} w 1 j 1 J')
+            for line in scene.arrows:
+                for polyline in line:
+                    start, *rest = _coordinates(polyline)
+                    content.append(f'{start} m ' + ' '.join(point + ' l' for point in rest) + ' S')
+
+        resource_text = ' '.join(
+            f'/{kind} << ' + ' '.join(f'/{name} {number} 0 R' for name, number in entries.items()) + ' >>'
+            for kind, entries in resources.items() if entries)
+        contents = self._add('', '\n'.join(content))
+        page = self._add(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {_number(scene.width)} '
+                         f'{_number(scene.height)}] /Resources << {resource_text} >> /Contents {contents} 0 R >>')
+        self._objects[0] = b'<< /Type /Catalog /Pages 2 0 R >>'
+        self._objects[1] = f'<< /Type /Pages /Kids [{page} 0 R] /Count 1 >>'.encode('latin-1')
+
+        offsets = []
+        position = file.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        for number, body in enumerate(self._objects, 1):
+            offsets.append(position)
+            position += file.write(f'{number} 0 obj\n'.encode('latin-1') + body + b'\nendobj\n')
+        xref = [f'xref\n0 {len(offsets) + 1}\n0000000000 65535 f \n']
+        xref += [f'{offset:010d} 00000 n \n' for offset in offsets]
+        xref.append(f'trailer\n<< /Size {len(offsets) + 1} /Root 1 0 R >>\nstartxref\n{position}\n%%EOF\n')
+        file.write(''.join(xref).encode('latin-1'))
+
+    def _outlines(self, cells):
+        """Заливка контуров элементов, записанных в сотых долях пункта: целые числа записываются быстрее"""
+        corners = np.round(self.scene.cell_outlines(cells) * 100).astype(np.int64).reshape(len(cells), -1)
+        template = '%d %d m ' + '%d %d l ' * (corners.shape[1] // 2 - 1) + 'h'
+        # Узор штриховки привязан к странице, а не к текущей системе координат, поэтому масштаб его не меняет
+        return 'q 0.01 0 0 0.01 0 0 cm\n' + '\n'.join(template % tuple(row) for row in corners.tolist()) + ' f Q'
+
+    def _placed(self, cells, name):
+        return [f'q 1 0 0 1 {point} cm /{name} Do Q' for point in _coordinates(self.scene.centers[cells])]
+
+
+def save_vector(file_path, grid, coeff_padding, color_titles=None, bw_mode=False, export_format=None,
+                geometry=None):
+    """
+    Сохранение картограммы в SVG или PDF без построения фигуры matplotlib
+    :param export_format: 'svg' или 'pdf', по умолчанию - по расширению file_path
+    :param geometry:      Готовые (centers, vertices) для радиуса base_radius(grid.num_rings)
+    """
+    export_format = export_format or file_path.rsplit('.', 1)[-1].lower()
+    if export_format not in VECTOR_FORMATS:
+        raise ValueError(f'Неподдерживаемый векторный формат: {export_format}')
+    scene = VectorScene(grid, coeff_padding, color_titles, bw_mode, geometry)
+    writer = SvgWriter(scene) if export_format == 'svg' else PdfWriter(scene)
+    with open(file_path, 'wb') as file:
+        writer.write(file)